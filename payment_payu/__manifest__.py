@@ -12,12 +12,18 @@
     'data': [
         'views/payment_payu_templates.xml',
         'views/payment_provider_views.xml',
+        'views/sale_order_views.xml',
+        'views/payu_refund_batch_views.xml',
+        'views/payu_call_journal_views.xml',
         'data/payment_provider_data.xml',
+        'data/product_data.xml',
         'security/ir.model.access.csv',
         'data/ir_cron_payment_transaction.xml'
     ],
     'test': ['tests/test_payment_provider.py',
-             'tests/test_payment_transaction.py'],
+             'tests/test_payment_transaction.py',
+             'tests/test_payu_notification.py',
+             'tests/test_payu_metrics.py'],
     'post_init_hook': 'post_init_hook',
     'uninstall_hook': 'uninstall_hook',
     'license': 'LGPL-3',
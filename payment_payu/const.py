@@ -162,6 +162,20 @@ UPLOAD_INVOICE_HASH_PARAMS = [
     '_SALT_',
 ]
 
+CHECK_ACTION_STATUS_HASH_PARAMS = [
+    'key',
+    'command',
+    'var1',
+    '_SALT_',
+]
+
+VERIFY_PAYMENT_HASH_PARAMS = [
+    'key',
+    'command',
+    'var1',
+    '_SALT_',
+]
+
 TEST_SIGN_UP_ENDPOINT= "https://onboarding.payu.in/app/account/signup"
 TEST_VALIDATE_AUTH_CODE_ENDPOINT = "https://uat-accounts.payu.in"
 TEST_MERCHANT_CREDS_ENDPOINT = "https://uat-partner.payu.in"
@@ -170,3 +184,140 @@ SIGN_UP_ENDPOINT = "https://onboarding.payu.in/app/account/signup"
 VALIDATE_AUTH_CODE_ENDPOINT = "https://accounts.payu.in"
 MERCHANT_CREDS_ENDPOINT = "https://partner.payu.in"
 
+
+# Timeout budgets, as (connect, read) seconds, of the outbound calls made to PayU.
+API_TIMEOUTS = {
+    'default': (5, 30),
+    'refund': (5, 30),
+    'refund_status': (5, 30),
+    'verify_payment': (5, 30),
+    'udf_update': (5, 20),
+    'upload_invoice': (5, 60),
+    'settlement': (5, 30),
+}
+
+# The connection pool and retry policy of the HTTP sessions used to reach PayU.
+API_POOL_MAXSIZE = 10
+API_RETRY_TOTAL = 3
+API_RETRY_BACKOFF_FACTOR = 0.5
+API_RETRY_STATUSES = (429, 502, 503, 504)
+API_RETRY_METHODS = frozenset({'GET', 'HEAD'})
+
+# The number of settlements requested per page and the default number of credentials whose
+# settlements are fetched concurrently by the settlement cron.
+SETTLEMENT_PAGE_SIZE = 100
+SETTLEMENT_CONCURRENCY = 4
+
+# The maximum number of past days the settlement cron catches up on after missed runs.
+SETTLEMENT_MAX_CATCHUP_DAYS = 31
+
+# The processing policy of the queue of inbound notifications.
+NOTIFICATION_BATCH_SIZE = 50
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_RETENTION_DAYS = 30
+
+# The default row-locking policy of the notification processing, either 'skip' or 'wait'.
+NOTIFICATION_LOCK_POLICY = 'skip'
+
+# The processing policy of the cross-border invoice uploads.
+INVOICE_UPLOAD_MAX_ATTEMPTS = 6
+INVOICE_UPLOAD_RETRY_DELAY = 5  # Minutes, doubled after each failed attempt.
+INVOICE_UPLOAD_BATCH_SIZE = 20
+INVOICE_RENDER_CONCURRENCY = 2
+
+# The identifiers of the advisory locks used as semaphores across workers.
+INVOICE_RENDER_LOCK_ID = 72_870_001
+ROUTE_LOCK_IDS = {
+    'webhook': 72_870_002,
+    'process': 72_870_003,
+    'cancel': 72_870_004,
+    'status': 72_870_005,
+}
+
+# The admission control of the public PayU routes: the number of requests served at the same time
+# across workers, and the rate (requests per second) and burst of the token bucket of each source
+# address, by route. Each limit can be overridden with the
+# `payment_payu.admission.<route>.<concurrency|rate|burst>` system parameters; 0 disables it.
+ROUTE_ADMISSION = {
+    'webhook': {'concurrency': 4, 'rate': 20, 'burst': 50},
+    # The customers returning from checkout may share the address of a corporate or carrier NAT.
+    'process': {'concurrency': 8, 'rate': 50, 'burst': 200},
+    'cancel': {'concurrency': 2, 'rate': 1, 'burst': 5},
+    # The status is polled: a rate limit would cost a write per poll.
+    'status': {'concurrency': 8, 'rate': 0, 'burst': 0},
+}
+ROUTE_BUSY_RETRY_AFTER = 1  # Seconds.
+RATE_BUCKET_RETENTION_HOURS = 1
+
+# The size limits of the cart details sent to PayU: in UTF-8 bytes for the document, in characters
+# for the SKU names.
+CART_DETAILS_MAX_LENGTH = 64000
+CART_SKU_NAME_MAX_LENGTH = 100
+
+# The hosts of the PayU services, by provider state for the test host.
+PAYU_TEST_HOST = 'test.payu.in'
+PAYU_PAYMENT_HOST = 'secure.payu.in'
+PAYU_API_HOST = 'info.payu.in'
+
+# Metrics: the upper bounds, in seconds, of the latency histogram buckets, the delay between two
+# snapshots of the metrics of a worker, and the age after which the snapshot of a stopped worker
+# is no longer reported.
+METRICS_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+METRICS_FLUSH_INTERVAL = 15
+METRICS_SNAPSHOT_TTL = 24 * 60 * 60
+
+# Logged events: the level of each event and the fraction of its occurrences that are logged.
+LOG_EVENTS = {
+    'notification.received': ('INFO', 1.0),
+    'notification.payload': ('DEBUG', 1.0),
+    'notification.verified': ('DEBUG', 1.0),
+    'api.request': ('DEBUG', 1.0),
+    'api.error': ('ERROR', 1.0),
+    'sign.computed': ('DEBUG', 1.0),
+    'rendering.values': ('DEBUG', 1.0),
+    'refund.response': ('INFO', 1.0),
+    'udf_update.response': ('INFO', 1.0),
+    'invoice_upload.response': ('INFO', 1.0),
+    'settlement.response': ('DEBUG', 1.0),
+    'settlement.page': ('INFO', 0.1),
+    'settlement.row_unmatched': ('WARNING', 0.1),
+}
+# The keys whose values are masked in the logged payloads, in lowercase.
+LOG_SENSITIVE_KEYS = frozenset({
+    'hash', 'salt', 'merchant_salt', 'key', 'merchant_key', 'authorization', 'signature',
+    'email', 'phone', 'user_token', 'cardnum', 'card_no', 'name_on_card', 'cardhash',
+})
+# The maximum length of a logged payload.
+LOG_PAYLOAD_MAX_LENGTH = 2000
+
+# Bulk refunds: the number of refund lines processed per chunk, the number of concurrent
+# refund calls and the maximum number of refund calls per second per merchant key.
+REFUND_BATCH_CHUNK_SIZE = 50
+REFUND_CONCURRENCY = 4
+REFUND_RATE_LIMIT = 5
+# The minutes after which a refund line still being sent is deemed interrupted.
+REFUND_SENDING_TIMEOUT = 60
+
+# Refund status reconciliation: the number of refund request ids checked per call, and the
+# PayU statuses of the refund actions that are final.
+REFUND_STATUS_BATCH_SIZE = 50
+REFUND_STATUS_SUCCESS = frozenset({'success'})
+REFUND_STATUS_FAILURE = frozenset({'failure', 'failed', 'cancelled', 'rejected'})
+
+# Pending payment verification: the number of PayU transaction ids verified per call, the
+# maximum number of payments verified per run, and the minutes after which a payment whose
+# outcome was never notified is verified, then canceled if PayU does not report it completed.
+PAYMENT_VERIFY_BATCH_SIZE = 25
+PAYMENT_VERIFY_MAX_PER_RUN = 500
+PAYMENT_VERIFY_DELAY = 15
+PAYMENT_VERIFY_CANCEL_DELAY = 120
+
+# The journal of the calls made to PayU: the number of buffered calls that wakes the writer up,
+# the seconds between two writes, the maximum number of calls buffered by a worker, the maximum
+# length of a journaled body, and the default retention, in days and in number of calls.
+JOURNAL_BATCH_SIZE = 50
+JOURNAL_FLUSH_INTERVAL = 5
+JOURNAL_BUFFER_MAX = 5000
+JOURNAL_BODY_MAX_LENGTH = 64000
+JOURNAL_RETENTION_DAYS = 30
+JOURNAL_MAX_ROWS = 1_000_000
@@ -1,9 +1,17 @@
 # payment_payu/controllers/main.py
+import hashlib
+import hmac
 import logging
 
+from werkzeug.exceptions import Forbidden, NotFound, ServiceUnavailable, TooManyRequests
+
 from odoo import http
 from odoo.http import request
 
+from odoo.addons.payment import utils as payment_utils
+from odoo.addons.payment.controllers.post_processing import PaymentPostProcessing
+from odoo.addons.payment_payu import log_events, metrics, utils
+
 _logger = logging.getLogger(__name__)
 
 
@@ -13,37 +21,85 @@ class PayUController(http.Controller):
     _webhook_url = '/payment/payu/webhook'
     _process_url = '/payment/payu/process'
     _cancel_url = '/payment/payu/cancel'
+    _metrics_url = '/payment/payu/metrics'
+    _status_url = '/payment/payu/status/<string:reference>'
 
     @http.route(_webhook_url, type='http', auth='public', methods=['POST'], csrf=False)
     def payu_webhook(self, **kwargs):
-        _logger.info("PayU Webhook received: %s", kwargs)
+        """ Queue the notification and acknowledge it without waiting for its processing. """
+        self._payu_admit('webhook')
+        with metrics.track('payu_route_duration_seconds', 'payu_route_errors_total', route='webhook'):
+            self._payu_log_notification('webhook', kwargs)
+            self._payu_check_notification_hash(kwargs)
 
-        # Retrieve the transaction based on the reference included in the return url.
-        tx_sudo = request.env[PAYMENT_TRANSACTION_MODEL].sudo()._get_tx_from_notification_data(
-            'payu', kwargs
-        )
-
-        tx_sudo._handle_notification_data('payu', kwargs)
+            request.env['payu.notification'].sudo()._enqueue(kwargs)
 
         return "Webhook processed"
 
-    @http.route(_process_url, type='http', auth='public', methods=['POST'], csrf=False, save_session=False)
-    def payu_process(self, **kwargs):
-        _logger.info("PayU redirection response received: %s", kwargs)
+    @staticmethod
+    def _payu_admit(route):
+        """ Turn down the request if its source exceeds its rate limit or the route is saturated.
+
+        The check runs before the request is processed, so that a retry storm or a flood of one
+        route is answered right away instead of occupying the workers.
 
-        # Retrieve the transaction based on the reference included in the return url.
-        tx_sudo = request.env[PAYMENT_TRANSACTION_MODEL].sudo()._get_tx_from_notification_data(
-            'payu', kwargs
+        :param str route: The route, as a key of `const.ROUTE_ADMISSION`.
+        :raise TooManyRequests: If the source of the request exceeds its rate limit.
+        :raise ServiceUnavailable: If the route is serving as many requests as it may.
+        """
+        reason, retry_after = request.env['payu.rate.bucket'].sudo()._admit(
+            route, request.httprequest.remote_addr
         )
+        if reason:
+            metrics.inc('payu_route_rejections_total', route=route, reason=reason)
+            exception = TooManyRequests if reason == 'rate_limited' else ServiceUnavailable
+            raise exception(retry_after=retry_after)
+
+    @staticmethod
+    def _payu_log_notification(source, data):
+        log_events.log_event(
+            'notification.received', "PayU: %s notification received for %s (mihpayid %s, status %s)",
+            source, data.get('udf2'), data.get('mihpayid'), data.get('status'),
+        )
+        log_events.log_event('notification.payload', "PayU: %s notification payload: %s", source, data)
+
+    @staticmethod
+    def _payu_check_notification_hash(data):
+        """ Reject the notifications that are not signed by a configured merchant.
+
+        The check runs before the notification is queued or its transaction is looked up, so
+        that forged or malformed payloads are turned down without any ORM work.
+        """
+        if not request.env['payu.credential'].sudo()._check_notification_hash(data):
+            _logger.warning(
+                "PayU: rejected a notification with an invalid hash for %s.", data.get('udf2')
+            )
+            raise Forbidden()
 
-        tx_sudo._handle_notification_data('payu', kwargs)
+    @http.route(_process_url, type='http', auth='public', methods=['POST'], csrf=False, save_session=False)
+    def payu_process(self, **kwargs):
+        self._payu_admit('process')
+        with metrics.track('payu_route_duration_seconds', 'payu_route_errors_total', route='process'):
+            self._payu_log_notification('redirect', kwargs)
+            self._payu_check_notification_hash(kwargs)
+
+            # Retrieve the transaction based on the reference included in the return url.
+            tx_sudo = request.env[PAYMENT_TRANSACTION_MODEL].sudo()._get_tx_from_notification_data(
+                'payu', kwargs
+            )
+
+            tx_sudo._handle_notification_data('payu', kwargs)
 
         return request.redirect('/payment/status')
 
     @http.route(_cancel_url, type='http', auth='public', methods=['GET', 'POST'], csrf=False, save_session=False)
     def payu_cancel(self, **kwargs):
         """Cancel the transaction only if it is in a non-terminal state."""
+        self._payu_admit('cancel')
+        with metrics.track('payu_route_duration_seconds', 'payu_route_errors_total', route='cancel'):
+            return self._payu_cancel(**kwargs)
 
+    def _payu_cancel(self, **kwargs):
         txn_ref = kwargs.get('txn_ref')
         
         TERMINAL_STATES = ('done', 'cancel', 'error', 'authorized')
@@ -52,9 +108,9 @@ class PayUController(http.Controller):
             _logger.warning("PayU Cancel URL missing txn_ref parameter.")
             return request.redirect('/payment/status')
 
-        tx = request.env[PAYMENT_TRANSACTION_MODEL].sudo().search(
-            [('reference', '=', txn_ref)], limit=1
-        )
+        # The transaction is selected by the reference of the cancel URL only, not by a txnid
+        # that the caller could add to it.
+        tx = request.env[PAYMENT_TRANSACTION_MODEL].sudo()._payu_search_transaction(reference=txn_ref)
 
         if not tx:
             _logger.warning("No transaction found for reference %s", txn_ref)
@@ -70,4 +126,52 @@ class PayUController(http.Controller):
         # Only cancel if in non-terminal state
         _logger.info("Canceling transaction %s (current state: %s)", txn_ref, tx.state)
         tx._set_canceled()
-        return request.redirect('/payment/status')
\ No newline at end of file
+        return request.redirect('/payment/status')
+
+    @http.route(_status_url, type='http', auth='public', methods=['GET'], csrf=False, save_session=False)
+    def payu_status(self, reference, access_token=None, **kwargs):
+        """ Return the state and amount of a PayU transaction as JSON, for the front ends polling
+        it while waiting for the notification.
+
+        The transaction is the one monitored by the session of the customer, or else is
+        identified by its reference and access token. The response carries an ETag, and is
+        answered 304 when it matches the one sent in `If-None-Match`.
+        """
+        self._payu_admit('status')
+        with metrics.track('payu_route_duration_seconds', 'payu_route_errors_total', route='status'):
+            return self._payu_status(reference, access_token)
+
+    def _payu_status(self, reference, access_token):
+        status = request.env[PAYMENT_TRANSACTION_MODEL].sudo()._payu_get_status(reference)
+        if not status or not (
+            status['id'] == PaymentPostProcessing.get_monitored_transaction_id()
+            or (access_token and payment_utils.check_access_token(access_token, reference))
+        ):
+            raise NotFound()
+
+        body = utils.json_dumps({
+            'reference': status['reference'],
+            'state': status['state'],
+            'amount': status['amount'],
+            'currency': status['currency'],
+        }).encode()
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        headers = [('ETag', f'"{etag}"'), ('Cache-Control', 'private, no-cache')]
+        if request.httprequest.if_none_match.contains(etag):
+            return request.make_response(b'', headers=headers, status=304)
+        return request.make_response(body, headers=[('Content-Type', 'application/json'), *headers])
+
+    @http.route(_metrics_url, type='http', auth='public', methods=['GET'], csrf=False, save_session=False)
+    def payu_metrics(self, **kwargs):
+        """ Return the PayU metrics in the Prometheus text format.
+
+        The scraper authenticates with the `payment_payu.metrics_token` system parameter, sent as
+        a bearer token; the route is disabled as long as the parameter is not set.
+        """
+        token = request.env['ir.config_parameter'].sudo().get_param('payment_payu.metrics_token')
+        authorization = request.httprequest.headers.get('Authorization', '')
+        if not token or not hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+            raise Forbidden()
+        return request.make_response(
+            metrics.render(), headers=[('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')]
+        )
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+import io
+import logging
+import os
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from odoo.addons.payment_payu import const, journal, metrics
+
+_logger = logging.getLogger(__name__)
+
+# One pooled session per (worker process, PayU host). Keying on the pid keeps forked
+# workers from sharing sockets inherited from the parent process.
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _new_session():
+    """ Build a keep-alive session whose adapter pools connections and retries idempotent calls.
+
+    Only connection failures and the idempotent methods listed in `const.API_RETRY_METHODS`
+    are retried, so a refund or an invoice upload is never sent twice.
+
+    :return: The configured session.
+    :rtype: requests.Session
+    """
+    retry = Retry(
+        total=const.API_RETRY_TOTAL,
+        connect=const.API_RETRY_TOTAL,
+        read=const.API_RETRY_TOTAL,
+        status=const.API_RETRY_TOTAL,
+        backoff_factor=const.API_RETRY_BACKOFF_FACTOR,
+        status_forcelist=const.API_RETRY_STATUSES,
+        allowed_methods=const.API_RETRY_METHODS,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=const.API_POOL_MAXSIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(url):
+    """ Return the pooled session of the current worker for the host of the given URL.
+
+    :param str url: The URL that is about to be requested.
+    :return: The session dedicated to the URL's host.
+    :rtype: requests.Session
+    """
+    key = (os.getpid(), urlsplit(url).netloc)
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = _sessions[key] = _new_session()
+    return session
+
+
+def get_timeout(operation):
+    """ Return the (connect, read) timeout budget of an operation.
+
+    :param str operation: The operation name, as a key of `const.API_TIMEOUTS`.
+    :return: The timeout tuple, in seconds.
+    :rtype: tuple
+    """
+    return const.API_TIMEOUTS.get(operation, const.API_TIMEOUTS['default'])
+
+
+def request(method, url, operation='default', journal_db=None, **kwargs):
+    """ Send a request to PayU through the pooled session of the URL's host.
+
+    :param str method: The HTTP method of the request.
+    :param str url: The URL to reach.
+    :param str operation: The operation name, used to select the timeout budget.
+    :param str journal_db: The database whose call journal records the request, if any.
+    :param dict kwargs: Any other keyword argument accepted by `requests.Session.request`.
+    :return: The response of PayU.
+    :rtype: requests.Response
+    :raise requests.exceptions.RequestException: If the request fails.
+    """
+    kwargs.setdefault('timeout', get_timeout(operation))
+    start = time.perf_counter()
+    response = error = None
+    try:
+        with metrics.track('payu_request_duration_seconds', 'payu_request_errors_total', operation=operation):
+            response = get_session(url).request(method, url, **kwargs)
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        if journal_db:
+            journal.record(
+                journal_db, operation, method, url, params=kwargs.get('params'), data=kwargs.get('data'),
+                headers=kwargs.get('headers'), response=response, error=error,
+                duration=time.perf_counter() - start,
+            )
+    if not response.ok:
+        metrics.inc('payu_request_errors_total', operation=operation, error=f'http_{response.status_code}')
+    return response
+
+
+class MultipartFileStream:
+    """ File-like multipart/form-data body that streams one file instead of loading it in memory.
+
+    The body length is known in advance, so that the request is sent with a `Content-Length`
+    header rather than chunked.
+    """
+
+    def __init__(self, fields, file_field, filename, fileobj, file_size, file_type):
+        """
+        :param dict fields: The form fields sent before the file; `None` values are skipped.
+        :param str file_field: The name of the form field of the file.
+        :param str filename: The name of the file.
+        :param fileobj: The binary file-like object to stream.
+        :param int file_size: The size of the file, in bytes.
+        :param str file_type: The MIME type of the file.
+        """
+        boundary = uuid.uuid4().hex
+        self.fields = fields
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        head = ''.join(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            for name, value in fields.items() if value is not None
+        ) + (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+            f'filename="{filename}"\r\nContent-Type: {file_type}\r\n\r\n'
+        )
+        head, tail = head.encode('utf-8'), f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        self._parts = [io.BytesIO(head), fileobj, io.BytesIO(tail)]
+        self.len = len(head) + file_size + len(tail)
+
+    def read(self, size=-1):
+        chunks = []
+        while self._parts and size != 0:
+            chunk = self._parts[0].read(size)
+            if not chunk:
+                self._parts.pop(0)
+                continue
+            chunks.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b''.join(chunks)
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+""" Journal of the calls made to PayU, stored in the `payu.call.journal` model.
+
+The calls are buffered in memory by each worker process and written in batches by a background
+thread, with a cursor of their own, so that journaling a call costs no database round trip on
+the calling path and survives the rollback of the calling transaction. The bodies are redacted,
+truncated and compressed with zlib by the writer.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from collections import defaultdict
+from urllib.parse import parse_qsl
+
+from odoo import fields, modules, sql_db
+
+from odoo.addons.payment_payu import const, log_events, utils
+
+_logger = logging.getLogger(__name__)
+
+# The merchant key of the calls authenticated with an HMAC authorization header.
+_AUTHORIZATION_USERNAME = re.compile(r'username="([^"]*)"')
+
+_lock = threading.Lock()
+_buffer = []  # The (database name, call values) of the calls not written yet.
+_wakeup = threading.Event()
+_writer_pid = None
+
+
+def record(dbname, operation, method, url, params=None, data=None, headers=None, response=None,
+           error=None, duration=0.0):
+    """ Buffer a call made to PayU, to be written in the journal of a database.
+
+    :param str dbname: The database whose journal records the call.
+    :param str operation: The operation name of the call.
+    :param str method: The HTTP method of the call.
+    :param str url: The URL of the call.
+    :param dict params: The query parameters of the call.
+    :param data: The body of the call: a dict of form fields, a string or a file-like stream.
+    :param dict headers: The headers of the call, only used to identify the merchant.
+    :param response: The response of PayU, if any, as a `requests.Response` object.
+    :param str error: The error raised by the call, if any.
+    :param float duration: The duration of the call, in seconds.
+    :return: None
+    """
+    if hasattr(data, 'fields'):
+        # A multipart stream: its form fields are journaled, not its file.
+        data = {**data.fields, 'file': f'<{data.len} bytes>'}
+    elif data is not None and not isinstance(data, (dict, str, bytes)):
+        data = f"<{type(data).__name__} of {getattr(data, 'len', '?')} bytes>"
+    values = {
+        'date': fields.Datetime.now(),
+        'operation': operation,
+        'method': method,
+        'url': url.split('?', 1)[0],
+        'merchant_key': _get_merchant_key(params, data, headers),
+        'status_code': response.status_code if response is not None else None,
+        'duration_ms': round(duration * 1000),
+        'error': error,
+        'request': {'params': dict(params or {}), 'data': dict(data) if isinstance(data, dict) else data},
+        'response': response.text if response is not None else None,
+    }
+    with _lock:
+        if len(_buffer) >= const.JOURNAL_BUFFER_MAX:
+            del _buffer[0]
+        _buffer.append((dbname, values))
+        is_full = len(_buffer) >= const.JOURNAL_BATCH_SIZE
+    _ensure_writer()
+    if is_full:
+        _wakeup.set()
+
+
+def _get_merchant_key(params, data, headers):
+    for values in (data, params):
+        if isinstance(values, dict) and values.get('key'):
+            return values['key']
+    match = _AUTHORIZATION_USERNAME.search((headers or {}).get('Authorization') or '')
+    return match and match.group(1)
+
+
+# === WRITER === #
+
+def _ensure_writer():
+    """ Start the writer thread of the current process, unless running the tests, which flush
+    the journal explicitly. """
+    global _writer_pid
+    if _writer_pid == os.getpid() or modules.module.current_test:
+        return
+    with _lock:
+        if _writer_pid == os.getpid():
+            return
+        _writer_pid = os.getpid()
+    threading.Thread(target=_run_writer, name='payu_journal', daemon=True).start()
+
+
+def _run_writer():
+    while True:
+        _wakeup.wait(const.JOURNAL_FLUSH_INTERVAL)
+        _wakeup.clear()
+        try:
+            flush()
+        except Exception:
+            _logger.exception("PayU: could not write the call journal.")
+
+
+def _parse_body(value):
+    """ Return a body as a value that can be redacted: the text bodies are parsed as JSON or as
+    form fields, and replaced with their length when they are neither. """
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', 'replace')
+    if not isinstance(value, str) or not value:
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        pass
+    try:
+        return dict(parse_qsl(value, keep_blank_values=True, strict_parsing=True))
+    except ValueError:
+        return f'<{len(value)} characters, not redactable>'
+
+
+def _compress(value):
+    """ Return the redacted, truncated and zlib-compressed JSON or text of a body. """
+    if value is None:
+        return None
+    value = _parse_body(value)
+    if isinstance(value, str):
+        text = value
+    else:
+        try:
+            text = utils.json_dumps(log_events.redact(value))
+        except TypeError:
+            text = str(log_events.redact(value))
+    return zlib.compress(text[:const.JOURNAL_BODY_MAX_LENGTH].encode('utf-8'))
+
+
+def _insert(cr, calls):
+    row = "(%s, %s, %s, %s, (SELECT id FROM payu_credential WHERE merchant_key = %s ORDER BY id LIMIT 1), " \
+          "%s, %s, %s, %s, %s)"
+    params = []
+    for values in calls:
+        params += [
+            values['date'], values['operation'], values['method'], values['url'], values['merchant_key'],
+            values['status_code'], values['duration_ms'], values['error'],
+            _compress({**values['request'], 'data': _parse_body(values['request']['data'])}),
+            _compress(values['response']),
+        ]
+    cr.execute(f"""
+        INSERT INTO payu_call_journal (
+            date, operation, method, url, credential_id,
+            status_code, duration_ms, error, request_body, response_body
+        ) VALUES {', '.join([row] * len(calls))}
+    """, params)
+
+
+def flush(cr=None):
+    """ Write the buffered calls in the journal, with one statement per database.
+
+    :param cr: The cursor to write the calls of its database with; by default, each database is
+               written with a cursor of its own, committed right away.
+    :return: None
+    """
+    with _lock:
+        entries = _buffer[:]
+        _buffer.clear()
+    calls_by_dbname = defaultdict(list)
+    for dbname, values in entries:
+        calls_by_dbname[dbname].append(values)
+    for dbname, calls in calls_by_dbname.items():
+        try:
+            if cr is not None:
+                if dbname == cr.dbname:
+                    _insert(cr, calls)
+                continue
+            with sql_db.db_connect(dbname).cursor() as db_cr:
+                _insert(db_cr, calls)
+        except Exception:
+            _logger.warning("PayU: could not journal %d call(s) in %s.", len(calls), dbname, exc_info=True)
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+""" Structured logging of the PayU events.
+
+Each event is logged on its own logger, `odoo.addons.payment_payu.events.<event>`, at the level
+declared in `const.LOG_EVENTS`, so that an event can be silenced or enabled with the usual
+`--log-handler` option. High-volume events are sampled. The arguments are only redacted and
+serialized when a handler emits the record.
+"""
+import logging
+import random
+
+from odoo.addons.payment_payu import const, utils
+
+EVENT_LOGGER = 'odoo.addons.payment_payu.events'
+
+REDACTED = '***'
+
+# The (level, sample rate) of the events, by event.
+_EVENTS = {
+    event: (logging.getLevelName(level), sample_rate)
+    for event, (level, sample_rate) in const.LOG_EVENTS.items()
+}
+
+
+def redact(value):
+    """ Return a copy of the value where the values of the sensitive keys are masked.
+
+    :param value: The value to redact; dicts and lists are redacted recursively.
+    :return: The redacted value.
+    """
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if item and str(key).lower() in const.LOG_SENSITIVE_KEYS else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+class LazyPayload:
+    """ Log argument serializing a redacted payload only when the record is formatted. """
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        try:
+            text = utils.json_dumps(redact(self.value))
+        except TypeError:
+            text = str(redact(self.value))
+        if len(text) > const.LOG_PAYLOAD_MAX_LENGTH:
+            text = f'{text[:const.LOG_PAYLOAD_MAX_LENGTH]}... ({len(text)} characters)'
+        return text
+
+
+def get_event_logger(event):
+    return logging.getLogger(f'{EVENT_LOGGER}.{event}')
+
+
+def log_event(event, message, *args, exc_info=False):
+    """ Log a PayU event, unless its logger is disabled or the event is sampled out.
+
+    The `dict` and `list` arguments are redacted and serialized lazily.
+
+    :param str event: The event name, as a key of `const.LOG_EVENTS`.
+    :param str message: The %-style message of the event.
+    :param list args: The arguments of the message.
+    :param bool exc_info: Whether to log the current exception too.
+    """
+    level, sample_rate = _EVENTS[event]
+    logger = get_event_logger(event)
+    if not logger.isEnabledFor(level):
+        return
+    if sample_rate < 1 and random.random() >= sample_rate:
+        return
+    args = tuple(LazyPayload(arg) if isinstance(arg, (dict, list)) else arg for arg in args)
+    logger.log(level, message, *args, exc_info=exc_info, extra={'payu_event': event})
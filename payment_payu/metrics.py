@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+""" In-process metrics of the PayU integration, rendered in the Prometheus text format.
+
+Each worker process records its metrics in memory and periodically writes a snapshot of them in
+the data directory, so that a scrape, served by any worker, reports the totals of all the
+workers of the server.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from odoo.tools import config
+
+from odoo.addons.payment_payu import const
+
+_logger = logging.getLogger(__name__)
+
+# The declared metrics, as name: (type, help).
+METRICS = {
+    'payu_request_duration_seconds': (
+        'histogram', "Duration of the requests made to PayU, by operation and outcome."
+    ),
+    'payu_request_errors_total': (
+        'counter', "Failed requests made to PayU, by operation and error type."
+    ),
+    'payu_route_duration_seconds': (
+        'histogram', "Duration of the PayU HTTP routes, by route and outcome."
+    ),
+    'payu_route_errors_total': ('counter', "Failed PayU HTTP routes, by route and error type."),
+    'payu_route_rejections_total': (
+        'counter', "Requests turned down by the admission control, by route and reason."
+    ),
+    'payu_hash_verification_failures_total': (
+        'counter', "Notifications rejected by the hash verification, by reason."
+    ),
+    'payu_invoice_uploads_total': ('counter', "Invoice uploads to PayU, by outcome."),
+    'payu_settlement_rows_total': (
+        'counter', "Settlement rows received from PayU, by whether they matched a transaction."
+    ),
+    'payu_settlement_job_duration_seconds': (
+        'histogram', "Duration of the settlement sync jobs, by outcome."
+    ),
+}
+
+_lock = threading.Lock()
+_counters = {}  # The counter values, by (name, labels).
+_histograms = {}  # The [bucket counts..., sum, count] of the histograms, by (name, labels).
+_last_flush = time.monotonic()
+
+
+def _key(name, labels):
+    if name not in METRICS:
+        raise KeyError(f"Unknown PayU metric {name}")
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    """ Increment a counter.
+
+    :param str name: The name of the counter, as a key of `METRICS`.
+    :param float amount: The increment.
+    :param dict labels: The labels of the series.
+    """
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+    _flush_if_due()
+
+
+def observe(name, value, **labels):
+    """ Record an observation in a histogram.
+
+    :param str name: The name of the histogram, as a key of `METRICS`.
+    :param float value: The observed value.
+    :param dict labels: The labels of the series.
+    """
+    key = _key(name, labels)
+    buckets = const.METRICS_LATENCY_BUCKETS
+    with _lock:
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = [0] * (len(buckets) + 2)
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+    _flush_if_due()
+
+
+@contextmanager
+def track(histogram, errors_counter, **labels):
+    """ Observe the duration of a block and count its failure by exception type.
+
+    :param str histogram: The histogram of the durations, labelled with the `outcome` too.
+    :param str errors_counter: The counter of the errors, labelled with the `error` too.
+    :param dict labels: The labels of the series.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        observe(histogram, time.perf_counter() - start, outcome='error', **labels)
+        inc(errors_counter, error=type(e).__name__, **labels)
+        raise
+    observe(histogram, time.perf_counter() - start, outcome='ok', **labels)
+
+
+# === SNAPSHOTS === #
+
+def _get_snapshot_dir():
+    return os.path.join(config['data_dir'], 'payu_metrics')
+
+
+def _snapshot():
+    with _lock:
+        return {
+            'counters': [[name, labels, value] for (name, labels), value in _counters.items()],
+            'histograms': [[name, labels, list(series)] for (name, labels), series in _histograms.items()],
+        }
+
+
+def _flush_if_due():
+    global _last_flush
+    if time.monotonic() - _last_flush < const.METRICS_FLUSH_INTERVAL:
+        return
+    _last_flush = time.monotonic()
+    flush()
+
+
+def flush():
+    """ Write the snapshot of the metrics of the current process in the data directory. """
+    snapshot_dir = _get_snapshot_dir()
+    path = os.path.join(snapshot_dir, f'{os.getpid()}.json')
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as snapshot_file:
+            json.dump(_snapshot(), snapshot_file)
+        os.replace(f'{path}.tmp', path)
+    except OSError:
+        _logger.warning("PayU: could not write the metrics snapshot %s", path, exc_info=True)
+
+
+def _collect():
+    """ Return the metrics of all the processes: the live ones of the current process and the
+    snapshots of the others that were written recently enough. """
+    snapshots = [_snapshot()]
+    snapshot_dir = _get_snapshot_dir()
+    own_file = f'{os.getpid()}.json'
+    expiry = time.time() - const.METRICS_SNAPSHOT_TTL
+    if os.path.isdir(snapshot_dir):
+        for filename in os.listdir(snapshot_dir):
+            path = os.path.join(snapshot_dir, filename)
+            if filename == own_file or not filename.endswith('.json'):
+                continue
+            try:
+                if os.path.getmtime(path) < expiry:
+                    continue
+                with open(path, encoding='utf-8') as snapshot_file:
+                    snapshots.append(json.load(snapshot_file))
+            except (OSError, ValueError):
+                continue
+
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, series in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [0] * len(series))
+            for index, value in enumerate(series):
+                merged[index] += value
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{label}="{_escape(value)}"' for label, value in pairs) + '}'
+
+
+def render():
+    """ Return the metrics of the server in the Prometheus text exposition format.
+
+    :return: The exposition text.
+    :rtype: str
+    """
+    counters, histograms = _collect()
+    buckets = const.METRICS_LATENCY_BUCKETS
+    lines = []
+    for name, (metric_type, help_text) in METRICS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}']
+        if metric_type == 'counter':
+            for (series_name, labels), value in sorted(counters.items()):
+                if series_name == name:
+                    lines.append(f'{name}{_format_labels(labels)} {value}')
+        else:
+            for (series_name, labels), series in sorted(histograms.items()):
+                if series_name != name:
+                    continue
+                for bound, count in zip(buckets, series):
+                    lines.append(f'{name}_bucket{_format_labels(labels, le=bound)} {count}')
+                lines.append(f'{name}_bucket{_format_labels(labels, le="+Inf")} {series[-1]}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {series[-2]}')
+                lines.append(f'{name}_count{_format_labels(labels)} {series[-1]}')
+    return '\n'.join(lines) + '\n'
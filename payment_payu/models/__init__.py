@@ -1,4 +1,11 @@
 # -*- coding: utf-8 -*-
 from . import payment_provider
 from . import payment_transaction
-from . import payu_payment_provider_credentials
\ No newline at end of file
+from . import payu_payment_provider_credentials
+from . import payu_notification
+from . import payu_notification_fingerprint
+from . import payu_invoice_upload
+from . import sale_order
+from . import payu_refund_batch
+from . import payu_rate_bucket
+from . import payu_call_journal
@@ -1,9 +1,6 @@
 # -*- coding: utf-8 -*-
-import hashlib
 import logging
-import pprint
 import json
-import re
 
 import requests
 from urllib.parse import parse_qsl
@@ -11,7 +8,7 @@ from urllib.parse import parse_qsl
 from odoo import _, api, fields, models
 from odoo.exceptions import ValidationError, RedirectWarning
 
-from odoo.addons.payment_payu import const
+from odoo.addons.payment_payu import const, http_client, log_events, signer
 
 _logger = logging.getLogger(__name__)
 
@@ -25,7 +22,21 @@ class PayUPaymentProvider(models.Model):
     payu_credential_ids = fields.One2many(
         'payu.credential', 'provider_id', string='PAYU CREDENTIALS'
     )
+    payu_base_url = fields.Char(
+        string="PayU Base URL Override",
+        help="Send all the PayU requests and payments to this URL instead of the PayU servers, "
+             "e.g. http://localhost:8070 for the bundled simulator.",
+        groups='base.group_system',
+    )
     
+    #=== CRUD METHODS ===#
+
+    def unlink(self):
+        """ Override of `payment` to drop the cached credentials deleted by the cascade. """
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
     #=== ACTION METHODS ===#
 
     def action_payu_signup_redirect(self):
@@ -92,13 +103,31 @@ class PayUPaymentProvider(models.Model):
     def _get_payu_urls(self):
         """ Return the PayU URL based on the provider's state. """
         self.ensure_one()
-        if self.state == 'test':
-            return {'payu_form_url': 'https://test.payu.in/_payment'}
-        else:
-            return {'payu_form_url': 'https://secure.payu.in/_payment'}
+        return {'payu_form_url': self._payu_get_api_url('payment', '_payment')}
+
+    def _payu_get_api_url(self, service, path):
+        """ Return the URL of a PayU endpoint, on the base URL override if one is set.
+
+        Note: self.ensure_one()
+
+        :param str service: The PayU service of the endpoint: `payment` for the hosted checkout,
+                            `api` for the merchant APIs.
+        :param str path: The path of the endpoint, relative to the host.
+        :return: The URL of the endpoint.
+        :rtype: str
+        """
+        self.ensure_one()
+        base_url = self.sudo().payu_base_url
+        if not base_url:
+            if self.state == 'test':
+                host = const.PAYU_TEST_HOST
+            else:
+                host = const.PAYU_PAYMENT_HOST if service == 'payment' else const.PAYU_API_HOST
+            base_url = f'https://{host}'
+        return f'{base_url.rstrip("/")}/{path}'
 
 
-    def _payu_make_request(self, url, bearer_token = None, query_params = None, data = None, method = "POST"):
+    def _payu_make_request(self, url, bearer_token = None, query_params = None, data = None, method = "POST", operation = 'default'):
         """ Make a request to PayU API at the specified endpoint.
 
         Note: self.ensure_one()
@@ -106,6 +135,7 @@ class PayUPaymentProvider(models.Model):
         :param str endpoint: The endpoint to be reached by the request.
         :param dict data: The payload of the request.
         :param str method: The HTTP method of the request.
+        :param str operation: The operation name, used to select the timeout budget.
         :return The JSON-formatted content of the response.
         :rtype: dict
         :raise ValidationError: If an HTTP error occurs.
@@ -121,40 +151,69 @@ class PayUPaymentProvider(models.Model):
         
 
         try:
-            _logger.info("Url: %s, Params: %s, Data: %s", url, query_params, data)
-            if method == "GET":
-                response = requests.get(
-                        url,
-                        params=query_params,
-                        headers=headers
-                    )
-            else:
-                response = requests.post(
-                        url,
-                        params=query_params,
-                        headers=headers,
-                        data=data
-                    )
-
-            response.raise_for_status()
-
+            log_events.log_event(
+                'api.request', "PayU: %s %s (%s), params: %s, data: %s",
+                method, url, operation, query_params or {}, data or {},
+            )
+            response = http_client.request(
+                method,
+                url,
+                operation=operation,
+                params=query_params,
+                headers=headers,
+                data=data if method != "GET" else None,
+                journal_db=self.env.cr.dbname,
+            )
         except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
-            _logger.exception("Unable to reach endpoint at %s", url)
+            log_events.log_event('api.error', "PayU: unable to reach endpoint at %s", url, exc_info=True)
             raise ValidationError(
                 "PayU: " + _("Could not establish the connection to the API.")
             )
 
+        return self._payu_parse_response(url, response, data=data)
+
+    def _payu_parse_response(self, url, response, data=None):
+        """ Return the JSON-formatted content of a response of the PayU API.
+
+        :param str url: The URL of the request.
+        :param requests.Response response: The response of PayU.
+        :param dict data: The payload of the request, logged if the request is rejected.
+        :return: The JSON-formatted content of the response.
+        :rtype: dict
+        :raise ValidationError: If the response is an HTTP error or is not JSON.
+        """
+        try:
+            response.raise_for_status()
         except requests.exceptions.HTTPError:
-            _logger.exception(
-                "Invalid API request at %s with data:\n%s", url, pprint.pformat(data),
+            log_events.log_event(
+                'api.error', "PayU: invalid API request at %s with data: %s", url, data or {},
+                exc_info=True,
             )
             raise ValidationError(_(
                 "PayU gave us the following information: '%s'",
-                response.json()
+                response.text[:const.LOG_PAYLOAD_MAX_LENGTH]
             ))
 
-        return json.loads(response.text)
-    
+        try:
+            return json.loads(response.text)
+        except ValueError:
+            # E.g. the HTML page of a maintenance or of a proxy error, answered with a 200.
+            log_events.log_event('api.error', "PayU: non-JSON response from %s", url)
+            raise ValidationError("PayU: " + _("Received an unexpected response from the API."))
+
+    def _payu_get_credential(self, currency):
+        """ Return the PayU credential of the provider for the given currency.
+
+        Note: self.ensure_one()
+
+        :param res.currency currency: The currency record to select credentials for.
+        :return: The credential, or an empty recordset if none is configured.
+        :rtype: recordset of `payu.credential`
+        """
+        self.ensure_one()
+        Credential = self.env['payu.credential']
+        return Credential.browse(Credential._get_credential_id(self.id, currency.id))
+
     def _payu_generate_sign(self, hash_param_const_name, values, currency):
         """
         Generate the PayU signature (hash) based on currency-specific credentials.
@@ -165,34 +224,36 @@ class PayUPaymentProvider(models.Model):
         :return: The generated signature as a hex string.
         :rtype: str
         """
-        def safe_str(val):
-            return str(val or '').strip()
-
         # Fetch credentials for the given currency
-        credential = self.payu_credential_ids.filtered(lambda cred: cred.currency_id == currency)
+        credential = self._payu_get_credential(currency)
         
         if not credential:
             raise ValidationError(_("No PayU credentials found for currency %s.") % currency.name)
 
-        _logger.info(f"Fetched PayU credentials for currency {currency.name}: Merchant Key = {credential.merchant_key}, Merchant Salt = {credential.merchant_salt}");
-        
-        salt_value = credential.merchant_salt
+        sign = signer.get_signer(hash_param_const_name).sign(values, credential.merchant_salt)
 
-        hash_param_keys = getattr(const, hash_param_const_name, [])
+        log_events.log_event(
+            'sign.computed', "PayU: signed %s values with the credential %s of %s.",
+            hash_param_const_name, credential.id, currency.name,
+        )
+        return sign
 
-        hash_string_parts = []
-        for hash_param in hash_param_keys:
-            if hash_param == '_SALT_':
-                hash_string_parts.append(salt_value)
-            else:
-                hash_string_parts.append(safe_str(values.get(hash_param)))
+    def _payu_generate_signs(self, hash_param_const_name, values_list, currency):
+        """
+        Generate the PayU signatures (hashes) of several values dicts in one call.
 
-        hash_string = '|'.join(hash_string_parts)
-        hash_string = re.sub(r'^[\s|]+|[\s|]+$', '', hash_string)
+        :param str hash_param_const_name: The constant name specifying hash param keys.
+        :param list values_list: The values dicts used to generate the signatures.
+        :param res.currency currency: The currency record to select credentials for.
+        :return: The generated signatures as hex strings, in the order of `values_list`.
+        :rtype: list
+        """
+        credential = self._payu_get_credential(currency)
 
-        _logger.info('Hash String for currency %s: %s', currency.name, hash_string)
+        if not credential:
+            raise ValidationError(_("No PayU credentials found for currency %s.") % currency.name)
 
-        return hashlib.sha512(hash_string.encode('utf-8')).hexdigest()
+        return signer.get_signer(hash_param_const_name).sign_many(values_list, credential.merchant_salt)
     
     def action_save_payu_credentials(self):
         self.ensure_one()
@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
+import io
 import logging
-import pprint
 import json
+import time
 import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import quote, urlencode, urlsplit
 from werkzeug.urls import url_join
 from datetime import datetime, timezone, timedelta
 
@@ -12,26 +17,46 @@ import base64
 
 import requests
 
-import requests
-
-from odoo import _, api, fields, models
+from odoo import _, api, fields, models, modules
 from odoo.http import request
 from odoo.exceptions import ValidationError
+from odoo.tools import split_every
+
+from odoo.addons.payment import utils as payment_utils
+from odoo.addons.payment_payu import const, http_client, log_events, metrics, utils
 
 _logger = logging.getLogger(__name__)
 
 PAYU_CREDENTIAL = 'payu.credential'
-PROD_BASE_URL = 'info.payu.in'
-TEST_BASE_URL = 'test.payu.in'
+INVOICE_ATTACHMENT_PREFIX = 'payu_invoice:'
 
 class PaymentTransaction(models.Model):
     _inherit = 'payment.transaction'
 
+    # Indexed to reconcile settlements, which are matched on the PayU id (mihpayid).
+    provider_reference = fields.Char(index='btree_not_null')
+
     refund_bank_reference = fields.Char(
         string="Refund Bank Reference",
         help="Bank reference number for the refund transaction"
     )
 
+    # Indexed by its unique constraint to route the notifications, which carry the PayU
+    # transaction id (txnid).
+    payu_txnid = fields.Char(
+        string="PayU Transaction ID",
+        help="Identifier of the payment sent to PayU, used to verify its status",
+        readonly=True,
+        copy=False,
+    )
+
+    payu_refund_request_id = fields.Char(
+        string="PayU Refund Request ID",
+        help="Identifier of the refund request at PayU, used to check its status",
+        readonly=True,
+        index='btree_not_null',
+    )
+
     settled_amount = fields.Float(
         string="Settled Amount",
         help="Amount settled for this transaction"
@@ -54,6 +79,18 @@ class PaymentTransaction(models.Model):
 
     is_refund = fields.Boolean(string="Is Refund", compute="_compute_is_refund")
 
+    _sql_constraints = [
+        ('payu_txnid_uniq', 'unique(payu_txnid)', 'A PayU transaction id can only belong to one transaction.')
+    ]
+
+    def init(self):
+        super().init()
+        # Record when the PayU transaction ids started being stored: the payments without one
+        # created before then may have reached PayU.
+        ICP = self.env['ir.config_parameter'].sudo()
+        if not ICP.get_param('payment_payu.txnid_tracking_date'):
+            ICP.set_param('payment_payu.txnid_tracking_date', fields.Datetime.to_string(fields.Datetime.now()))
+
     @api.depends('amount')
     def _compute_is_refund(self):
         for tx in self:
@@ -64,52 +101,76 @@ class PaymentTransaction(models.Model):
         return ' '.join(product_names)
 
     def get_cart_details(self, order):
-        sku_details = []
-
-        for line in order.order_line:
-            product = line.product_id
-            sku_details.append({
-                "sku_id": product.default_code or str(product.id),
-                "sku_name": product.name,
-                "amount_per_sku": f"{line.price_total:.2f}",
-                "quantity": int(line.product_uom_qty),
-                # You can attach specific offers per SKU here
-                "offer_key": [],
-                "offer_auto_apply": True 
-            })
-
-        cart_details = {
-            "amount": float(order.amount_total),
-            "items": int(sum(line.product_uom_qty for line in order.order_line)),
-            "surcharges": 0,  # Fill as needed
-            "pre_discount": float(order.amount_undiscounted),  # Fill as needed (e.g., coupon applied before PayU)
-            "sku_details": sku_details
-        }
-        return json.dumps(cart_details)
+        return self._payu_serialize_cart(
+            order.order_line, 'product_uom_qty', order.amount_total, order.amount_undiscounted
+        )
     
     def get_invoice_cart_details(self, invoice):
-        sku_details = []
+        return self._payu_serialize_cart(
+            invoice.invoice_line_ids, 'quantity', invoice.amount_total, invoice.amount_untaxed
+        )
+
+    def _payu_serialize_cart(self, lines, quantity_field, amount, pre_discount):
+        """ Serialize order or invoice lines into the `cart_details` sent to PayU, in a single pass.
+
+        The fields read on the lines and their products are fetched in bulk beforehand, so that
+        the number of queries does not depend on the number of lines.
+
+        :param lines: The lines to serialize, as `sale.order.line` or `account.move.line` records.
+        :param str quantity_field: The name of the quantity field of the lines.
+        :param float amount: The total amount of the cart.
+        :param float pre_discount: The amount of the cart before discounts.
+        :return: The cart details, as a JSON document.
+        :rtype: str
+        :raise ValidationError: If the cart has too many lines to be sent to PayU.
+        """
+        lines.fetch(['product_id', 'price_total', quantity_field])
+        lines.product_id.fetch(['default_code', 'name'])
 
-        for line in invoice.invoice_line_ids:
+        sku_details = []
+        items = 0
+        for line in lines:
             product = line.product_id
+            quantity = getattr(line, quantity_field)
+            items += quantity
             sku_details.append({
                 "sku_id": product.default_code or str(product.id),
                 "sku_name": product.name,
                 "amount_per_sku": f"{line.price_total:.2f}",
-                "quantity": int(line.quantity),
+                "quantity": int(quantity),
+                # You can attach specific offers per SKU here
                 "offer_key": [],
                 "offer_auto_apply": True
             })
 
         cart_details = {
-            "amount": float(invoice.amount_total),
-            "items": int(sum(line.quantity for line in invoice.invoice_line_ids)),
-            "surcharges": 0,
-            "pre_discount": float(invoice.amount_untaxed),
+            "amount": float(amount),
+            "items": int(items),
+            "surcharges": 0,  # Fill as needed
+            "pre_discount": float(pre_discount),  # Fill as needed (e.g., coupon applied before PayU)
             "sku_details": sku_details
         }
+        try:
+            return utils.dump_cart_details(cart_details)
+        except ValueError as error:
+            _logger.warning("PayU: %s", error)
+            raise ValidationError("PayU: " + _(
+                "The cart has too many lines to be sent to PayU. Please split it into several payments."
+            ))
+
+    def _get_specific_processing_values(self, processing_values):
+        """ Override of payment to return the URL of the status of the transaction, for the front
+        ends polling it while waiting for the notification.
+
+        :param dict processing_values: The generic processing values of the transaction.
+        :return: The dict of payu-specific processing values.
+        :rtype: dict
+        """
+        res = super()._get_specific_processing_values(processing_values)
+        if self.provider_code != 'payu':
+            return res
 
-        return json.dumps(cart_details)
+        return {**res, 'payu_status_url': self._payu_get_status_url()}
 
     def _get_specific_rendering_values(self, processing_values):
         """ Override of payment to return a dict of payu-specific values used to render the redirect form.
@@ -128,11 +189,7 @@ class PaymentTransaction(models.Model):
 
         currency = self.currency_id
 
-        # Fetch the PayU credential record for this provider and currency
-        credential = self.env[PAYU_CREDENTIAL].search([
-            ('provider_id', '=', provider.id),
-            ('currency_id', '=', currency.id)
-        ], limit=1)
+        credential = provider._payu_get_credential(currency)
         
 
         if not credential:
@@ -176,7 +233,8 @@ class PaymentTransaction(models.Model):
         payu_values = {
             'api_version': 14,
             'key': payu_key,
-            'txnid': str(uuid.uuid4()),
+            # Re-rendering the checkout must not register another payment at PayU.
+            'txnid': self.payu_txnid or str(uuid.uuid4()),
             'amount': f"{self.amount:.2f}",
             'productinfo': 'Odoo product',
             'cart_details': cart_details,
@@ -191,17 +249,17 @@ class PaymentTransaction(models.Model):
         }
 
         payu_values['hash'] = provider._payu_generate_sign('PAYMENT_HASH_PARAMS', payu_values, currency)
+        if self.payu_txnid != payu_values['txnid']:
+            self.payu_txnid = payu_values['txnid']
 
-        payment_dns = self._get_payment_dns(provider)
+        payu_values['action_url'] = provider._payu_get_api_url('payment', '_payment')
 
-        payu_values['action_url'] = f'https://{payment_dns}/_payment'
-
-        _logger.debug(f"Prepared PayU payment values: {payu_values}")
+        log_events.log_event('rendering.values', "PayU: prepared payment values: %s", payu_values)
 
         return payu_values
 
     def _get_payment_dns(self, provider):
-        payment_dns = TEST_BASE_URL if provider.state == 'test' else 'secure.payu.in'
+        payment_dns = urlsplit(provider._payu_get_api_url('payment', '_payment')).netloc
         return payment_dns    
 
     def _get_tx_from_notification_data(self, provider_code, notification_data):
@@ -217,36 +275,106 @@ class PaymentTransaction(models.Model):
         if provider_code != 'payu' or len(tx) == 1:
             return tx
 
+        txnid = notification_data.get('txnid')
         reference = notification_data.get('udf2')
-        if not reference: 
+        if not txnid and not reference:
             raise ValidationError("PayU: " + _("Received data with a missing transaction identifier (udf2)."))
 
-        tx = self.search([('reference', '=', reference), ('provider_code', '=', 'payu')])
+        tx = self._payu_search_transaction(txnid=txnid, reference=reference)
         if not tx:
             raise ValidationError(
-                "PayU: " + _("No transaction found matching reference %s.", reference)
+                "PayU: " + _("No transaction found matching reference %s.", reference or txnid)
             )
         return tx
+
+    @api.model
+    def _payu_search_transaction(self, txnid=None, reference=None):
+        """ Return the PayU transaction of a PayU transaction id, or else of a reference.
+
+        Both are unique and indexed, so that each lookup is a single index probe; the provider is
+        checked on the record found rather than in the domain, which would join the provider.
+
+        :param str txnid: The PayU transaction id of the payment.
+        :param str reference: The reference of the transaction, used for the payments sent to
+                              PayU before their transaction id was stored.
+        :return: The transaction, if any.
+        :rtype: recordset of `payment.transaction`
+        """
+        tx = self.browse()
+        if txnid:
+            tx = self.search([('payu_txnid', '=', txnid)], limit=1)
+        if not tx and reference:
+            tx = self.search([('reference', '=', reference)], limit=1)
+        return tx if tx.provider_code == 'payu' else self.browse()
     
+    @api.model
+    def _payu_get_status(self, reference):
+        """ Return the status of a PayU transaction, read with a single narrow query.
+
+        :param str reference: The reference of the transaction.
+        :return: The id, reference, state, amount and currency of the transaction, or None if
+                 no PayU transaction has this reference.
+        :rtype: dict
+        """
+        self.flush_model(['reference', 'state', 'amount', 'currency_id', 'provider_id'])
+        self.env.cr.execute("""
+            SELECT tx.id, tx.state, tx.amount, currency.name
+              FROM payment_transaction tx
+              JOIN payment_provider provider ON provider.id = tx.provider_id
+              JOIN res_currency currency ON currency.id = tx.currency_id
+             WHERE tx.reference = %s AND provider.code = 'payu'
+        """, [reference])
+        row = self.env.cr.fetchone()
+        if not row:
+            return None
+        tx_id, state, amount, currency = row
+        return {
+            'id': tx_id, 'reference': reference, 'state': state, 'amount': float(amount), 'currency': currency,
+        }
+
+    def _payu_get_status_access_token(self):
+        """ Return the token granting access to the status of the transaction, for the front
+        ends polling it without the session of the customer.
+
+        Note: self.ensure_one()
+
+        :return: The access token.
+        :rtype: str
+        """
+        self.ensure_one()
+        return payment_utils.generate_access_token(self.reference, env=self.env)
+
+    def _payu_get_status_url(self):
+        """ Return the URL of the status of the transaction, with its access token.
+
+        Note: self.ensure_one()
+
+        :return: The URL, relative to the base URL of the website.
+        :rtype: str
+        """
+        self.ensure_one()
+        query = urlencode({'access_token': self._payu_get_status_access_token()})
+        return f"/payment/payu/status/{quote(self.reference, safe='')}?{query}"
+
+    def _payu_get_discount_product(self):
+        """ Return the product of the discount lines, shipped as module data. """
+        return self.env.ref('payment_payu.product_pg_discount').sudo()
+
     def apply_global_discount_to_invoice(self, invoice, discount_amount):
         """
         Apply a global discount to the invoice as a negative invoice line with zero tax.
+        The discount line of a previous notification is updated in place.
         :param invoice: record of account.move (invoice)
         :param discount_amount: discount amount (float, positive)
         """
-        # Find or create the discount product (make sure it's configured in Odoo)
-        discount_product = self.env['product.product'].search([('name', '=', 'PG Discount')], limit=1)
-        if not discount_product:
-            discount_product = self.env['product.product'].create({
-                'name': 'PG Discount',
-                'type': 'service',
-                'sale_ok': True,
-                'list_price': 0.0,
-            })
+        discount_product = self._payu_get_discount_product()
 
-        # Remove previous discount lines to avoid duplicates
-        previous_discount_lines = invoice.invoice_line_ids.filtered(lambda l: l.product_id == discount_product)
-        previous_discount_lines.unlink()
+        discount_lines = invoice.invoice_line_ids.filtered(lambda l: l.product_id == discount_product)
+        if discount_lines:
+            # Remove duplicates left by earlier versions, then update the remaining line
+            discount_lines[1:].unlink()
+            discount_lines[:1].write({'quantity': 1, 'price_unit': -abs(discount_amount)})
+            return
 
         # Prepare zero taxes
         zero_taxes = self.env['account.tax']
@@ -264,23 +392,20 @@ class PaymentTransaction(models.Model):
     def apply_global_discount_to_order(self, sale_order, discount_amount):
         """
         Apply a global discount to the sale order as a negative order line with zero tax.
+        The discount line of a previous notification is updated in place; the order totals are
+        recomputed once, by the ORM, when they are next read.
         :param sale_order: record of sale.order
         :param discount_amount: discount amount (float, positive)
         """
-        # Find or create the discount product (make sure it's configured in Odoo)
-        discount_product = self.env['product.product'].search([('name', '=', 'PG Discount')], limit=1)
-        if not discount_product:
-            discount_product = self.env['product.product'].create({
-                'name': 'PG Discount',
-                'type': 'service',
-                'sale_ok': True,
-                'list_price': 0.0,
-            })
-        
-        # Remove previous discount lines to avoid duplicates
-        previous_discount_lines = sale_order.order_line.filtered(lambda l: l.product_id == discount_product)
-        previous_discount_lines.unlink()
-        
+        discount_product = self._payu_get_discount_product()
+
+        discount_lines = sale_order.order_line.filtered(lambda l: l.product_id == discount_product)
+        if discount_lines:
+            # Remove duplicates left by earlier versions, then update the remaining line
+            discount_lines[1:].unlink()
+            discount_lines[:1].write({'product_uom_qty': 1, 'price_unit': -abs(discount_amount)})
+            return
+
         # Prepare zero taxes
         zero_taxes = self.env['account.tax']
         
@@ -294,9 +419,6 @@ class PaymentTransaction(models.Model):
             'tax_id': [(6, 0, zero_taxes.ids)],    # No taxes applied
         })
 
-        # Recompute order totals
-        sale_order._compute_amounts()
-
     def send_capture_request(self, amount_to_capture=None):
         """
         Override of payment to capture the transaction.
@@ -335,15 +457,83 @@ class PaymentTransaction(models.Model):
         if self.provider_code != 'payu':
             return refund_tx
 
+        url, data = self._payu_prepare_refund_request(refund_tx, amount_to_refund)
+        refund_response = self.provider_id._payu_make_request(
+            url, query_params={'form': '2'}, data=data, operation='refund'
+        )
+        refund_tx._payu_apply_refund_response(refund_response)
+        return refund_tx
+
+    def _payu_get_refundable_amount(self, excluded_lines=None):
+        """ Return the amount of the transaction that is not refunded or being refunded.
+
+        The amounts of the bulk refund lines waiting to be sent are reserved too.
+
+        Note: self.ensure_one()
+
+        :param recordset excluded_lines: The bulk refund lines whose amount is not reserved, as
+                                         `payu.refund.batch.line` records.
+        :return: The refundable amount.
+        :rtype: float
+        """
+        self.ensure_one()
+        refund_txs = self.child_transaction_ids.filtered(
+            lambda tx: tx.operation == 'refund' and tx.state not in ('cancel', 'error')
+        )
+        reserved_lines = self.env['payu.refund.batch.line'].sudo().search([
+            ('source_transaction_id', '=', self.id),
+            ('state', '=', 'pending'),
+            ('id', 'not in', excluded_lines.ids if excluded_lines else []),
+        ])
+        return self.amount + sum(refund_txs.mapped('amount')) - sum(reserved_lines.mapped('amount'))
+
+    def action_payu_bulk_refund(self):
+        """ Refund the remaining amount of the selected PayU payments in the background.
+
+        :return: The action opening the bulk refund.
+        :rtype: dict
+        """
+        batch = self.env['payu.refund.batch']._create_from_transactions(self)
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'payu.refund.batch',
+            'res_id': batch.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
+
+    def _payu_create_refund_transaction(self, amount_to_refund):
+        """ Create the refund transaction of a refund sent outside of `_send_refund_request`.
+
+        Note: self.ensure_one()
+
+        :param float amount_to_refund: The amount to refund.
+        :return: The refund transaction.
+        :rtype: recordset of `payment.transaction`
+        """
+        self.ensure_one()
+        self._ensure_provider_is_not_disabled()
+        refund_tx = self._create_child_transaction(amount_to_refund, is_refund=True)
+        refund_tx._log_sent_message()
+        return refund_tx
+
+    def _payu_prepare_refund_request(self, refund_tx, amount_to_refund):
+        """ Return the URL and the signed data of the refund request of a transaction.
+
+        Note: self.ensure_one()
+
+        :param recordset refund_tx: The refund transaction, as a `payment.transaction` record.
+        :param float amount_to_refund: The amount to refund.
+        :return: The URL and the data of the request.
+        :rtype: tuple
+        :raise ValidationError: If no credential is configured for the currency.
+        """
+        self.ensure_one()
         provider = self.provider_id
         currency = self.currency_id
-        
-        # Fetch the PayU credential record for this provider and currency
-        credential = self.env[PAYU_CREDENTIAL].search([
-            ('provider_id', '=', provider.id),
-            ('currency_id', '=', currency.id)
-        ], limit=1)
-        
+
+        credential = provider._payu_get_credential(currency)
+
         if not credential:
             raise ValidationError(_("PayU: No credentials configured for currency %s.") % currency.name)
 
@@ -358,26 +548,142 @@ class PaymentTransaction(models.Model):
         hash_ = provider._payu_generate_sign("REFUND_HASH_PARAMS", values, currency)
         data = {**values, 'hash': hash_}
 
-        url_host = TEST_BASE_URL if provider.state == 'test' else PROD_BASE_URL;
-        url = f'https://{url_host}/merchant/postservice.php'
+        url = provider._payu_get_api_url('api', 'merchant/postservice.php')
+        return url, data
 
-        query_params = {
-            "form": "2"
-        }
+    def _payu_apply_refund_response(self, refund_response):
+        """ Update the refund transaction with the response of its refund request.
+
+        Note: self.ensure_one()
+
+        :param dict refund_response: The JSON response of PayU.
+        """
+        self.ensure_one()
+        log_events.log_event(
+            'refund.response', "PayU: refund %s response: %s", self.reference, refund_response
+        )
 
-        refund_response = provider._payu_make_request(url, query_params=query_params, data=data)
-        _logger.info('Refund Response: %s', json.dumps(refund_response, indent=2))
+        if not refund_response:
+            self._set_error(_("Your refund failed. Reason: %s", _("PayU returned an empty response.")))
+            return
 
-        if refund_response and refund_response['status'] == 1 and refund_response['error_code'] == 102:
-            refund_tx._set_done()
-            refund_tx.provider_reference = refund_response['mihpayid']        
-            refund_tx.env.ref('payment.cron_post_process_payment_tx')._trigger()
+        if refund_response.get('request_id'):
+            self.payu_refund_request_id = str(refund_response['request_id'])
+        self.provider_reference = refund_response.get('mihpayid')
+
+        status = refund_response.get('status')
+        if status == 1 and refund_response.get('error_code') == 102:
+            self._set_done()
+            self.env.ref('payment.cron_post_process_payment_tx')._trigger()
+        elif self.payu_refund_request_id:
+            # PayU took the request without confirming it: the refund status cron settles it with
+            # the request id.
+            self._set_pending(_("PayU is processing the refund: %s", refund_response.get('msg')))
         else:
-            refund_tx.provider_reference = refund_response['mihpayid']
-            refund_tx._set_error(_("Your refund failed. Reason: %s", refund_response['msg']))
+            self._set_error(_(
+                "Your refund failed. Reason: %s", refund_response.get('msg') or _("Unknown error")
+            ))
 
+    @api.model
+    def _cron_reconcile_refunds(self, batch_size=None):
+        """ Settle the pending PayU refunds with the status of their refund request at PayU.
 
-        return refund_tx
+        The statuses are fetched with one `check_action_status` call per batch of
+        `const.REFUND_STATUS_BATCH_SIZE` request ids, which are pipe-separated, and each batch is
+        committed once applied.
+        """
+        auto_commit = not modules.module.current_test
+        refund_txs = self.search([
+            ('provider_code', '=', 'payu'),
+            ('operation', '=', 'refund'),
+            ('state', '=', 'pending'),
+            ('payu_refund_request_id', '!=', False),
+        ], order='id')
+        for (provider, currency), txs in refund_txs.grouped(
+            lambda tx: (tx.provider_id, tx.currency_id)
+        ).items():
+            if not provider._payu_get_credential(currency):
+                _logger.warning(
+                    "PayU: no credential for %s to check %d refund(s).", currency.name, len(txs)
+                )
+                continue
+            for batch in split_every(batch_size or const.REFUND_STATUS_BATCH_SIZE, txs.ids, self.browse):
+                try:
+                    statuses = self._payu_fetch_refund_statuses(
+                        provider, currency, batch.mapped('payu_refund_request_id')
+                    )
+                except ValidationError as e:
+                    _logger.warning("PayU: could not check the status of %d refund(s): %s", len(batch), e)
+                    continue
+                batch._payu_apply_refund_statuses(statuses)
+                if auto_commit:
+                    self.env.cr.commit()
+
+    @api.model
+    def _payu_fetch_refund_statuses(self, provider, currency, request_ids):
+        """ Return the status of several refund requests, fetched with a single call.
+
+        :param recordset provider: The PayU provider, as a `payment.provider` record.
+        :param recordset currency: The currency of the refunds, as a `res.currency` record.
+        :param list request_ids: The refund request ids to check.
+        :return: The details of the refund actions, by request id.
+        :rtype: dict
+        """
+        credential = provider._payu_get_credential(currency)
+        values = {
+            'key': credential.merchant_key,
+            'command': 'check_action_status',
+            'var1': '|'.join(request_ids),
+        }
+        data = {**values, 'hash': provider._payu_generate_sign('CHECK_ACTION_STATUS_HASH_PARAMS', values, currency)}
+        response = provider._payu_make_request(
+            provider._payu_get_api_url('api', 'merchant/postservice.php'),
+            query_params={'form': '2'}, data=data, operation='refund_status',
+        )
+        details = response.get('transaction_details') or {}
+        statuses = {}
+        for request_id in request_ids:
+            action = details.get(request_id)
+            # The details of an action are nested under its request id.
+            if isinstance(action, dict) and isinstance(action.get(request_id), dict):
+                action = action[request_id]
+            if isinstance(action, dict):
+                statuses[request_id] = action
+        return statuses
+
+    def _payu_apply_refund_statuses(self, statuses):
+        """ Update the refund transactions with the status of their refund request.
+
+        The transactions sharing the same outcome are updated together.
+
+        :param dict statuses: The details of the refund actions, by request id.
+        """
+        done_txs = self.browse()
+        failed_txs_by_message = defaultdict(lambda: self.browse())
+        for tx in self:
+            action = statuses.get(tx.payu_refund_request_id)
+            if not action:
+                continue
+            status = str(action.get('status') or '').lower()
+            if status in const.REFUND_STATUS_SUCCESS:
+                done_txs |= tx
+                if action.get('bank_ref_num') and action['bank_ref_num'] != tx.refund_bank_reference:
+                    tx.refund_bank_reference = action['bank_ref_num']
+            elif status in const.REFUND_STATUS_FAILURE:
+                failed_txs_by_message[action.get('msg') or status] |= tx
+
+        if done_txs:
+            done_txs._set_done()
+            self.env.ref('payment.cron_post_process_payment_tx')._trigger()
+        for message, txs in failed_txs_by_message.items():
+            txs._set_error(_("Your refund failed. Reason: %s", message))
+        self.env['payu.refund.batch.line'].sudo()._sync_queued_lines(
+            done_txs.union(*failed_txs_by_message.values())
+        )
+        _logger.info(
+            "PayU: checked %d refund(s): %d done, %d failed.",
+            len(self), len(done_txs), sum(len(txs) for txs in failed_txs_by_message.values()),
+        )
 
 
     def _process_notification_data(self, data):
@@ -385,11 +691,33 @@ class PaymentTransaction(models.Model):
         if self.provider_code != 'payu':
             return
 
+        if not self._payu_lock_for_notification():
+            _logger.info("PayU: tx %s is being processed by another worker, skipping.", self.reference)
+            return
+
         if data is None:
             self._set_canceled()
             return
 
+        # Deliveries of an already processed outcome (redirect, webhook and its retries) stop here.
+        if not self.env['payu.notification.fingerprint'].sudo()._claim(data, self):
+            _logger.info(
+                "PayU: notification %s (%s) for tx %s was already processed, skipping.",
+                data.get('mihpayid'), data.get('status'), self.reference,
+            )
+            return
+
         self._payu_verify_return_sign(data)
+        self._payu_apply_payment_status(data)
+
+    def _payu_apply_payment_status(self, data):
+        """ Update the transaction with the outcome of its payment reported by PayU.
+
+        Note: self.ensure_one()
+
+        :param dict data: The payment data, whose origin is already verified.
+        :return: None
+        """
         self.provider_reference = data.get('mihpayid')
 
         status = data.get('status')
@@ -400,6 +728,158 @@ class PaymentTransaction(models.Model):
         else:
             self._set_canceled()
 
+    @api.model
+    def _cron_verify_pending_payments(self, batch_size=None, limit=None):
+        """ Verify the stale PayU payments whose outcome was never notified.
+
+        The payments still draft or pending `const.PAYMENT_VERIFY_DELAY` minutes after their
+        creation are verified with one `verify_payment` call per batch of
+        `const.PAYMENT_VERIFY_BATCH_SIZE` PayU transaction ids, which are pipe-separated. The
+        successful and failed ones are processed like a notification, and those that PayU does
+        not report as completed are canceled once `const.PAYMENT_VERIFY_CANCEL_DELAY` minutes
+        old. At most `const.PAYMENT_VERIFY_MAX_PER_RUN` payments are verified per run, and each
+        batch is committed once applied.
+        """
+        auto_commit = not modules.module.current_test
+        now = fields.Datetime.now()
+        cancel_before = now - timedelta(minutes=const.PAYMENT_VERIFY_CANCEL_DELAY)
+        # The payments created before the PayU transaction ids were stored have none, although
+        # they may have reached PayU: they cannot be verified, and are left out of the sweep.
+        txnid_tracking_date = self.env['ir.config_parameter'].sudo().get_param(
+            'payment_payu.txnid_tracking_date'
+        )
+        txs = self.search([
+            ('provider_code', '=', 'payu'),
+            ('operation', '!=', 'refund'),
+            ('state', 'in', ('draft', 'pending')),
+            ('create_date', '<=', now - timedelta(minutes=const.PAYMENT_VERIFY_DELAY)),
+            '|', ('payu_txnid', '!=', False),
+            '&', ('create_date', '<=', cancel_before), ('create_date', '>=', txnid_tracking_date or now),
+        ], order='id', limit=limit or const.PAYMENT_VERIFY_MAX_PER_RUN)
+
+        # The payments never sent to PayU have nothing to verify.
+        unsent_txs = txs.filtered(lambda tx: not tx.payu_txnid)
+        if unsent_txs:
+            unsent_txs._set_canceled(_("The payment was abandoned before reaching PayU."))
+            if auto_commit:
+                self.env.cr.commit()
+
+        for (provider, currency), provider_txs in (txs - unsent_txs).grouped(
+            lambda tx: (tx.provider_id, tx.currency_id)
+        ).items():
+            if not provider._payu_get_credential(currency):
+                _logger.warning(
+                    "PayU: no credential for %s to verify %d payment(s).", currency.name, len(provider_txs)
+                )
+                continue
+            for batch in split_every(batch_size or const.PAYMENT_VERIFY_BATCH_SIZE, provider_txs.ids, self.browse):
+                try:
+                    payments = self._payu_fetch_payment_statuses(provider, currency, batch.mapped('payu_txnid'))
+                except ValidationError as e:
+                    _logger.warning("PayU: could not verify %d pending payment(s): %s", len(batch), e)
+                    continue
+                batch._payu_apply_payment_statuses(payments, cancel_before)
+                if auto_commit:
+                    self.env.cr.commit()
+
+    @api.model
+    def _payu_fetch_payment_statuses(self, provider, currency, txnids):
+        """ Return the status of several payments, fetched with a single call.
+
+        :param recordset provider: The PayU provider, as a `payment.provider` record.
+        :param recordset currency: The currency of the payments, as a `res.currency` record.
+        :param list txnids: The PayU transaction ids of the payments to verify.
+        :return: The details of the payments known to PayU, by transaction id.
+        :rtype: dict
+        """
+        credential = provider._payu_get_credential(currency)
+        values = {
+            'key': credential.merchant_key,
+            'command': 'verify_payment',
+            'var1': '|'.join(txnids),
+        }
+        data = {**values, 'hash': provider._payu_generate_sign('VERIFY_PAYMENT_HASH_PARAMS', values, currency)}
+        response = provider._payu_make_request(
+            provider._payu_get_api_url('api', 'merchant/postservice.php'),
+            query_params={'form': '2'}, data=data, operation='verify_payment',
+        )
+        details = response.get('transaction_details') or {}
+        return {txnid: details[txnid] for txnid in txnids if isinstance(details.get(txnid), dict)}
+
+    def _payu_apply_payment_statuses(self, payments, cancel_before):
+        """ Update the pending transactions with the status of their payment at PayU.
+
+        Each transaction is locked and updated in its own savepoint, and the transactions that a
+        notification is being processed for are left to it.
+
+        :param dict payments: The details of the payments, by PayU transaction id.
+        :param datetime cancel_before: The creation date before which the payments that are not
+                                       completed are canceled.
+        :return: None
+        """
+        counts = defaultdict(int)
+        for tx in self:
+            payment = payments.get(tx.payu_txnid) or {}
+            status = str(payment.get('status') or '').lower()
+            try:
+                with self.env.cr.savepoint():
+                    if not tx.with_context(payu_lock_policy='skip')._payu_lock_for_notification():
+                        counts['locked'] += 1
+                        continue
+                    tx.invalidate_recordset(['state'])
+                    if tx.state not in ('draft', 'pending'):
+                        continue
+                    if status in ('success', 'failure'):
+                        # The verified payment reports its charges as `additional_charges`.
+                        tx._payu_apply_payment_status(
+                            {'additionalCharges': payment.get('additional_charges'), **payment, 'status': status}
+                        )
+                        counts[status] += 1
+                    elif tx.create_date <= cancel_before:
+                        tx._set_canceled(_(
+                            "The payment was not completed at PayU (status: %s).",
+                            payment.get('status') or _("unknown"),
+                        ))
+                        counts['canceled'] += 1
+            except Exception:
+                counts['error'] += 1
+                _logger.exception("PayU: could not apply the verified status of tx %s.", tx.reference)
+
+        if counts['success']:
+            self.env.ref('payment.cron_post_process_payment_tx')._trigger()
+        _logger.info("PayU: verified %d pending payment(s): %s.", len(self), dict(counts))
+
+
+    def _payu_lock_for_notification(self):
+        """ Lock the row of the transaction until the end of the current database transaction.
+
+        The redirect and the webhook of a payment may be delivered at the same time on two
+        workers; the lock ensures that only one of them processes the notification at a time.
+        With the `skip` policy, the lock is not acquired if another worker holds it; with the
+        `wait` policy, the worker waits for the other one to end. The policy is read from the
+        `payu_lock_policy` context key, or else from the `payment_payu.notification_lock_policy`
+        system parameter.
+
+        The cursors run at REPEATABLE READ: if the other worker committed an update of the
+        transaction, the waiting worker, or any worker whose snapshot predates that commit, gets
+        a serialization failure rather than the lock. The caller retries with a new snapshot:
+        Odoo retries the HTTP requests, and the queue worker retries the notification in its
+        next run.
+
+        Note: self.ensure_one()
+
+        :return: Whether the lock was acquired.
+        :rtype: bool
+        """
+        self.ensure_one()
+        policy = self.env.context.get('payu_lock_policy') or self.env['ir.config_parameter'].sudo().get_param(
+            'payment_payu.notification_lock_policy', const.NOTIFICATION_LOCK_POLICY
+        )
+        query = "SELECT id FROM payment_transaction WHERE id = %s FOR NO KEY UPDATE"
+        if policy == 'skip':
+            query += " SKIP LOCKED"
+        self.env.cr.execute(query, [self.id])
+        return bool(self.env.cr.fetchone())
 
     def _handle_success_status(self, data):
         if self.state in ('done',):
@@ -417,14 +897,15 @@ class PaymentTransaction(models.Model):
             _logger.warning("Sale Order ID not found in payment data; cannot generate or post invoice.")
         
     def generate_sales_order_pdf_and_post_to_payu(self, data):
+        """ Schedule the upload of the sale order invoice to PayU for cross-border merchants.
 
+        The invoice ID update and the PDF upload are made by the `payu.invoice.upload` queue, out
+        of the notification request.
+        """
         provider = self.provider_id
         currency = self.currency_id
 
-        credential = self.env[PAYU_CREDENTIAL].search([
-            ('provider_id', '=', provider.id),
-            ('currency_id', '=', currency.id)
-        ], limit=1)
+        credential = provider._payu_get_credential(currency)
 
         if not credential.cross_border_transactions :
             return 
@@ -435,12 +916,7 @@ class PaymentTransaction(models.Model):
             _logger.warning(f"Sale order with ID {sale_order_id} not found.")
             return
 
-        # Call update_udf_invoice_id first and check if successful
-        update_successful = self.update_udf_invoice_id(data, sale_order)
-        if update_successful:
-            self.upload_invoice(data, sale_order)
-        else:
-            _logger.warning(f"Invoice update failed for sale order {sale_order.name}, skipping invoice upload.")
+        self.env['payu.invoice.upload'].sudo()._enqueue(self, sale_order, data)
 
 
     def update_udf_invoice_id(self, data, sale_order):
@@ -450,10 +926,7 @@ class PaymentTransaction(models.Model):
         provider = self.provider_id
         currency = self.currency_id
 
-        credential = self.env[PAYU_CREDENTIAL].search([
-            ('provider_id', '=', provider.id),
-            ('currency_id', '=', currency.id)
-        ], limit=1)
+        credential = provider._payu_get_credential(currency)
 
         values = {
             'key': credential.merchant_key,
@@ -464,15 +937,19 @@ class PaymentTransaction(models.Model):
         hash_ = provider._payu_generate_sign("UPDATE_INVOICE_ID_HASH_PARAMS", values, currency)
         data = {**values, 'hash': hash_}
 
-        url_host = TEST_BASE_URL if provider.state == 'test' else PROD_BASE_URL
-        url = f'https://{url_host}/merchant/postservice.php'
+        url = provider._payu_get_api_url('api', 'merchant/postservice.php')
 
         query_params = {
             "form": "2"
         }
 
-        invoice_update_response = provider._payu_make_request(url, query_params=query_params, data=data)
-        _logger.info('Invoice id Update Response: %s', invoice_update_response)
+        invoice_update_response = provider._payu_make_request(
+            url, query_params=query_params, data=data, operation='udf_update'
+        )
+        log_events.log_event(
+            'udf_update.response', "PayU: invoice id update of %s response: %s",
+            sale_order.name, invoice_update_response,
+        )
 
         # Check if update was successful
         # Accept exact match to "UDF values updated" to mean success
@@ -494,14 +971,17 @@ class PaymentTransaction(models.Model):
             return False
             
     def upload_invoice(self, data, sale_order):
+        """ Render the sale order PDF and upload it to PayU as the invoice of the payment.
+
+        :param dict data: The payment data, with its `mihpayid`.
+        :param recordset sale_order: The paid order, as a `sale.order` record.
+        :return: Whether PayU accepted the invoice.
+        :rtype: bool
+        """
         provider = self.provider_id
         currency = self.currency_id
 
-        # Fetch the PayU credential record for this provider and currency
-        credential = self.env['payu.credential'].search([
-            ('provider_id', '=', provider.id),
-            ('currency_id', '=', currency.id)
-        ], limit=1)
+        credential = provider._payu_get_credential(currency)
 
         values = {
             'key': credential.merchant_key,
@@ -512,27 +992,33 @@ class PaymentTransaction(models.Model):
             'invoice_id': sale_order.name,
         }
 
-        # Render the PDF report content for the sale order
-        report = self.env.ref('sale.action_report_saleorder')
-        pdf_content, _ = report._render_qweb_pdf(report.id, res_ids=[sale_order.id])
+        # Render the PDF report content for the sale order, unless it is unchanged since last time
+        attachment = self._payu_get_invoice_attachment(sale_order)
 
         hash_ = provider._payu_generate_sign("UPLOAD_INVOICE_HASH_PARAMS", values, currency)
         values['hash'] = hash_
 
-        files = {
-            'file': (f'{sale_order.name}.pdf', pdf_content, 'application/pdf'),
-        }
-
-        url_host = "test.payu.in" if provider.state == 'test' else "info.payu.in"
-        url = f'https://{url_host}/merchant/postservice.php?form=2'
+        url = provider._payu_get_api_url('api', 'merchant/postservice.php?form=2')
 
         try:
-            response = requests.post(url, data=values, files=files, timeout=30)
+            with self._payu_open_attachment(attachment) as pdf_file:
+                body = http_client.MultipartFileStream(
+                    values, 'file', f'{sale_order.name}.pdf', pdf_file, attachment.file_size,
+                    'application/pdf',
+                )
+                response = http_client.request(
+                    'POST', url, operation='upload_invoice', data=body,
+                    headers={'Content-Type': body.content_type}, journal_db=self.env.cr.dbname,
+                )
             response.raise_for_status()
-            _logger.info(f"Successfully posted sales order PDF {sale_order.name} to endpoint.")
-            _logger.info(f"Response status: {response.status_code}, body: {response.text}")
+            log_events.log_event(
+                'invoice_upload.response', "PayU: invoice upload of %s response (%s): %s",
+                sale_order.name, response.status_code, response.text,
+            )
 
-            if "00" in response.text:
+            uploaded = "00" in response.text
+            metrics.inc('payu_invoice_uploads_total', outcome='accepted' if uploaded else 'rejected')
+            if uploaded:
                 message = "Invoice Uploaded Successfully"
             else:
                 message = f"Invoice Uploading Failed. Response: {response.text}"
@@ -543,8 +1029,10 @@ class PaymentTransaction(models.Model):
                 message_type="notification",
                 subtype_xmlid="mail.mt_note"
             )
+            return uploaded
 
         except requests.RequestException as e:
+            metrics.inc('payu_invoice_uploads_total', outcome='error')
             error_message = f"HTTP error posting sales order PDF {sale_order.name}: {str(e)}"
             _logger.error(error_message)
             sale_order.message_post(
@@ -553,6 +1041,7 @@ class PaymentTransaction(models.Model):
                 subtype_xmlid="mail.mt_note"
             )
         except Exception as e:
+            metrics.inc('payu_invoice_uploads_total', outcome='error')
             error_message = f"Unexpected error posting sales order PDF {sale_order.name}: {str(e)}"
             _logger.error(error_message)
             sale_order.message_post(
@@ -560,6 +1049,54 @@ class PaymentTransaction(models.Model):
                 message_type="notification",
                 subtype_xmlid="mail.mt_note"
             )
+        return False
+
+    def _payu_get_invoice_attachment(self, sale_order):
+        """ Return the PDF of a sale order as an attachment, rendered only if the order changed.
+
+        The attachment is keyed by the last write date of the order; the attachments rendered
+        for previous versions of the order are deleted.
+
+        :param recordset sale_order: The order to render, as a `sale.order` record.
+        :return: The PDF attachment.
+        :rtype: recordset of `ir.attachment`
+        """
+        Attachment = self.env['ir.attachment'].sudo()
+        key = f'{INVOICE_ATTACHMENT_PREFIX}{fields.Datetime.to_string(sale_order.write_date)}'
+        attachments = Attachment.search([
+            ('res_model', '=', 'sale.order'),
+            ('res_id', '=', sale_order.id),
+            ('description', '=like', f'{INVOICE_ATTACHMENT_PREFIX}%'),
+        ])
+        attachment = attachments.filtered(lambda a: a.description == key)[:1]
+        if attachment:
+            return attachment
+
+        report = self.env.ref('sale.action_report_saleorder')
+        pdf_content, _format = report._render_qweb_pdf(report.id, res_ids=[sale_order.id])
+        attachments.unlink()
+        return Attachment.create({
+            'name': f'{sale_order.name}.pdf',
+            'type': 'binary',
+            'raw': pdf_content,
+            'mimetype': 'application/pdf',
+            'res_model': 'sale.order',
+            'res_id': sale_order.id,
+            'description': key,
+        })
+
+    @contextmanager
+    def _payu_open_attachment(self, attachment):
+        """ Open the content of an attachment, read from the filestore when it is stored there.
+
+        :param recordset attachment: The attachment to read, as an `ir.attachment` record.
+        :return: A context manager yielding a binary file-like object.
+        """
+        if attachment.store_fname:
+            with open(attachment._full_path(attachment.store_fname), 'rb') as attachment_file:
+                yield attachment_file
+        else:
+            yield io.BytesIO(attachment.raw)
 
     def _apply_discount_if_present(self, data):
         discount = float(data.get('discount', 0))
@@ -574,13 +1111,13 @@ class PaymentTransaction(models.Model):
         udf3 = data.get('udf3')
 
         if udf3 == 'website':
-            sale_order = request.env['sale.order'].sudo().browse(int(sale_order_id))
+            sale_order = self.env['sale.order'].sudo().browse(int(sale_order_id))
             self.apply_global_discount_to_order(sale_order, discount)
         else:
             # Assuming invoice is linked by name/reference stored in udf1
-            invoice = request.env['account.move'].sudo().search([('name', '=', sale_order_id)], limit=1)
+            invoice = self.env['account.move'].sudo().search([('name', '=', sale_order_id)], limit=1)
             if not invoice:
-                _logger.warning(f"Invoice {sale_order_id} not found in request session")
+                _logger.warning("Invoice %s not found for the discount of tx %s", sale_order_id, self.reference)
                 return
             self.apply_global_discount_to_invoice(invoice, discount)
 
@@ -611,30 +1148,29 @@ class PaymentTransaction(models.Model):
         """
 
         returned_hash = data.get('hash')
-        if not returned_hash: raise ValidationError(_("PayU: Received a response with no hash."))
+        if not returned_hash:
+            metrics.inc('payu_hash_verification_failures_total', reason='missing')
+            raise ValidationError(_("PayU: Received a response with no hash."))
 
         provider = self.provider_id
         currency = self.currency_id
         
-        credential = self.env[PAYU_CREDENTIAL].search([
-            ('provider_id', '=', provider.id),
-            ('currency_id', '=', currency.id)
-        ], limit=1)
-        
-        _logger.error(f"Fetched PayU credentials for currency {currency.name}")
+        credential = provider._payu_get_credential(currency)
         
         sign_values = {**data, 'key': credential.merchant_key}
 
         calculated_hash = provider._payu_generate_sign("PAYMENT_REVERSE_HASH_PARAMS", sign_values, currency)
 
-        if calculated_hash.lower() != returned_hash.lower():
+        if not hmac.compare_digest(calculated_hash.lower().encode(), returned_hash.lower().encode()):
+            metrics.inc('payu_hash_verification_failures_total', reason='mismatch')
             _logger.warning("PayU: Tampered payment notification for tx %s. Hash mismatch.", self.reference)
             raise ValidationError(_("PayU: The response hash does not match the expected hash. The data may have been tampered with."))
-    
+        log_events.log_event('notification.verified', "PayU: verified the notification hash of tx %s.", self.reference)
+
     @api.model
     def _get_payu_credentials(self):
         """Fetch all PayU credentials records."""
-        return self.env['payu.credential'].search([])
+        return self.env[PAYU_CREDENTIAL].search([])
 
     def _build_request_headers(self, credential, formatted_date, digest, signature):
         """Construct headers required for the API call."""
@@ -645,105 +1181,293 @@ class PaymentTransaction(models.Model):
         }
 
     def _call_payu_api(self, endpoint, params, headers):
-        """Make the GET request to PayU and return the raw response and parsed JSON."""
-        response = requests.get(endpoint, params=params, headers=headers, timeout=30)
+        """ Make the GET request to PayU and return the parsed JSON of a successful reply.
+
+        :raise ValidationError: If the reply is not JSON, or is not a successful settlement page,
+                                so that the page is not mistaken for the end of the data.
+        """
+        response = http_client.request(
+            'GET', endpoint, operation='settlement', params=params, headers=headers,
+            journal_db=self.env.cr.dbname,
+        )
         response.raise_for_status()
 
         try:
             result = response.json()
-            _logger.info("Parsed JSON Response: %s", json.dumps(result, indent=2))
-            return result
-        except Exception as e:
-            _logger.error("Error parsing JSON: %s", str(e))
-            return {}
+        except ValueError:
+            log_events.log_event('api.error', "PayU: non-JSON settlement response from %s", endpoint)
+            raise ValidationError("PayU: " + _("Received an unexpected response from the API."))
+        log_events.log_event('settlement.response', "PayU: settlement response: %s", result)
+
+        if not isinstance(result, dict) or result.get('status') != 0 or not isinstance(result.get('result'), dict):
+            message = isinstance(result, dict) and result.get('msg') or _("Unknown error")
+            raise ValidationError("PayU: " + _("The settlement API returned an error: %s", message))
+        return result
 
     def _process_settlement_data(self, result, credential):
-        """Update Odoo payment transactions based on settlement data."""
+        """Update Odoo payment transactions based on settlement data.
+
+        The transactions of the whole page are fetched with a single query and updated with one
+        write per distinct set of settlement values.
+        """
         size = result.get('result', {}).get('size', 0)
-        _logger.info("Number of settlements in response: %d", size)
+        _logger.debug("Number of settlements in response: %d", size)
         if  size == 0:
             return False
+
+        settlement_rows = []
         for settlement in result.get('result', {}).get('data', []):
             utr_number = settlement.get('utrNumber')
             for tx_data in settlement.get('transaction', []):
-                payu_id = tx_data.get('payuId')
-                merchant_net_amount = float(tx_data.get('merchantNetAmount', 0))
                 merchant_service_fee = float(tx_data.get('merchantServiceFee', 0))
                 merchant_service_tax = float(tx_data.get('merchantServiceTax', 0))
-                odoo_tx = self.env['payment.transaction'].search(
-                    [('provider_reference', '=', payu_id)], limit=1
+                settlement_rows.append((str(tx_data.get('payuId')), {
+                    'settled_amount': float(tx_data.get('merchantNetAmount', 0)),
+                    'total_service_fee': merchant_service_fee + merchant_service_tax,
+                    'settlement_currency': tx_data.get('settlementCurrency'),
+                    'utr_number': utr_number,
+                }))
+
+        txs_by_payu_id = {}
+        for odoo_tx in self.env['payment.transaction'].search(
+            [('provider_reference', 'in', [payu_id for payu_id, _vals in settlement_rows])]
+        ):
+            txs_by_payu_id.setdefault(odoo_tx.provider_reference, odoo_tx)
+
+        tx_ids_by_values = defaultdict(list)
+        unmatched_count = 0
+        for payu_id, values in settlement_rows:
+            odoo_tx = txs_by_payu_id.get(payu_id)
+            if odoo_tx:
+                tx_ids_by_values[tuple(sorted(values.items()))].append(odoo_tx.id)
+            else:
+                unmatched_count += 1
+                log_events.log_event(
+                    'settlement.row_unmatched', "PayU: transaction with provider_reference=%s not found!",
+                    payu_id,
                 )
-                if odoo_tx:
-                    odoo_tx.write({
-                        'settled_amount': merchant_net_amount,
-                        'total_service_fee': merchant_service_fee + merchant_service_tax,
-                        'settlement_currency': tx_data.get('settlementCurrency'),
-                        'utr_number': utr_number
-                    })
-                    _logger.info(
-                        f"Updated payment.transaction {odoo_tx.id} (provider_reference={payu_id}) "
-                        f"with settled_amount={merchant_net_amount}"
-                    )
-                else:
-                    _logger.warning(
-                        f"Transaction with provider_reference={payu_id} not found!"
-                    )
+        metrics.inc('payu_settlement_rows_total', len(settlement_rows) - unmatched_count, matched='true')
+        metrics.inc('payu_settlement_rows_total', unmatched_count, matched='false')
+
+        for values, tx_ids in tx_ids_by_values.items():
+            self.env['payment.transaction'].browse(tx_ids).write(dict(values))
+        log_events.log_event(
+            'settlement.page', "PayU: updated %d payment.transaction records from %d settlement rows, %d unmatched.",
+            sum(len(tx_ids) for tx_ids in tx_ids_by_values.values()), len(settlement_rows), unmatched_count,
+        )
         return True
 
-    def _get_settlement_endpoint(self, provider_state):
-        _logger.info("Determining settlement endpoint for provider state: %s", provider_state)
-        settlement_dns = 'https://test.payu.in/settlement/range' if provider_state == 'test' else 'https://info.payu.in/settlement/range'
-        return settlement_dns
-
     @api.model
     def cron_send_payment_transaction_post_call(self):
+        """ Sync the settlements of every credential from its watermark up to yesterday.
+
+        A credential resumes after the last page it fully processed, and catches up on the days
+        missed since its last run, up to `const.SETTLEMENT_MAX_CATCHUP_DAYS` days back.
+        """
         _logger.info("Starting PayU settlement cron job.")
         
-        custom_date = datetime.today()  # Sets custom_date to today's date
-        yesterday = (custom_date - timedelta(days=1)).strftime('%Y-%m-%d')
-        page_size = 100
+        custom_date = fields.Date.context_today(self)  # Sets custom_date to today's date
+        yesterday = custom_date - timedelta(days=1)
+        oldest_date = yesterday - timedelta(days=const.SETTLEMENT_MAX_CATCHUP_DAYS - 1)
         _logger.info("Yesterday's date: %s", yesterday)
 
-        credentials = self._get_payu_credentials()
-
+        credentials = self._get_payu_credentials().filtered(
+            lambda credential: credential.provider_id.code == 'payu'
+        )
+        jobs = []
         for credential in credentials:
+            if credential.settlement_sync_date:
+                date_from = max(credential.settlement_sync_date + timedelta(days=1), oldest_date)
+            else:
+                date_from = yesterday
+            if date_from <= yesterday:
+                jobs.append((credential.id, date_from, yesterday, True))
+        return self._payu_run_settlement_jobs(jobs)
 
-            endpoint = self._get_settlement_endpoint(credential.provider_id.state)
+    @api.model
+    def action_payu_backfill_settlements(self, date_from, date_to, credential_ids=None):
+        """ Sync the settlements of a date range, split into one job per credential and day.
+
+        The jobs run concurrently like those of the settlement cron, but leave the watermarks of
+        the credentials untouched.
+
+        :param date_from: The first date of the range, as a date or a YYYY-MM-DD string.
+        :param date_to: The last date of the range, as a date or a YYYY-MM-DD string.
+        :param list credential_ids: The credentials to sync, as `payu.credential` ids. All the
+                                    PayU credentials are synced if not set.
+        :return: The result of each job.
+        :rtype: list
+        """
+        date_from, date_to = fields.Date.to_date(date_from), fields.Date.to_date(date_to)
+        if date_from > date_to:
+            raise ValidationError(_("PayU: The backfill start date must precede its end date."))
 
-            if credential.provider_id.name != 'PayU':
-                return
-            
-            _logger.info(f"Processing PayU credential for provider_id={credential.provider_id.id} "
-                        f"currency_id={credential.currency_id.name} merchant_key={credential.merchant_key}")
-            page = 1
-            while True:
-                params = {
-                    'dateFrom': yesterday,
-                    'pageSize': page_size,
-                    'page': page,
-                }
-                formatted_date = self.get_current_formatted_time()
-                body = ''
-                digest = self.generate_digest(body)
-                signature = self.generate_signature(formatted_date, digest, credential.merchant_salt)
-                headers = self._build_request_headers(credential, formatted_date, digest, signature)
+        if credential_ids:
+            credentials = self.env[PAYU_CREDENTIAL].browse(credential_ids)
+        else:
+            credentials = self._get_payu_credentials()
+        credentials = credentials.filtered(lambda credential: credential.provider_id.code == 'payu')
 
-                try:
-                    result = self._call_payu_api(endpoint, params, headers)
-                    _logger.info(f"API call result for credential_id={credential.id}, page={page}: {result}")
-
-                    if result.get('status') == 1:
-                        _logger.info(f"No settlements found for credential_id={credential.id}.")
-                        return
-                    
-                    keep_running = self._process_settlement_data(result, credential)
-                    if not keep_running:
-                        _logger.info(f"No more data for credential_id={credential.id}, stopping pagination.")
-                        break
-                    page += 1
-                except Exception as e:
-                    _logger.error(f"Error for credential_id={credential.id}: {str(e)}")
-                    break
+        days = [date_from + timedelta(days=offset) for offset in range((date_to - date_from).days + 1)]
+        return self._payu_run_settlement_jobs([
+            (credential.id, day, day, False) for credential in credentials for day in days
+        ])
+
+    @api.model
+    def _payu_get_settlement_concurrency(self):
+        """ Return the maximum number of settlement jobs run concurrently. """
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'payment_payu.settlement_concurrency', const.SETTLEMENT_CONCURRENCY
+        ))
+
+    @api.model
+    def _payu_run_settlement_jobs(self, jobs):
+        """ Fetch and reconcile the settlements of several jobs.
+
+        Each job runs in its own worker thread and database cursor, with at most
+        `payment_payu.settlement_concurrency` jobs at a time. The jobs run sequentially in the
+        current cursor when the concurrency is 1 or during tests.
+
+        :param list jobs: The jobs to run, as (`payu.credential` id, first date, last date,
+                          whether to track the watermark) tuples.
+        :return: The result of each job, in the order of `jobs`.
+        :rtype: list
+        """
+        auto_commit = not modules.module.current_test
+        concurrency = min(self._payu_get_settlement_concurrency(), len(jobs))
+        if concurrency <= 1 or not auto_commit:
+            results = [self._payu_run_settlement_job(*job, auto_commit=auto_commit) for job in jobs]
+        else:
+            with ThreadPoolExecutor(
+                max_workers=concurrency, thread_name_prefix='payu_settlement'
+            ) as executor:
+                results = list(executor.map(
+                    lambda job: self._payu_run_settlement_job_in_new_cursor(*job), jobs
+                ))
+
+        for result in results:
+            if result['error']:
+                _logger.error(
+                    "PayU settlement sync failed for credential_id=%s, dates=%s..%s after %d page(s): %s",
+                    result['credential_id'], result['date_from'], result['date_to'], result['pages'],
+                    result['error'],
+                )
+            else:
+                _logger.info(
+                    "PayU settlement sync done for credential_id=%s, dates=%s..%s: %d page(s).",
+                    result['credential_id'], result['date_from'], result['date_to'], result['pages'],
+                )
+        return results
+
+    def _payu_run_settlement_job_in_new_cursor(self, credential_id, date_from, date_to, track_watermark):
+        """ Run a settlement job in a dedicated cursor, committed after each page.
+
+        The failures of the cursor itself, e.g. when it cannot be acquired or committed, are
+        reported in the job result like the failures of the job.
+        """
+        try:
+            with self.env.registry.cursor() as cr:
+                env = api.Environment(cr, self.env.uid, self.env.context)
+                return env['payment.transaction']._payu_run_settlement_job(
+                    credential_id, date_from, date_to, track_watermark, auto_commit=True
+                )
+        except Exception as e:
+            return {
+                'credential_id': credential_id,
+                'date_from': str(date_from),
+                'date_to': str(date_to),
+                'pages': 0,
+                'error': str(e),
+            }
+
+    @api.model
+    def _payu_run_settlement_job(self, credential_id, date_from, date_to, track_watermark, auto_commit=False):
+        """ Fetch and reconcile all the settlement pages of a credential, day after day.
+
+        Each page is processed in a savepoint and, when tracked, recorded in the watermark of the
+        credential. The first failing page is rolled back and stops the job; its error is reported
+        in the job result instead of being raised, so that it does not affect the other jobs.
+
+        :param int credential_id: The credential to sync, as a `payu.credential` id.
+        :param date date_from: The first settlement date to sync.
+        :param date date_to: The last settlement date to sync.
+        :param bool track_watermark: Whether to resume from and advance the watermark.
+        :param bool auto_commit: Whether to commit the cursor after each page.
+        :return: The job result, with the number of pages processed and the error, if any.
+        :rtype: dict
+        """
+        result = {
+            'credential_id': credential_id,
+            'date_from': str(date_from),
+            'date_to': str(date_to),
+            'pages': 0,
+            'error': None,
+        }
+        credential = self.env[PAYU_CREDENTIAL].browse(credential_id)
+        day = date_from
+        start = time.perf_counter()
+        try:
+            while day <= date_to:
+                first_page = 1
+                if track_watermark and credential.settlement_sync_date == day - timedelta(days=1):
+                    first_page = credential.settlement_sync_page + 1
+                for page in self._payu_iter_settlement_pages(credential, day, first_page):
+                    result['pages'] += 1
+                    if track_watermark:
+                        credential.write({'settlement_sync_page': page})
+                    if auto_commit:
+                        self.env.cr.commit()
+                if track_watermark:
+                    credential.write({'settlement_sync_date': day, 'settlement_sync_page': 0})
+                if auto_commit:
+                    self.env.cr.commit()
+                day += timedelta(days=1)
+        except Exception as e:
+            result['error'] = str(e)
+        metrics.observe(
+            'payu_settlement_job_duration_seconds', time.perf_counter() - start,
+            outcome='error' if result['error'] else 'ok',
+        )
+        return result
+
+    def _payu_iter_settlement_pages(self, credential, date, first_page=1):
+        """ Fetch and reconcile the settlement pages of a credential, yielding after each page.
+
+        Each page is reconciled in a savepoint, so that a failing page leaves no partial update.
+
+        :param recordset credential: The credential to sync, as a `payu.credential` record.
+        :param date date: The settlement date.
+        :param int first_page: The first page to fetch.
+        :return: A generator of the processed page numbers.
+        """
+        endpoint = credential.provider_id._payu_get_api_url('api', 'settlement/range')
+        _logger.info(
+            "Processing PayU credential for provider_id=%s currency=%s on %s",
+            credential.provider_id.id, credential.currency_id.name, date,
+        )
+        page = first_page
+        while True:
+            params = {
+                'dateFrom': str(date),
+                'dateTo': str(date),
+                'pageSize': const.SETTLEMENT_PAGE_SIZE,
+                'page': page,
+            }
+            formatted_date = self.get_current_formatted_time()
+            body = ''
+            digest = self.generate_digest(body)
+            signature = self.generate_signature(formatted_date, digest, credential.merchant_salt)
+            headers = self._build_request_headers(credential, formatted_date, digest, signature)
+
+            result = self._call_payu_api(endpoint, params, headers)
+
+            with self.env.cr.savepoint():
+                keep_running = self._process_settlement_data(result, credential)
+            if not keep_running:
+                _logger.info("No more data for credential_id=%s, stopping pagination.", credential.id)
+                return
+            yield page
+            page += 1
 
     def get_current_formatted_time(self):
         # Current time in UTC timezone
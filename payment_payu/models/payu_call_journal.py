@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import zlib
+
+from datetime import timedelta
+
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+
+from odoo.addons.payment_payu import const
+
+
+class PayUCallJournal(models.Model):
+    _name = 'payu.call.journal'
+    _description = 'PayU Call Journal'
+    _order = 'id desc'
+    _log_access = False
+
+    date = fields.Datetime(string="Date", readonly=True, index=True)
+    operation = fields.Char(string="Operation", readonly=True, index=True)
+    method = fields.Char(string="Method", readonly=True)
+    url = fields.Char(string="URL", readonly=True)
+    credential_id = fields.Many2one('payu.credential', string="Credential", readonly=True, ondelete='set null')
+    status_code = fields.Integer(string="HTTP Status", readonly=True)
+    duration_ms = fields.Integer(string="Duration (ms)", readonly=True)
+    error = fields.Char(string="Error", readonly=True)
+    request_text = fields.Text(string="Request", compute='_compute_bodies')
+    response_text = fields.Text(string="Response", compute='_compute_bodies')
+
+    def init(self):
+        # The bodies are zlib-compressed bytes written by the journal writer, rather than
+        # binary fields, which the ORM stores base64-encoded.
+        self.env.cr.execute("""
+            ALTER TABLE payu_call_journal
+                ADD COLUMN IF NOT EXISTS request_body bytea,
+                ADD COLUMN IF NOT EXISTS response_body bytea
+        """)
+
+    #=== COMPUTE METHODS ===#
+
+    def _compute_bodies(self):
+        self.env.cr.execute(
+            "SELECT id, request_body, response_body FROM payu_call_journal WHERE id IN %s",
+            [tuple(self.ids) or (None,)],
+        )
+        bodies = {row[0]: row[1:] for row in self.env.cr.fetchall()}
+        for call in self:
+            request_body, response_body = bodies.get(call.id, (None, None))
+            call.request_text = request_body and zlib.decompress(request_body).decode('utf-8')
+            call.response_text = response_body and zlib.decompress(response_body).decode('utf-8')
+
+    #=== CRUD METHODS ===#
+
+    def write(self, vals):
+        raise UserError(_("The PayU call journal cannot be modified."))
+
+    #=== BUSINESS METHODS ===#
+
+    @api.autovacuum
+    def _gc_journal(self):
+        """ Delete the calls older than `payment_payu.journal_retention_days` days, and the oldest
+        ones beyond the `payment_payu.journal_max_rows` most recent calls. """
+        ICP = self.env['ir.config_parameter'].sudo()
+        retention_days = int(ICP.get_param('payment_payu.journal_retention_days', const.JOURNAL_RETENTION_DAYS))
+        max_rows = int(ICP.get_param('payment_payu.journal_max_rows', const.JOURNAL_MAX_ROWS))
+        self.env.cr.execute(
+            "DELETE FROM payu_call_journal WHERE date < %s",
+            [fields.Datetime.now() - timedelta(days=retention_days)],
+        )
+        if max_rows > 0:
+            self.env.cr.execute("""
+                DELETE FROM payu_call_journal
+                 WHERE id <= (SELECT id FROM payu_call_journal ORDER BY id DESC OFFSET %s LIMIT 1)
+            """, [max_rows])
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from datetime import timedelta
+
+from odoo import _, api, fields, models, modules
+from odoo.exceptions import ValidationError
+
+from odoo.addons.payment_payu import const, utils
+
+_logger = logging.getLogger(__name__)
+
+
+class PayUInvoiceUpload(models.Model):
+    _name = 'payu.invoice.upload'
+    _description = 'PayU Cross-Border Invoice Upload'
+    _order = 'id desc'
+
+    sale_order_id = fields.Many2one(
+        'sale.order', string="Sale Order", required=True, readonly=True, index=True, ondelete='cascade'
+    )
+    transaction_id = fields.Many2one(
+        'payment.transaction', string="Transaction", required=True, readonly=True, ondelete='cascade'
+    )
+    mihpayid = fields.Char(string="PayU ID", readonly=True)
+    txnid = fields.Char(string="PayU Transaction ID", readonly=True)
+    state = fields.Selection(
+        string="Status",
+        selection=[('pending', "Pending"), ('done', "Uploaded"), ('failed', "Failed")],
+        default='pending',
+        required=True,
+        index=True,
+    )
+    invoice_id_updated = fields.Boolean(
+        string="Invoice ID Updated", readonly=True,
+        help="Whether the sale order name was set as invoice ID of the payment at PayU",
+    )
+    attempts = fields.Integer(string="Attempts", default=0, readonly=True)
+    next_attempt_date = fields.Datetime(
+        string="Next Attempt", default=fields.Datetime.now, required=True, index=True
+    )
+    last_error = fields.Text(string="Last Error", readonly=True)
+
+    #=== BUSINESS METHODS ===#
+
+    @api.model
+    def _enqueue(self, transaction, sale_order, data):
+        """ Schedule the upload of the invoice of a sale order paid through PayU.
+
+        :param recordset transaction: The paid transaction, as a `payment.transaction` record.
+        :param recordset sale_order: The paid order, as a `sale.order` record.
+        :param dict data: The notification data of the payment.
+        :return: The upload job of the sale order.
+        :rtype: recordset of `payu.invoice.upload`
+        """
+        job = self.search([('sale_order_id', '=', sale_order.id), ('state', '=', 'pending')], limit=1)
+        if not job:
+            job = self.create({
+                'sale_order_id': sale_order.id,
+                'transaction_id': transaction.id,
+                'mihpayid': data.get('mihpayid'),
+                'txnid': data.get('txnid'),
+            })
+            self.env.ref('payment_payu.ir_cron_process_payu_invoice_uploads')._trigger()
+        return job
+
+    @api.model
+    def _cron_process_uploads(self, batch_size=None):
+        """ Process the upload jobs that are due, committing after each job. """
+        self.env.cr.execute("""
+            SELECT id FROM payu_invoice_upload
+             WHERE state = 'pending' AND next_attempt_date <= NOW() AT TIME ZONE 'UTC'
+          ORDER BY next_attempt_date
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, [batch_size or const.INVOICE_UPLOAD_BATCH_SIZE])
+        auto_commit = not modules.module.current_test
+        for job in self.browse([row[0] for row in self.env.cr.fetchall()]):
+            job._process()
+            if auto_commit:
+                self.env.cr.commit()
+
+    def action_retry(self):
+        """ Reschedule the failed jobs and process them right away. """
+        self.filtered(lambda job: job.state == 'failed').write({
+            'state': 'pending', 'attempts': 0, 'next_attempt_date': fields.Datetime.now(),
+        })
+        self.env.ref('payment_payu.ir_cron_process_payu_invoice_uploads')._trigger()
+
+    def _process(self):
+        """ Update the invoice ID of the payment at PayU, then upload the invoice PDF.
+
+        A failed step is retried with an exponential backoff until `const.INVOICE_UPLOAD_MAX_ATTEMPTS`
+        is reached. The PDF rendering is bounded to `payment_payu.invoice_render_concurrency`
+        concurrent renderings across all workers; a job that finds no free rendering slot is
+        postponed without counting an attempt.
+        """
+        render_concurrency = int(self.env['ir.config_parameter'].sudo().get_param(
+            'payment_payu.invoice_render_concurrency', const.INVOICE_RENDER_CONCURRENCY
+        ))
+        for job in self:
+            tx_sudo = job.transaction_id.sudo()
+            data = {'mihpayid': job.mihpayid, 'txnid': job.txnid}
+            try:
+                if not job.invoice_id_updated:
+                    with self.env.cr.savepoint():
+                        if not tx_sudo.update_udf_invoice_id(data, job.sale_order_id):
+                            raise ValidationError(_("PayU did not update the invoice ID."))
+                    job.invoice_id_updated = True
+
+                if not utils.try_acquire_slot(self.env.cr, const.INVOICE_RENDER_LOCK_ID, render_concurrency):
+                    job.next_attempt_date = fields.Datetime.now() + timedelta(minutes=1)
+                    continue
+                with self.env.cr.savepoint():
+                    if not tx_sudo.upload_invoice(data, job.sale_order_id):
+                        raise ValidationError(_("PayU did not accept the invoice."))
+            except Exception as e:
+                _logger.warning("PayU: invoice upload %s failed: %s", job.id, e)
+                attempts = job.attempts + 1
+                job.write({
+                    'attempts': attempts,
+                    'last_error': str(e),
+                    'state': 'failed' if attempts >= const.INVOICE_UPLOAD_MAX_ATTEMPTS else 'pending',
+                    'next_attempt_date': fields.Datetime.now() + timedelta(
+                        minutes=const.INVOICE_UPLOAD_RETRY_DELAY * 2 ** (attempts - 1)
+                    ),
+                })
+            else:
+                job.write({'attempts': job.attempts + 1, 'last_error': False, 'state': 'done'})
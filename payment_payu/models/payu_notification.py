@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from datetime import timedelta
+
+from psycopg2 import errors as pg_errors
+
+from odoo import api, fields, models, modules
+
+from odoo.addons.payment_payu import const
+
+_logger = logging.getLogger(__name__)
+
+# The errors raised when a concurrent transaction committed a change of the rows that the
+# current one, whose snapshot predates it, tries to lock or update.
+CONCURRENCY_ERRORS = (pg_errors.SerializationFailure, pg_errors.DeadlockDetected, pg_errors.LockNotAvailable)
+
+
+class PayUNotification(models.Model):
+    _name = 'payu.notification'
+    _description = 'PayU Inbound Notification'
+    _order = 'id'
+
+    payload = fields.Json(string="Payload", required=True, readonly=True)
+    state = fields.Selection(
+        string="Status",
+        selection=[('pending', "Pending"), ('done', "Processed"), ('error', "Failed")],
+        default='pending',
+        required=True,
+        index=True,
+    )
+    attempts = fields.Integer(string="Attempts", default=0)
+    last_error = fields.Text(string="Last Error", readonly=True)
+    processed_date = fields.Datetime(string="Processed On", readonly=True)
+
+    #=== BUSINESS METHODS ===#
+
+    @api.model
+    def _enqueue(self, payload):
+        """ Store a notification received from PayU and wake up the queue worker.
+
+        :param dict payload: The notification data posted by PayU.
+        :return: The queued notification.
+        :rtype: recordset of `payu.notification`
+        """
+        notification = self.create({'payload': payload})
+        self.env.ref('payment_payu.ir_cron_process_payu_notifications')._trigger()
+        return notification
+
+    @api.model
+    def _cron_process_notifications(self, batch_size=None):
+        """ Drain the queue of pending notifications in batches.
+
+        Every pending notification is processed at most once per run. A failing notification is
+        kept pending for the next run until it reaches `const.NOTIFICATION_MAX_ATTEMPTS`.
+
+        :param int batch_size: The number of notifications processed per batch.
+        :return: None
+        """
+        batch_size = batch_size or const.NOTIFICATION_BATCH_SIZE
+        auto_commit = not modules.module.current_test
+        last_id = 0
+        while True:
+            # Skip the notifications locked by a concurrent run.
+            self.env.cr.execute("""
+                SELECT id FROM payu_notification
+                 WHERE state = 'pending' AND id > %s
+              ORDER BY id
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+            """, [last_id, batch_size])
+            notification_ids = [row[0] for row in self.env.cr.fetchall()]
+            if not notification_ids:
+                break
+            self.browse(notification_ids)._process()
+            last_id = notification_ids[-1]
+            if auto_commit:
+                self.env.cr.commit()
+
+    def _process(self):
+        """ Process the notifications, each in its own savepoint.
+
+        A notification whose transaction was updated by a concurrent delivery once the snapshot of
+        the current transaction was taken cannot be processed in it: it is kept pending, without
+        counting an attempt, and retried in a new run.
+        """
+        retry = False
+        for notification in self:
+            try:
+                with self.env.cr.savepoint():
+                    # The queue worker is not awaited by anyone: wait for a concurrent delivery.
+                    tx_sudo = self.env['payment.transaction'].sudo().with_context(
+                        payu_lock_policy='wait'
+                    )._get_tx_from_notification_data('payu', notification.payload)
+                    tx_sudo._handle_notification_data('payu', notification.payload)
+            except CONCURRENCY_ERRORS:
+                _logger.info(
+                    "PayU: notification %s conflicts with a concurrent delivery, retrying.", notification.id
+                )
+                retry = True
+            except Exception as e:
+                _logger.exception("PayU: failed to process notification %s", notification.id)
+                attempts = notification.attempts + 1
+                notification.write({
+                    'attempts': attempts,
+                    'last_error': str(e),
+                    'state': 'error' if attempts >= const.NOTIFICATION_MAX_ATTEMPTS else 'pending',
+                })
+            else:
+                notification.write({
+                    'attempts': notification.attempts + 1,
+                    'last_error': False,
+                    'state': 'done',
+                    'processed_date': fields.Datetime.now(),
+                })
+        if retry:
+            self.env.ref('payment_payu.ir_cron_process_payu_notifications')._trigger()
+
+    @api.autovacuum
+    def _gc_processed_notifications(self):
+        """ Delete the notifications processed more than `const.NOTIFICATION_RETENTION_DAYS` ago. """
+        limit_date = fields.Datetime.now() - timedelta(days=const.NOTIFICATION_RETENTION_DAYS)
+        self.search([('state', '=', 'done'), ('processed_date', '<', limit_date)]).unlink()
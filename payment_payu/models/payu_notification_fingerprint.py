@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import hashlib
+
+from datetime import timedelta
+
+from psycopg2 import errors as pg_errors
+
+from odoo import api, fields, models
+
+from odoo.addons.payment_payu import const
+
+
+class PayUNotificationFingerprint(models.Model):
+    _name = 'payu.notification.fingerprint'
+    _description = 'PayU Processed Notification Fingerprint'
+
+    fingerprint = fields.Char(string="Fingerprint", required=True, readonly=True)
+    transaction_id = fields.Many2one(
+        'payment.transaction', string="Transaction", readonly=True, ondelete='cascade'
+    )
+
+    _sql_constraints = [
+        ('fingerprint_uniq', 'unique(fingerprint)', 'A notification can only be processed once.')
+    ]
+
+    #=== BUSINESS METHODS ===#
+
+    @api.model
+    def _compute_fingerprint(self, data):
+        """ Return the fingerprint of a notification, made of its PayU id, status and hash.
+
+        :param dict data: The notification data.
+        :return: The fingerprint, as a hex string.
+        :rtype: str
+        """
+        key = '|'.join(str(data.get(field) or '') for field in ('mihpayid', 'status', 'hash'))
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    @api.model
+    def _claim(self, data, transaction):
+        """ Record that a notification is being processed, unless it already was.
+
+        The fingerprint is inserted in the current transaction: it is only visible to other
+        workers once committed, and is dropped along with the processing if it is rolled back.
+        The concurrent deliveries are serialized by the row lock of the transaction (see
+        `_payu_lock_for_notification`). A fingerprint committed by another worker after the
+        snapshot of the current transaction was taken makes the insertion fail with a
+        serialization failure at REPEATABLE READ; the notification is then already claimed.
+
+        :param dict data: The notification data.
+        :param recordset transaction: The transaction notified, as a `payment.transaction` record.
+        :return: Whether the notification was claimed, i.e. never processed before.
+        :rtype: bool
+        """
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute("""
+                    INSERT INTO payu_notification_fingerprint
+                                (fingerprint, transaction_id, create_uid, write_uid, create_date, write_date)
+                         VALUES (%s, %s, %s, %s, NOW() AT TIME ZONE 'UTC', NOW() AT TIME ZONE 'UTC')
+                    ON CONFLICT (fingerprint) DO NOTHING
+                      RETURNING id
+                """, [self._compute_fingerprint(data), transaction.id, self.env.uid, self.env.uid])
+                return bool(self.env.cr.fetchone())
+        except pg_errors.SerializationFailure:
+            return False
+
+    @api.autovacuum
+    def _gc_fingerprints(self):
+        """ Delete the fingerprints older than `const.NOTIFICATION_RETENTION_DAYS`. """
+        limit_date = fields.Datetime.now() - timedelta(days=const.NOTIFICATION_RETENTION_DAYS)
+        self.search([('create_date', '<', limit_date)]).unlink()
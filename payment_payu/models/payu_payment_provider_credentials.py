@@ -1,6 +1,14 @@
-from odoo import _, api, fields, models
+import hmac
+
+from odoo import _, api, fields, models, tools
 from odoo.exceptions import ValidationError
 
+from odoo.addons.payment_payu import metrics, signer
+
+# The fields whose values are kept in the credential resolver and merchant salt caches.
+CACHED_FIELDS = {'provider_id', 'currency_id', 'merchant_key', 'merchant_salt'}
+
+
 class PayUPaymentProviderCredential(models.Model):
     _name = 'payu.credential'
     _description = 'PayU Credential by Currency'
@@ -10,6 +18,16 @@ class PayUPaymentProviderCredential(models.Model):
     merchant_key = fields.Char('PayU Merchant Key', groups='base.group_system')
     merchant_salt = fields.Char('PayU Merchant Salt', groups='base.group_system')
     cross_border_transactions = fields.Boolean(string="Cross Border Transactions", default=False, help="Check the box if merchant account is enabled for corss border transactions")
+    settlement_sync_date = fields.Date(
+        string="Settlements Synced Until",
+        readonly=True,
+        help="Last settlement date whose pages have all been processed by the settlement cron",
+    )
+    settlement_sync_page = fields.Integer(
+        string="Settlement Pages Synced",
+        readonly=True,
+        help="Number of pages already processed for the day following the synced date",
+    )
 
     _sql_constraints = [
         ('uniq_provider_currency', 'unique(provider_id, currency_id)', 
@@ -23,3 +41,89 @@ class PayUPaymentProviderCredential(models.Model):
                 raise ValidationError(
                     _("All fields Currency, Merchant Key, and Merchant Salt must be filled in each PayU credential.")
                 )
+
+
+    #=== CRUD METHODS ===#
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if CACHED_FIELDS & vals.keys():
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    #=== BUSINESS METHODS ===#
+
+    @api.model
+    @tools.ormcache('provider_id', 'currency_id')
+    def _get_credential_id(self, provider_id, currency_id):
+        """ Return the id of the credential of a provider for a currency.
+
+        The result is cached process-wide and invalidated whenever a credential is created,
+        deleted or moved to another provider or currency.
+
+        :param int provider_id: The provider of the credential, as a `payment.provider` id.
+        :param int currency_id: The currency of the credential, as a `res.currency` id.
+        :return: The id of the credential, or False if none is configured.
+        :rtype: int
+        """
+        return self.search([
+            ('provider_id', '=', provider_id),
+            ('currency_id', '=', currency_id),
+        ], limit=1).id
+
+    @api.model
+    @tools.ormcache()
+    def _get_salts_by_key(self):
+        """ Return the merchant salts of the credentials, by merchant key.
+
+        The map is cached process-wide, like the credential resolver, so that the notifications
+        can be authenticated without querying the database.
+
+        :return: The salts of each merchant key, as a tuple since a merchant key may be shared
+                 by several credentials.
+        :rtype: dict
+        """
+        salts_by_key = {}
+        for credential in self.sudo().search([]):
+            if credential.merchant_key and credential.merchant_salt:
+                salts_by_key.setdefault(credential.merchant_key, ())
+                salts_by_key[credential.merchant_key] += (credential.merchant_salt,)
+        return salts_by_key
+
+    @api.model
+    def _check_notification_hash(self, data):
+        """ Return whether a payment notification is signed by one of the configured merchants.
+
+        The salt is selected from the posted merchant key and the reverse hash is compared in
+        constant time. This only authenticates the payload: that the merchant is the one of the
+        notified transaction is checked when the notification is processed.
+
+        :param dict data: The notification data.
+        :return: Whether the hash of the notification is valid.
+        :rtype: bool
+        """
+        received_hash = data.get('hash')
+        if not received_hash or not isinstance(received_hash, str):
+            metrics.inc('payu_hash_verification_failures_total', reason='missing')
+            return False
+        salts = self._get_salts_by_key().get(data.get('key'))
+        if not salts:
+            metrics.inc('payu_hash_verification_failures_total', reason='unknown_key')
+            return False
+        reverse_signer = signer.get_signer('PAYMENT_REVERSE_HASH_PARAMS')
+        received_hash = received_hash.lower().encode()
+        if any(hmac.compare_digest(reverse_signer.sign(data, salt).encode(), received_hash) for salt in salts):
+            return True
+        metrics.inc('payu_hash_verification_failures_total', reason='mismatch')
+        return False
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import math
+
+from datetime import timedelta
+
+from odoo import api, fields, models, modules
+
+from odoo.addons.payment_payu import const, utils
+
+
+class PayURateBucket(models.Model):
+    _name = 'payu.rate.bucket'
+    _description = 'PayU Route Rate Limit Bucket'
+    _log_access = False
+
+    key = fields.Char(string="Key", required=True, readonly=True)
+    tokens = fields.Float(string="Tokens", readonly=True)
+    updated_at = fields.Datetime(string="Updated At", readonly=True)
+
+    _sql_constraints = [
+        ('key_uniq', 'unique(key)', 'A rate limit key can only have one bucket.')
+    ]
+
+    def init(self):
+        # The buckets are disposable: they are kept out of the write-ahead log.
+        self.env.cr.execute("""
+            SELECT relpersistence FROM pg_class WHERE relname = 'payu_rate_bucket' AND relkind = 'r'
+        """)
+        row = self.env.cr.fetchone()
+        if row and row[0] == 'p':
+            self.env.cr.execute("ALTER TABLE payu_rate_bucket SET UNLOGGED")
+
+    #=== BUSINESS METHODS ===#
+
+    @api.model
+    def _get_route_limits(self, route):
+        """ Return the admission limits of a public PayU route.
+
+        :param str route: The route, as a key of `const.ROUTE_ADMISSION`.
+        :return: The concurrency, rate and burst of the route.
+        :rtype: dict
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        return {
+            limit: float(ICP.get_param(f'payment_payu.admission.{route}.{limit}', default))
+            for limit, default in const.ROUTE_ADMISSION[route].items()
+        }
+
+    @api.model
+    def _admit(self, route, source):
+        """ Decide whether a request to a public PayU route is served.
+
+        The request takes a token from the bucket of its source address, then one of the
+        concurrency slots of the route, which is held until the end of the current transaction.
+
+        :param str route: The route, as a key of `const.ROUTE_ADMISSION`.
+        :param str source: The source address of the request.
+        :return: The rejection reason, `rate_limited` or `busy`, and the number of seconds to
+                 wait before retrying; or (None, 0) if the request is admitted.
+        :rtype: tuple(str, int)
+        """
+        limits = self._get_route_limits(route)
+        if limits['rate'] > 0:
+            retry_after = self._take_token(f'{route}:{source}', limits['rate'], max(limits['burst'], 1))
+            if retry_after:
+                return 'rate_limited', retry_after
+        if limits['concurrency'] > 0 and not utils.try_acquire_slot(
+            self.env.cr, const.ROUTE_LOCK_IDS[route], int(limits['concurrency'])
+        ):
+            return 'busy', const.ROUTE_BUSY_RETRY_AFTER
+        return None, 0
+
+    @api.model
+    def _take_token(self, key, rate, burst):
+        """ Take a token from a bucket refilled with `rate` tokens per second, up to `burst`.
+
+        The bucket is updated in a single statement committed right away, so that concurrent
+        requests of the same source never wait for each other's transaction. The statement runs
+        at READ COMMITTED: a concurrent update of the same bucket is then waited for and built
+        upon, where REPEATABLE READ would fail with a serialization error. A turned down request
+        consumes its token too, down to a debt of one token.
+
+        :param str key: The key of the bucket.
+        :param float rate: The number of tokens added per second.
+        :param float burst: The capacity of the bucket.
+        :return: The number of seconds to wait before a token is available, or 0 if one was taken.
+        :rtype: int
+        """
+        query = """
+            INSERT INTO payu_rate_bucket AS bucket (key, tokens, updated_at)
+                 VALUES (%(key)s, %(burst)s - 1, clock_timestamp() AT TIME ZONE 'UTC')
+            ON CONFLICT (key) DO UPDATE SET
+                tokens = GREATEST(LEAST(%(burst)s, bucket.tokens + %(rate)s * EXTRACT(
+                    EPOCH FROM clock_timestamp() AT TIME ZONE 'UTC' - bucket.updated_at
+                )) - 1, -1),
+                updated_at = clock_timestamp() AT TIME ZONE 'UTC'
+              RETURNING tokens
+        """
+        params = {'key': key, 'rate': rate, 'burst': burst}
+        if modules.module.current_test:
+            self.env.cr.execute(query, params)
+            tokens = self.env.cr.fetchone()[0]
+        else:
+            with self.env.registry.cursor() as cr:
+                cr.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+                cr.execute(query, params)
+                tokens = cr.fetchone()[0]
+        if tokens >= 0:
+            return 0
+        return max(math.ceil((1 - tokens) / rate), 1)
+
+    @api.autovacuum
+    def _gc_buckets(self):
+        """ Delete the buckets unused for `const.RATE_BUCKET_RETENTION_HOURS`, which are full. """
+        limit_date = fields.Datetime.now() - timedelta(hours=const.RATE_BUCKET_RETENTION_HOURS)
+        self.env.cr.execute("DELETE FROM payu_rate_bucket WHERE updated_at < %s", [limit_date])
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+
+from odoo import _, api, fields, models, modules
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import float_compare
+
+from odoo.addons.payment_payu import const, http_client, log_events, utils
+
+_logger = logging.getLogger(__name__)
+
+# The state of a bulk refund line, by state of its refund transaction; the other states fail it.
+REFUND_LINE_STATES = {'done': 'done', 'pending': 'queued'}
+
+
+class PayURefundBatch(models.Model):
+    _name = 'payu.refund.batch'
+    _description = 'PayU Bulk Refund'
+    _order = 'id desc'
+
+    state = fields.Selection(
+        string="Status",
+        selection=[('pending', "Pending"), ('running', "In Progress"), ('done', "Done")],
+        compute='_compute_state',
+        store=True,
+        index=True,
+    )
+    line_ids = fields.One2many('payu.refund.batch.line', 'batch_id', string="Refunds", readonly=True)
+    line_count = fields.Integer(string="Refunds", compute='_compute_progress')
+    done_count = fields.Integer(string="Refunded", compute='_compute_progress')
+    error_count = fields.Integer(string="Failed", compute='_compute_progress')
+    progress = fields.Float(string="Progress", compute='_compute_progress')
+
+    #=== COMPUTE METHODS ===#
+
+    @api.depends('line_ids.state')
+    def _compute_state(self):
+        for batch in self:
+            states = set(batch.line_ids.mapped('state'))
+            if not states & {'pending', 'sending', 'queued'}:
+                batch.state = 'done'
+            elif states == {'pending'}:
+                batch.state = 'pending'
+            else:
+                batch.state = 'running'
+
+    @api.depends('line_ids.state')
+    def _compute_progress(self):
+        counts = {
+            (batch.id, state): count
+            for batch, state, count in self.env['payu.refund.batch.line']._read_group(
+                [('batch_id', 'in', self.ids)], ['batch_id', 'state'], ['__count'],
+            )
+        }
+        for batch in self:
+            batch.done_count = counts.get((batch.id, 'done'), 0)
+            batch.error_count = counts.get((batch.id, 'error'), 0)
+            batch.line_count = sum(count for (batch_id, _state), count in counts.items() if batch_id == batch.id)
+            processed = batch.done_count + batch.error_count
+            batch.progress = 100 * processed / batch.line_count if batch.line_count else 100
+
+    def _compute_display_name(self):
+        for batch in self:
+            batch.display_name = _("PayU Bulk Refund #%s", batch.id)
+
+    #=== BUSINESS METHODS ===#
+
+    @api.model
+    def _create_from_transactions(self, transactions, amounts=None):
+        """ Create a bulk refund of PayU transactions and schedule its processing.
+
+        :param recordset transactions: The transactions to refund, as `payment.transaction` records.
+        :param dict amounts: The amount to refund, by transaction id; the remaining refundable
+                             amount of the transactions that are not listed is refunded.
+        :return: The bulk refund.
+        :rtype: recordset of `payu.refund.batch`
+        :raise UserError: If a transaction cannot be refunded with the requested amount.
+        """
+        amounts = amounts or {}
+        line_values = []
+        for tx in transactions:
+            if tx.provider_code != 'payu' or tx.state != 'done' or tx.operation == 'refund':
+                raise UserError(_("Only confirmed PayU payments can be refunded: %s.", tx.reference))
+            refundable = tx._payu_get_refundable_amount()
+            amount = amounts.get(tx.id, refundable)
+            if amount <= 0 or float_compare(amount, refundable, precision_rounding=tx.currency_id.rounding) > 0:
+                raise UserError(_(
+                    "The amount to refund of %(reference)s must be positive and at most %(amount)s.",
+                    reference=tx.reference, amount=refundable,
+                ))
+            line_values.append({'source_transaction_id': tx.id, 'amount': amount})
+        if not line_values:
+            raise UserError(_("Select the PayU payments to refund."))
+
+        batch = self.create({'line_ids': [fields.Command.create(values) for values in line_values]})
+        self.env.ref('payment_payu.ir_cron_process_payu_refund_batches')._trigger()
+        return batch
+
+    @api.model
+    def _cron_process_batches(self, chunk_size=None):
+        """ Send the pending refunds of all the bulk refunds, chunk after chunk.
+
+        Each chunk is committed once processed, so that the progress of the bulk refunds is
+        visible while they run.
+        """
+        auto_commit = not modules.module.current_test
+        rate_limit = float(self.env['ir.config_parameter'].sudo().get_param(
+            'payment_payu.refund_rate_limit', const.REFUND_RATE_LIMIT
+        ))
+        limiters = {}  # The rate limiters, by merchant key, shared by the chunks of the run.
+        Line = self.env['payu.refund.batch.line']
+        Line._fail_stale_sending_lines()
+        while True:
+            self.env.cr.execute("""
+                SELECT id FROM payu_refund_batch_line
+                 WHERE state = 'pending'
+              ORDER BY id
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+            """, [chunk_size or const.REFUND_BATCH_CHUNK_SIZE])
+            lines = Line.browse([row[0] for row in self.env.cr.fetchall()])
+            if not lines:
+                break
+            lines._process(limiters, rate_limit)
+            if auto_commit:
+                self.env.cr.commit()
+            self.env['ir.cron']._notify_progress(
+                done=len(lines), remaining=Line.search_count([('state', '=', 'pending')]),
+            )
+
+
+class PayURefundBatchLine(models.Model):
+    _name = 'payu.refund.batch.line'
+    _description = 'PayU Bulk Refund Line'
+    _order = 'id'
+
+    batch_id = fields.Many2one(
+        'payu.refund.batch', string="Bulk Refund", required=True, index=True, ondelete='cascade'
+    )
+    source_transaction_id = fields.Many2one(
+        'payment.transaction', string="Payment", required=True, readonly=True, ondelete='cascade'
+    )
+    currency_id = fields.Many2one(related='source_transaction_id.currency_id')
+    amount = fields.Monetary(string="Amount", required=True, readonly=True)
+    state = fields.Selection(
+        string="Status",
+        selection=[
+            ('pending', "Pending"),
+            ('sending', "Sending"),
+            ('queued', "Queued at PayU"),
+            ('done', "Refunded"),
+            ('error', "Failed"),
+        ],
+        default='pending',
+        required=True,
+        index=True,
+    )
+    refund_transaction_id = fields.Many2one('payment.transaction', string="Refund", readonly=True)
+    message = fields.Text(string="Message", readonly=True)
+
+    #=== BUSINESS METHODS ===#
+
+    def _process(self, limiters, rate_limit):
+        """ Send the refunds of the lines and record their outcome.
+
+        The refundable amount of each payment is checked again, then the refund transactions are
+        created, the requests are signed and the lines are committed as `sending` in the current
+        cursor, so that a refund is never sent twice, even if the job is interrupted before
+        recording its outcome. Only the HTTP calls are dispatched to
+        `payment_payu.refund_concurrency` worker threads, under a rate limit of `rate_limit`
+        calls per second per merchant key; the threads are given the URL and the signed data of
+        the requests, and the responses are applied in the current thread, as the environment
+        and its cursor cannot be shared between threads.
+
+        :param dict limiters: The rate limiters, by merchant key, completed with the new keys.
+        :param float rate_limit: The number of calls allowed per second per merchant key.
+        """
+        requests_to_send = []
+        for line in self:
+            tx = line.source_transaction_id
+            refundable = tx._payu_get_refundable_amount(excluded_lines=line)
+            if float_compare(line.amount, refundable, precision_rounding=tx.currency_id.rounding) > 0:
+                line.write({
+                    'state': 'error',
+                    'message': _("Only %s of the payment can still be refunded.", refundable),
+                })
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    refund_tx = tx._payu_create_refund_transaction(line.amount)
+                    url, data = tx._payu_prepare_refund_request(refund_tx, line.amount)
+            except Exception as e:
+                line.write({'state': 'error', 'message': str(e)})
+                continue
+            line.write({'state': 'sending', 'refund_transaction_id': refund_tx.id})
+            limiters.setdefault(data['key'], utils.RateLimiter(rate_limit))
+            log_events.log_event(
+                'api.request', "PayU: %s %s (%s), params: %s, data: %s", 'POST', url, 'refund', {}, data,
+            )
+            requests_to_send.append((line, url, data))
+        if modules.module.current_test:
+            self.env.flush_all()
+        else:
+            self.env.cr.commit()
+
+        dbname = self.env.cr.dbname
+
+        def send(request_to_send):
+            _line, url, data = request_to_send
+            limiters[data['key']].acquire()
+            try:
+                return http_client.request(
+                    'POST', url, operation='refund', params={'form': '2'}, data=data,
+                    headers={'Content-Type': 'application/x-www-form-urlencoded'}, journal_db=dbname,
+                ), None
+            except Exception as e:
+                return None, e
+
+        concurrency = min(self._get_concurrency(), len(requests_to_send))
+        if concurrency <= 1 or modules.module.current_test:
+            results = [send(request_to_send) for request_to_send in requests_to_send]
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='payu_refund') as executor:
+                results = list(executor.map(send, requests_to_send))
+
+        for (line, url, data), (response, error) in zip(requests_to_send, results):
+            refund_tx = line.refund_transaction_id
+            try:
+                with self.env.cr.savepoint():
+                    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+                        log_events.log_event(
+                            'api.error', "PayU: unable to reach endpoint at %s: %s", url, error,
+                        )
+                        raise ValidationError("PayU: " + _("Could not establish the connection to the API."))
+                    if error:
+                        raise ValidationError(str(error))
+                    refund_tx._payu_apply_refund_response(
+                        refund_tx.provider_id._payu_parse_response(url, response, data=data)
+                    )
+            except Exception as e:
+                refund_tx._set_error(_("Your refund failed. Reason: %s", e))
+            line.write({
+                'state': REFUND_LINE_STATES.get(refund_tx.state, 'error'),
+                'message': refund_tx.state_message,
+            })
+
+    @api.model
+    def _fail_stale_sending_lines(self):
+        """ Fail the lines left `sending` by a job interrupted before recording their outcome.
+
+        Whether PayU received their refund is unknown: they are never sent again, and the amount
+        of their refund transaction stays reserved until the refund is checked at PayU.
+        """
+        stale_lines = self.search([
+            ('state', '=', 'sending'),
+            ('write_date', '<', fields.Datetime.now() - timedelta(minutes=const.REFUND_SENDING_TIMEOUT)),
+        ])
+        if stale_lines:
+            _logger.warning("PayU: %d bulk refund(s) interrupted while sending, failing them.", len(stale_lines))
+            stale_lines.write({
+                'state': 'error',
+                'message': _(
+                    "The refund was interrupted before PayU answered; it may have been received. "
+                    "Check it on the PayU dashboard before refunding the payment again."
+                ),
+            })
+
+    @api.model
+    def _sync_queued_lines(self, refund_txs):
+        """ Update the lines queued at PayU with the outcome of their refund transaction.
+
+        :param recordset refund_txs: The settled refund transactions, as `payment.transaction`
+                                     records.
+        :return: None
+        """
+        lines = self.search([('refund_transaction_id', 'in', refund_txs.ids), ('state', '=', 'queued')])
+        for line in lines:
+            line.write({
+                'state': REFUND_LINE_STATES.get(line.refund_transaction_id.state, 'error'),
+                'message': line.refund_transaction_id.state_message,
+            })
+
+    def _get_concurrency(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'payment_payu.refund_concurrency', const.REFUND_CONCURRENCY
+        ))
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models
+
+
+class SaleOrder(models.Model):
+    _inherit = 'sale.order'
+
+    payu_invoice_upload_ids = fields.One2many(
+        'payu.invoice.upload', 'sale_order_id', string="PayU Invoice Uploads"
+    )
+    payu_invoice_upload_state = fields.Selection(
+        string="PayU Invoice Upload",
+        selection=[('pending', "Pending"), ('done', "Uploaded"), ('failed', "Failed")],
+        compute='_compute_payu_invoice_upload_state',
+        help="Status of the upload of the invoice of a cross-border payment to PayU",
+    )
+
+    @api.depends('payu_invoice_upload_ids.state')
+    def _compute_payu_invoice_upload_state(self):
+        for order in self:
+            # The jobs are ordered from the most recent one.
+            order.payu_invoice_upload_state = order.payu_invoice_upload_ids[:1].state
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import hashlib
+
+from odoo.addons.payment_payu import const
+
+SALT_PLACEHOLDER = '_SALT_'
+
+# The characters stripped from both ends of a hash string: every Unicode whitespace, as matched
+# by `\s`, and the pipe separator.
+_STRIP_CHARS = ''.join(chr(code) for code in range(0x3001) if chr(code).isspace()) + '|'
+
+
+class PayUSigner:
+    """ Compiled SHA-512 signer of a PayU hash parameter spec.
+
+    The spec is resolved once, when the signer is built, into the ordered value keys and the
+    position of the merchant salt, so signing a values dict only joins and hashes strings.
+    """
+
+    __slots__ = ('name', 'keys')
+
+    def __init__(self, name, hash_params):
+        """
+        :param str name: The name of the spec, e.g. `PAYMENT_HASH_PARAMS`.
+        :param list hash_params: The ordered parameter names of the spec, the merchant salt
+                                 being represented by `SALT_PLACEHOLDER`.
+        """
+        self.name = name
+        # The salt is represented by `None` since it is not read from the values.
+        self.keys = tuple(None if param == SALT_PLACEHOLDER else param for param in hash_params)
+
+    def hash_string(self, values, salt):
+        """ Return the pipe-separated string hashed for the given values.
+
+        :param dict values: The values used to generate the signature.
+        :param str salt: The merchant salt.
+        :return: The string to hash.
+        :rtype: str
+        """
+        return '|'.join([
+            salt if key is None else str(values.get(key) or '').strip() for key in self.keys
+        ]).strip(_STRIP_CHARS)
+
+    def sign(self, values, salt):
+        """ Return the signature of the given values.
+
+        :param dict values: The values used to generate the signature.
+        :param str salt: The merchant salt.
+        :return: The signature as a hex string.
+        :rtype: str
+        """
+        return hashlib.sha512(self.hash_string(values, salt).encode('utf-8')).hexdigest()
+
+    def sign_many(self, values_list, salt):
+        """ Return the signatures of several values dicts signed with the same salt.
+
+        :param list values_list: The values dicts to sign.
+        :param str salt: The merchant salt.
+        :return: The signatures as hex strings, in the order of `values_list`.
+        :rtype: list
+        """
+        sha512 = hashlib.sha512
+        hash_string = self.hash_string
+        return [sha512(hash_string(values, salt).encode('utf-8')).hexdigest() for values in values_list]
+
+
+SIGNERS = {
+    name: PayUSigner(name, getattr(const, name)) for name in (
+        'PAYMENT_HASH_PARAMS',
+        'PAYMENT_REVERSE_HASH_PARAMS',
+        'REFUND_HASH_PARAMS',
+        'UPDATE_INVOICE_ID_HASH_PARAMS',
+        'UPLOAD_INVOICE_HASH_PARAMS',
+        'CHECK_ACTION_STATUS_HASH_PARAMS',
+        'VERIFY_PAYMENT_HASH_PARAMS',
+    )
+}
+
+
+def get_signer(hash_param_const_name):
+    """ Return the compiled signer of a hash parameter spec.
+
+    Specs that are not compiled at import time are compiled on first use and kept.
+
+    :param str hash_param_const_name: The constant name specifying hash param keys.
+    :return: The signer of the spec.
+    :rtype: PayUSigner
+    """
+    signer = SIGNERS.get(hash_param_const_name)
+    if signer is None:
+        signer = SIGNERS[hash_param_const_name] = PayUSigner(
+            hash_param_const_name, getattr(const, hash_param_const_name, [])
+        )
+    return signer
@@ -1,3 +1,14 @@
 from . import test_payment_provider
 from . import test_payment_transaction
-from . import test_payment_provider_credentials
\ No newline at end of file
+from . import test_payment_provider_credentials
+from . import test_benchmarks
+from . import test_payu_notification
+from . import test_payu_concurrency
+from . import test_payu_invoice_upload
+from . import test_payu_metrics
+from . import test_payu_log_events
+from . import test_payu_refund_batch
+from . import test_payu_admission
+from . import test_payu_status
+from . import test_payu_call_journal
+from . import test_payu_cancel
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import logging
+import itertools
+import os
+import re
+import time
+import timeit
+import tracemalloc
+from unittest.mock import patch
+
+from odoo import Command
+from odoo.tests import BaseCase, TransactionCase, tagged
+
+from odoo.addons.website.tools import MockRequest
+
+from odoo.addons.payment_payu import const, signer, utils
+
+_logger = logging.getLogger(__name__)
+
+# Set this environment variable to a file path to append the results as JSON lines.
+BENCH_OUTPUT_ENV = 'PAYU_BENCH_OUTPUT'
+# Set this environment variable to tag the results, e.g. with the commit being measured.
+BENCH_LABEL_ENV = 'PAYU_BENCH_LABEL'
+
+
+def _legacy_sign(hash_param_const_name, values, salt):
+    """ Reference implementation of the signing done before the specs were compiled. """
+    def safe_str(val):
+        return str(val or '').strip()
+
+    hash_string_parts = []
+    for hash_param in getattr(const, hash_param_const_name, []):
+        if hash_param == '_SALT_':
+            hash_string_parts.append(salt)
+        else:
+            hash_string_parts.append(safe_str(values.get(hash_param)))
+    hash_string = '|'.join(hash_string_parts)
+    hash_string = re.sub(r'^[\s|]+|[\s|]+$', '', hash_string)
+    return hashlib.sha512(hash_string.encode('utf-8')).hexdigest()
+
+
+def _legacy_cart_details(order):
+    """ Reference implementation of the cart serialization done before the single-pass one. """
+    sku_details = []
+    for line in order.order_line:
+        product = line.product_id
+        sku_details.append({
+            "sku_id": product.default_code or str(product.id),
+            "sku_name": product.name,
+            "amount_per_sku": f"{line.price_total:.2f}",
+            "quantity": int(line.product_uom_qty),
+            "offer_key": [],
+            "offer_auto_apply": True
+        })
+    return json.dumps({
+        "amount": float(order.amount_total),
+        "items": int(sum(line.product_uom_qty for line in order.order_line)),
+        "surcharges": 0,
+        "pre_discount": float(order.amount_undiscounted),
+        "sku_details": sku_details
+    })
+
+
+class PayUBenchmarkMixin:
+    """ Reporting helpers of the PayU benchmarks, which are excluded from the standard test runs.
+
+    Run them with `--test-tags payu_bench`.
+    """
+
+    def _report(self, benchmark, **metrics):
+        """ Log the metrics of a benchmark and append them to the output file, if any. """
+        record = {'benchmark': benchmark, **metrics}
+        if os.environ.get(BENCH_LABEL_ENV):
+            record['label'] = os.environ[BENCH_LABEL_ENV]
+        _logger.info("PayU benchmark: %s", json.dumps(record))
+        output_path = os.environ.get(BENCH_OUTPUT_ENV)
+        if output_path:
+            with open(output_path, 'a', encoding='utf-8') as output_file:
+                output_file.write(json.dumps(record) + '\n')
+
+
+class PayUBenchmarkCase(PayUBenchmarkMixin, BaseCase):
+    pass
+
+
+@tagged('-standard', 'payu_bench')
+class TestPayUSignerBenchmark(PayUBenchmarkCase):
+
+    ROUNDS = 20000
+    VALUES = {
+        'key': 'bench_key',
+        'txnid': '6f1c4a0e-4f8b-4a57-9d47-6a1f2f3f1f11',
+        'amount': '1499.00',
+        'productinfo': 'Odoo product',
+        'firstname': 'John',
+        'email': 'john@example.com',
+        'udf1': '42', 'udf2': 'S00042-1', 'udf3': 'website', 'udf4': '', 'udf5': 'odoo',
+        'status': 'success',
+        'additionalCharges': '',
+    }
+
+    def test_bench_sign(self):
+        for spec in signer.SIGNERS:
+            compiled = signer.get_signer(spec)
+            self.assertEqual(
+                compiled.sign(self.VALUES, 'bench_salt'), _legacy_sign(spec, self.VALUES, 'bench_salt')
+            )
+            before = timeit.timeit(
+                lambda: _legacy_sign(spec, self.VALUES, 'bench_salt'), number=self.ROUNDS
+            )
+            after = timeit.timeit(lambda: compiled.sign(self.VALUES, 'bench_salt'), number=self.ROUNDS)
+            self._report(
+                'sign', spec=spec, rounds=self.ROUNDS,
+                before_us=before / self.ROUNDS * 1e6, after_us=after / self.ROUNDS * 1e6,
+            )
+
+    def test_bench_sign_many(self):
+        compiled = signer.get_signer('PAYMENT_REVERSE_HASH_PARAMS')
+        values_list = [dict(self.VALUES, txnid=str(i)) for i in range(self.ROUNDS)]
+        single = timeit.timeit(
+            lambda: [compiled.sign(values, 'bench_salt') for values in values_list], number=1
+        )
+        batch = timeit.timeit(lambda: compiled.sign_many(values_list, 'bench_salt'), number=1)
+        self._report(
+            'sign_many', spec=compiled.name, rounds=self.ROUNDS,
+            single_us=single / self.ROUNDS * 1e6, batch_us=batch / self.ROUNDS * 1e6,
+        )
+
+
+@tagged('-standard', '-at_install', 'post_install', 'payu_bench')
+class TestPayUCartBenchmark(PayUBenchmarkMixin, TransactionCase):
+
+    LINE_COUNTS = (10, 1000, 10000)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.partner = cls.env['res.partner'].create({'name': 'Bench Buyer'})
+        cls.products = cls.env['product.product'].create([
+            {'name': f'Bench Product {i}', 'default_code': f'BENCH-{i}', 'list_price': 10.0 + i}
+            for i in range(100)
+        ])
+
+    def _create_order(self, line_count):
+        return self.env['sale.order'].create({
+            'partner_id': self.partner.id,
+            'order_line': [
+                Command.create({'product_id': self.products[i % 100].id, 'product_uom_qty': 1 + i % 3})
+                for i in range(line_count)
+            ],
+        })
+
+    def _measure(self, serialize, order):
+        self.env.invalidate_all()
+        queries_before = self.cr.sql_log_count
+        start = time.perf_counter()
+        document = serialize(order)
+        return document, time.perf_counter() - start, self.cr.sql_log_count - queries_before
+
+    def test_bench_cart_details(self):
+        tx = self.env['payment.transaction']
+        for line_count in self.LINE_COUNTS:
+            order = self._create_order(line_count)
+            self.env.flush_all()
+            legacy, before_s, before_queries = self._measure(_legacy_cart_details, order)
+            current, after_s, after_queries = self._measure(tx.get_cart_details, order)
+            self.assertEqual(json.loads(current)['items'], json.loads(legacy)['items'])
+            self._report(
+                'cart_details', lines=line_count,
+                before_ms=before_s * 1000, before_queries=before_queries,
+                after_ms=after_s * 1000, after_queries=after_queries,
+                json_backend='orjson' if utils.orjson else 'json',
+            )
+
+
+@tagged('-standard', '-at_install', 'post_install', 'payu_bench')
+class TestPayUHotPathBenchmark(PayUBenchmarkMixin, TransactionCase):
+    """ Wall time, SQL queries and peak memory of the PayU payment, notification, refund and
+    settlement paths, run against the database with only the HTTP layer mocked. """
+
+    ROUNDS = 20
+    SETTLEMENT_SIZES = (100, 1000, 10000)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.provider = cls.env.ref('payment_payu.payment_provider_payu')
+        cls.provider.state = 'test'
+        cls.currency = cls.env.ref('base.INR')
+        cls.credential = cls.provider._payu_get_credential(cls.currency) or cls.env['payu.credential'].create({
+            'provider_id': cls.provider.id,
+            'currency_id': cls.currency.id,
+            'merchant_key': 'bench_key',
+            'merchant_salt': 'bench_salt',
+        })
+        cls.partner = cls.env['res.partner'].create({
+            'name': 'Bench Buyer', 'email': 'bench@example.com', 'phone': '9999999999',
+        })
+        cls.products = cls.env['product.product'].create([
+            {'name': f'Bench Product {i}', 'default_code': f'BENCH-{i}', 'list_price': 10.0 + i}
+            for i in range(10)
+        ])
+        cls.invoice = cls.env['account.move'].create({
+            'move_type': 'out_invoice',
+            'partner_id': cls.partner.id,
+            'currency_id': cls.currency.id,
+            'invoice_line_ids': [
+                Command.create({'product_id': product.id, 'quantity': 1, 'price_unit': product.list_price})
+                for product in cls.products
+            ],
+        })
+        cls.sale_order = cls.env['sale.order'].create({
+            'partner_id': cls.partner.id,
+            'order_line': [Command.create({'product_id': product.id}) for product in cls.products],
+        })
+        cls.sequence = itertools.count()
+
+    def _create_txs(self, count, **values):
+        batch = next(self.sequence)
+        return self.env['payment.transaction'].create([{
+            'amount': 100.0,
+            'partner_id': self.partner.id,
+            'provider_id': self.provider.id,
+            'reference': f'PAYU-BENCH-{batch}-{i}',
+            'currency_id': self.currency.id,
+            'payment_method_id': self.provider.payment_method_ids[:1].id,
+            **values,
+        } for i in range(count)])
+
+    def _notification_data(self, tx, status, **values):
+        data = {
+            'mihpayid': f'40399{tx.id:07d}',
+            'status': status,
+            'txnid': tx.reference,
+            'amount': '100.00',
+            'productinfo': 'Odoo product',
+            'firstname': 'Bench',
+            'email': self.partner.email,
+            'udf2': tx.reference,
+            'key': self.credential.merchant_key,
+            **values,
+        }
+        data['hash'] = signer.get_signer('PAYMENT_REVERSE_HASH_PARAMS').sign(
+            data, self.credential.merchant_salt
+        )
+        return data
+
+    def _profile(self, prepare, rounds):
+        """ Run calls prepared by `prepare` and return their cost.
+
+        Each of the `rounds` calls is timed and its queries are counted with a cold cache, the
+        pending writes being flushed within the measure; one more call is run under `tracemalloc`
+        to measure the peak memory, since tracing slows the calls down.
+
+        :param callable prepare: The function returning a call to measure, run out of the measure.
+        :param int rounds: The number of timed calls.
+        :return: The metrics of the calls.
+        :rtype: dict
+        """
+        calls = [prepare() for _i in range(rounds + 1)]
+        self.env.flush_all()
+        timings, query_counts = [], []
+        for call in calls[:-1]:
+            self.env.invalidate_all()
+            queries_before = self.cr.sql_log_count
+            start = time.perf_counter()
+            call()
+            self.env.flush_all()
+            timings.append(time.perf_counter() - start)
+            query_counts.append(self.cr.sql_log_count - queries_before)
+
+        self.env.invalidate_all()
+        tracemalloc.start()
+        try:
+            calls[-1]()
+            self.env.flush_all()
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {
+            'rounds': rounds,
+            'wall_ms_mean': sum(timings) / rounds * 1000,
+            'wall_ms_max': max(timings) * 1000,
+            'queries_mean': sum(query_counts) / rounds,
+            'queries_max': max(query_counts),
+            'peak_kib': peak / 1024,
+        }
+
+    def test_bench_rendering_values(self):
+        def prepare():
+            tx = self._create_txs(1, invoice_ids=[Command.set(self.invoice.ids)])
+            processing_values = {
+                'reference': tx.reference,
+                'amount': tx.amount,
+                'currency_id': tx.currency_id.id,
+                'partner_id': tx.partner_id.id,
+            }
+            return lambda: tx._get_specific_rendering_values(processing_values)
+
+        with MockRequest(self.env):
+            self._report('rendering_values', **self._profile(prepare, self.ROUNDS))
+
+    def test_bench_generate_sign(self):
+        values = {
+            'key': self.credential.merchant_key, 'txnid': 'bench', 'amount': '100.00',
+            'productinfo': 'Odoo product', 'firstname': 'Bench', 'email': self.partner.email,
+        }
+        self._report('generate_sign', **self._profile(
+            lambda: lambda: self.provider._payu_generate_sign('PAYMENT_HASH_PARAMS', values, self.currency),
+            self.ROUNDS,
+        ))
+
+    def test_bench_process_notification(self):
+        payloads = {
+            'success': lambda tx: self._notification_data(tx, 'success'),
+            'failure': lambda tx: self._notification_data(
+                tx, 'failure', error_Message='Bank declined the payment'
+            ),
+            'discount': lambda tx: self._notification_data(
+                tx, 'success', udf1=str(self.sale_order.id), udf3='website', discount='10.00',
+                net_amount_debit='90.00',
+            ),
+        }
+        for payload, build_data in payloads.items():
+            def prepare(build_data=build_data):
+                tx = self._create_txs(1)
+                data = build_data(tx)
+                return lambda: tx._process_notification_data(data)
+
+            with MockRequest(self.env):
+                self._report('process_notification', payload=payload, **self._profile(prepare, self.ROUNDS))
+
+    @patch('odoo.addons.payment_payu.http_client.get_session')
+    def test_bench_send_refund_request(self, mock_get_session):
+        mock_response = mock_get_session.return_value.request.return_value
+        mock_response.text = json.dumps({
+            'status': 1, 'msg': 'Refund Request Queued', 'request_id': '1', 'mihpayid': '403993715521',
+            'error_code': 102,
+        })
+
+        def prepare():
+            tx = self._create_txs(1, state='done', provider_reference=f'40399{next(self.sequence):07d}')
+            return lambda: tx._send_refund_request(amount_to_refund=10.0)
+
+        self._report('send_refund_request', **self._profile(prepare, self.ROUNDS))
+
+    def test_bench_process_settlement_data(self):
+        tx_model = self.env['payment.transaction']
+        for size in self.SETTLEMENT_SIZES:
+            txs = self._create_txs(size)
+            for tx in txs:
+                tx.provider_reference = f'SETTLE-{tx.id}'
+            page = {'status': 0, 'result': {'size': size, 'data': [{
+                'utrNumber': f'UTR{size}',
+                'transaction': [{
+                    'payuId': tx.provider_reference,
+                    'merchantNetAmount': '98.00',
+                    'merchantServiceFee': '1.70',
+                    'merchantServiceTax': '0.30',
+                    'settlementCurrency': 'INR',
+                } for tx in txs],
+            }]}}
+            self._report('process_settlement_data', transactions=size, **self._profile(
+                lambda: lambda: tx_model._process_settlement_data(page, self.credential), rounds=3,
+            ))
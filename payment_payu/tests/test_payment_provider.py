@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import json
 
 from requests.exceptions import HTTPError
@@ -6,7 +7,7 @@ from unittest.mock import patch, Mock, PropertyMock
 
 from odoo.tests.common import TransactionCase
 from odoo.exceptions import ValidationError, RedirectWarning
-from odoo.addons.payment_payu import const
+from odoo.addons.payment_payu import const, http_client, signer
 
 class TestPayUPaymentProvider(TransactionCase):
 
@@ -52,6 +53,25 @@ class TestPayUPaymentProvider(TransactionCase):
         urls = self.provider._get_payu_urls()
         self.assertIn('secure.payu.in', urls['payu_form_url'])
 
+    def test_payu_get_api_url_live_hosts(self):
+        self.provider.state = 'enabled'
+        self.assertEqual(
+            self.provider._payu_get_api_url('api', 'settlement/range'), 'https://info.payu.in/settlement/range'
+        )
+        self.assertEqual(
+            self.provider._payu_get_api_url('payment', '_payment'), 'https://secure.payu.in/_payment'
+        )
+
+    def test_payu_get_api_url_base_url_override(self):
+        self.provider.payu_base_url = 'http://localhost:8070/'
+        self.assertEqual(
+            self.provider._get_payu_urls()['payu_form_url'], 'http://localhost:8070/_payment'
+        )
+        self.assertEqual(
+            self.provider._payu_get_api_url('api', 'merchant/postservice.php'),
+            'http://localhost:8070/merchant/postservice.php',
+        )
+
     def test_get_supported_currencies_filters(self):
         supported = self.provider._get_supported_currencies()
         if self.currency:
@@ -79,27 +99,54 @@ class TestPayUPaymentProvider(TransactionCase):
         self.assertIsInstance(hash_val, str)
         self.assertEqual(len(hash_val), 128)  # sha512 length
 
-    @patch('odoo.addons.payment_payu.models.payment_provider.requests.post')
-    def test_payu_make_post_request(self, mock_post):
+    def test_payu_generate_signs_matches_single_sign(self):
+        values_list = [
+            {'key': 'test_key', 'command': 'cancel_refund_transaction', 'var1': str(i)} for i in range(3)
+        ]
+        signs = self.provider._payu_generate_signs('REFUND_HASH_PARAMS', values_list, self.currency)
+        self.assertEqual(signs, [
+            self.provider._payu_generate_sign('REFUND_HASH_PARAMS', values, self.currency)
+            for values in values_list
+        ])
+
+    def test_signer_strips_empty_trailing_params(self):
+        values = {'key': 'test_key', 'txnid': ' 12345 ', 'amount': '100.00'}
+        hash_string = signer.get_signer('PAYMENT_HASH_PARAMS').hash_string(values, 'test_salt')
+        self.assertEqual(hash_string, 'test_key|12345|100.00' + '|' * 14 + 'test_salt')
+        reverse_string = signer.get_signer('PAYMENT_REVERSE_HASH_PARAMS').hash_string(values, 'test_salt')
+        self.assertEqual(reverse_string, 'test_salt' + '|' * 15 + '100.00|12345|test_key')
+        self.assertEqual(
+            signer.get_signer('PAYMENT_HASH_PARAMS').sign(values, 'test_salt'),
+            hashlib.sha512(hash_string.encode('utf-8')).hexdigest(),
+        )
+
+    @patch('odoo.addons.payment_payu.http_client.get_session')
+    def test_payu_make_post_request(self, mock_get_session):
         mock_resp = Mock()
         mock_resp.status_code = 200
         mock_resp.text = json.dumps({'status': 'success'})
         mock_resp.raise_for_status = Mock()
-        mock_post.return_value = mock_resp
+        mock_get_session.return_value.request.return_value = mock_resp
 
         result = self.provider._payu_make_request(
             url='https://test.payu.in/_payment',
             data={'key': 'value'}
         )
         self.assertEqual(result['status'], 'success')
+        _method, _url = mock_get_session.return_value.request.call_args.args
+        self.assertEqual(_method, 'POST')
+        self.assertEqual(
+            mock_get_session.return_value.request.call_args.kwargs['timeout'],
+            const.API_TIMEOUTS['default'],
+        )
 
-    @patch('odoo.addons.payment_payu.models.payment_provider.requests.get')
-    def test_payu_make_get_request_with_token(self, mock_get):
+    @patch('odoo.addons.payment_payu.http_client.get_session')
+    def test_payu_make_get_request_with_token(self, mock_get_session):
         mock_resp = Mock()
         mock_resp.status_code = 200
         mock_resp.text = json.dumps({'result': 'ok'})
         mock_resp.raise_for_status = Mock()
-        mock_get.return_value = mock_resp
+        mock_get_session.return_value.request.return_value = mock_resp
 
         result = self.provider._payu_make_request(
             url='https://test.payu.in/_payment',
@@ -108,14 +155,32 @@ class TestPayUPaymentProvider(TransactionCase):
             bearer_token='dummy_token'
         )
         self.assertEqual(result['result'], 'ok')
+        headers = mock_get_session.return_value.request.call_args.kwargs['headers']
+        self.assertEqual(headers['Authorization'], 'Bearer dummy_token')
 
-    @patch('odoo.addons.payment_payu.models.payment_provider.requests.post')
-    def test_payu_make_request_http_error(self, mock_post):
+    @patch('odoo.addons.payment_payu.http_client.get_session')
+    def test_payu_make_request_http_error(self, mock_get_session):
         mock_resp = Mock()
         mock_resp.raise_for_status.side_effect = HTTPError("HTTP Error")
         mock_resp.text = json.dumps({'status': 'fail'})
         mock_resp.json = lambda: {'status': 'fail'}
-        mock_post.return_value = mock_resp
+        mock_get_session.return_value.request.return_value = mock_resp
 
         with self.assertRaises(ValidationError):
             self.provider._payu_make_request(url='https://fail.url', data={})
+
+    @patch('odoo.addons.payment_payu.http_client.get_session')
+    def test_payu_make_request_non_json_response(self, mock_get_session):
+        mock_resp = Mock()
+        mock_resp.status_code = 200
+        mock_resp.text = '<html><body>Under maintenance</body></html>'
+        mock_resp.raise_for_status = Mock()
+        mock_get_session.return_value.request.return_value = mock_resp
+
+        with self.assertRaises(ValidationError):
+            self.provider._payu_make_request(url='https://test.payu.in/_payment', data={})
+
+    def test_http_client_reuses_session_per_host(self):
+        session = http_client.get_session('https://test.payu.in/merchant/postservice.php')
+        self.assertIs(session, http_client.get_session('https://test.payu.in/settlement/range'))
+        self.assertIsNot(session, http_client.get_session('https://info.payu.in/settlement/range'))
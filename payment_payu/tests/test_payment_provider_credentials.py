@@ -76,3 +76,27 @@ class TestPayUPaymentProviderCredential(TransactionCase):
                 'merchant_key': 'xyz',
                 'merchant_salt': 'uvw',
             })
+
+    def test_credential_resolver_is_cached(self):
+        """Should resolve the credential without querying the database once cached."""
+        cred = self.env['payu.credential'].create({
+            'provider_id': self.provider.id,
+            'currency_id': self.currency.id,
+            'merchant_key': 'abc',
+            'merchant_salt': 'def',
+        })
+        self.assertEqual(self.provider._payu_get_credential(self.currency), cred)
+        with self.assertQueryCount(0):
+            self.provider._payu_get_credential(self.currency)
+
+    def test_credential_resolver_invalidated_on_unlink(self):
+        """Should stop resolving a credential once it is deleted."""
+        cred = self.env['payu.credential'].create({
+            'provider_id': self.provider.id,
+            'currency_id': self.currency.id,
+            'merchant_key': 'abc',
+            'merchant_salt': 'def',
+        })
+        self.assertEqual(self.provider._payu_get_credential(self.currency), cred)
+        cred.unlink()
+        self.assertFalse(self.provider._payu_get_credential(self.currency))
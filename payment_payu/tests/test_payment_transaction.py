@@ -1,20 +1,20 @@
 # -*- coding: utf-8 -*-
 import json
 from unittest.mock import patch, MagicMock, ANY
+from odoo import Command, fields
 from odoo.http import request
 from odoo.tests import TransactionCase
+from odoo.tools import mute_logger
 from odoo.exceptions import ValidationError
-from collections import namedtuple
+from datetime import date, timedelta
+
+from psycopg2 import IntegrityError
 
 from odoo.addons.website.tools import MockRequest
 
+from odoo.addons.payment_payu import const, utils
 from odoo.addons.payment_payu.models.payment_transaction import PaymentTransaction
 
-Product = namedtuple('Product', ['default_code', 'name', 'id'])
-OrderLine = namedtuple('OrderLine', ['product_id', 'price_total', 'product_uom_qty'])
-
-InvoiceLine = namedtuple('InvoiceLine', ['product_id', 'price_total', 'quantity'])
-Invoice = namedtuple('Invoice', ['invoice_line_ids', 'amount_total', 'amount_untaxed'])
 
 class TestPayUPaymentTransaction(TransactionCase):
     
@@ -66,37 +66,93 @@ class TestPayUPaymentTransaction(TransactionCase):
         result = self.tx.get_productinfo_string(order_mock)
         self.assertEqual(result, 'Product A')
 
-    def test_get_cart_details(self):
-        product = MagicMock()
-        product.default_code = 'SKU001'
-        product.name = 'Test Product'
-        product.id = 1
-
-        line = MagicMock()
-        line.product_id = product
-        line.price_total = 100.0
-        line.product_uom_qty = 2
+    def _create_invoice(self, product, line_count=1, price_unit=50.0):
+        return self.env['account.move'].create({
+            'move_type': 'out_invoice',
+            'partner_id': self.partner.id,
+            'currency_id': self.env.ref('base.INR').id,
+            'invoice_line_ids': [
+                Command.create({'product_id': product.id, 'quantity': 1, 'price_unit': price_unit, 'tax_ids': False})
+                for _i in range(line_count)
+            ],
+        })
 
-        order = MagicMock()
-        order.order_line = [line]
-        order.amount_total = 200.0
-        order.amount_undiscounted = 210.0
+    def test_get_cart_details(self):
+        product = self.env['product.product'].create({'name': 'Test Product', 'default_code': 'SKU001'})
+        order = self.env['sale.order'].create({
+            'partner_id': self.partner.id,
+            'order_line': [Command.create({
+                'product_id': product.id, 'product_uom_qty': 2, 'price_unit': 100.0, 'tax_id': False,
+            })],
+        })
 
         cart_json = self.tx.get_cart_details(order)
         cart = json.loads(cart_json)
         self.assertEqual(cart['amount'], 200.0)
         self.assertEqual(cart['items'], 2)
         self.assertEqual(cart['sku_details'][0]['sku_id'], 'SKU001')
+        self.assertEqual(cart['sku_details'][0]['amount_per_sku'], '200.00')
 
     def test_get_invoice_cart_details(self):
-        product = Product(default_code='SKU001', name='Test Product', id=1)
-        line = InvoiceLine(product_id=product, price_total=50.0, quantity=1)
-        invoice = Invoice(invoice_line_ids=[line], amount_total=50.0, amount_untaxed=45.0)
+        product = self.env['product.product'].create({'name': 'Test Product', 'default_code': 'SKU001'})
+        invoice = self._create_invoice(product)
 
         cart_json = self.tx.get_invoice_cart_details(invoice)
         cart = json.loads(cart_json)
         self.assertEqual(cart['amount'], 50.0)
         self.assertEqual(cart['items'], 1)
+        self.assertEqual(cart['sku_details'][0]['sku_id'], 'SKU001')
+
+    def test_cart_details_shrunk_to_size_limit(self):
+        product = self.env['product.product'].create({
+            'name': 'Ünïcödé product name ' * 10, 'default_code': 'SKU001',
+        })
+        invoice = self._create_invoice(product, line_count=50, price_unit=10.0)
+
+        cart = json.loads(self.tx.get_invoice_cart_details(invoice))
+        self.assertEqual(len(cart['sku_details']), 50)
+        self.assertEqual(cart['sku_details'][0]['offer_key'], [])
+
+        # The compacted document takes 8679 characters, but 9679 bytes.
+        with self.assertRaises(ValueError):
+            utils.dump_cart_details(json.loads(json.dumps(cart)), max_length=9000)
+
+        cart_json = utils.dump_cart_details(json.loads(json.dumps(cart)), max_length=10000)
+        self.assertLessEqual(len(cart_json.encode()), 10000)
+        cart = json.loads(cart_json)
+        self.assertNotIn('offer_key', cart['sku_details'][0])
+        self.assertLessEqual(len(cart['sku_details'][0]['sku_name']), const.CART_SKU_NAME_MAX_LENGTH)
+        # No SKU is dropped: the totals still match the SKUs.
+        self.assertEqual(len(cart['sku_details']), 50)
+        self.assertEqual(cart['amount'], 500.0)
+        self.assertEqual(cart['items'], 50)
+
+    def test_cart_details_too_long_for_payu(self):
+        product = self.env['product.product'].create({'name': 'Test Product', 'default_code': 'SKU001'})
+        invoice = self._create_invoice(product)
+
+        with patch.object(utils, 'dump_cart_details', side_effect=ValueError("Too long")), \
+                self.assertRaises(ValidationError):
+            self.tx.get_invoice_cart_details(invoice)
+
+    def test_apply_global_discount_to_order_updates_line_in_place(self):
+        product = self.env['product.product'].create({'name': 'Test Product', 'list_price': 500.0})
+        sale_order = self.env['sale.order'].create({
+            'partner_id': self.partner.id,
+            'order_line': [Command.create({'product_id': product.id, 'price_unit': 500.0, 'tax_id': False})],
+        })
+        discount_product = self.env.ref('payment_payu.product_pg_discount')
+
+        self.tx.apply_global_discount_to_order(sale_order, 50.0)
+        discount_line = sale_order.order_line.filtered(lambda l: l.product_id == discount_product)
+        self.assertEqual(discount_line.price_unit, -50.0)
+
+        self.tx.apply_global_discount_to_order(sale_order, 30.0)
+        self.assertEqual(
+            sale_order.order_line.filtered(lambda l: l.product_id == discount_product), discount_line
+        )
+        self.assertEqual(discount_line.price_unit, -30.0)
+        self.assertAlmostEqual(sale_order.amount_total, 470.0)
 
     def test_capture_and_void_not_supported(self):
         with self.assertRaises(NotImplementedError):
@@ -124,6 +180,20 @@ class TestPayUPaymentTransaction(TransactionCase):
         self.tx._process_notification_data(data)
         mocked_handle.assert_called_once()
 
+    @patch("odoo.addons.payment_payu.models.payment_transaction.PaymentTransaction._payu_verify_return_sign")
+    @patch("odoo.addons.payment_payu.models.payment_transaction.PaymentTransaction._handle_success_status")
+    def test_process_notification_data_duplicate_is_skipped(self, mocked_handle, mocked_verify):
+        self.tx.provider_code = "payu"
+        data = {"mihpayid": "123", "status": "success", "hash": "abc"}
+        self.tx._process_notification_data(data)
+        self.tx._process_notification_data(dict(data))
+        mocked_verify.assert_called_once()
+        mocked_handle.assert_called_once()
+
+        # A different outcome of the same payment is processed.
+        self.tx._process_notification_data({**data, "status": "failure", "hash": "def"})
+        self.assertEqual(mocked_verify.call_count, 2)
+
     @patch("odoo.addons.payment_payu.models.payment_transaction.PaymentTransaction._handle_failure_status")
     @patch("odoo.addons.payment_payu.models.payment_transaction.PaymentTransaction._payu_verify_return_sign")
     def test_process_notification_data_failure(self, mocked_verify, mocked_handle):
@@ -140,6 +210,102 @@ class TestPayUPaymentTransaction(TransactionCase):
         self.tx._process_notification_data(data)
         mocked_canceled.assert_called_once()
 
+    def test_get_tx_from_notification_data_by_txnid(self):
+        self.tx.payu_txnid = 'TXNID_001'
+        Transaction = self.env['payment.transaction']
+        self.assertEqual(
+            Transaction._get_tx_from_notification_data('payu', {'txnid': 'TXNID_001', 'udf2': 'other'}), self.tx
+        )
+        # The payments sent before their PayU transaction id was stored are found by reference.
+        self.assertEqual(
+            Transaction._get_tx_from_notification_data('payu', {'txnid': 'old', 'udf2': self.tx.reference}), self.tx
+        )
+        with self.assertRaises(ValidationError):
+            Transaction._get_tx_from_notification_data('payu', {'txnid': 'unknown', 'udf2': 'unknown'})
+
+    @mute_logger('odoo.sql_db')
+    def test_payu_txnid_is_unique(self):
+        self.tx.payu_txnid = 'TXNID_001'
+        other_tx = self.env['payment.transaction'].create({
+            'amount': 100.0,
+            'partner_id': self.partner.id,
+            'provider_id': self.provider.id,
+            'reference': 'TXN_TEST_002',
+            'currency_id': self.env.ref('base.INR').id,
+            'payment_method_id': self.tx.payment_method_id.id,
+        })
+        with self.assertRaises(IntegrityError), self.cr.savepoint():
+            other_tx.payu_txnid = 'TXNID_001'
+            other_tx.flush_recordset()
+
+    @patch('odoo.addons.payment_payu.http_client.get_session')
+    def test_verify_pending_payments(self, mock_get_session):
+        currency = self.env.ref('base.INR')
+        if not self.provider._payu_get_credential(currency):
+            self.env['payu.credential'].create({
+                'provider_id': self.provider.id,
+                'currency_id': currency.id,
+                'merchant_key': 'verify_key',
+                'merchant_salt': 'verify_salt',
+            })
+        txs = self.env['payment.transaction'].create([{
+            'amount': 100.0,
+            'partner_id': self.partner.id,
+            'provider_id': self.provider.id,
+            'reference': f'TXN_VERIFY_{i}',
+            'payu_txnid': f'T{i}' if i < 4 else False,
+            'currency_id': currency.id,
+            'payment_method_id': self.provider.payment_method_ids[:1].id,
+        } for i in range(5)])
+        txs[:2]._set_pending()
+        self.env['ir.config_parameter'].sudo().set_param(
+            'payment_payu.txnid_tracking_date', fields.Datetime.to_string(fields.Datetime.now() - timedelta(days=1))
+        )
+        # The last payment was never sent to PayU, and the fourth one is not old enough to be canceled.
+        self.env.cr.execute(
+            "UPDATE payment_transaction SET create_date = create_date - interval '3 hours' WHERE id IN %s",
+            [tuple((txs - txs[3]).ids)],
+        )
+        self.env.cr.execute(
+            "UPDATE payment_transaction SET create_date = create_date - interval '30 minutes' WHERE id = %s",
+            [txs[3].id],
+        )
+        txs.invalidate_recordset(['create_date'])
+        mock_get_session.return_value.request.return_value.text = json.dumps({
+            'status': 1,
+            'transaction_details': {
+                'T0': {'txnid': 'T0', 'mihpayid': 'P0', 'status': 'success', 'net_amount_debit': '100.00'},
+                'T1': {'txnid': 'T1', 'mihpayid': 'P1', 'status': 'failure', 'error_Message': 'Bank declined'},
+                'T2': {'txnid': 'T2', 'status': 'Not Found'},
+                'T3': {'txnid': 'T3', 'mihpayid': 'P3', 'status': 'pending'},
+            },
+        })
+
+        self.env['payment.transaction']._cron_verify_pending_payments(batch_size=2)
+
+        calls = mock_get_session.return_value.request.call_args_list
+        self.assertEqual([call.kwargs['data']['var1'] for call in calls], ['T0|T1', 'T2|T3'])
+        self.assertEqual(txs.mapped('state'), ['done', 'error', 'cancel', 'draft', 'cancel'])
+        self.assertEqual(txs[0].provider_reference, 'P0')
+        self.assertIn('Bank declined', txs[1].state_message)
+
+    @patch('odoo.addons.payment_payu.http_client.get_session')
+    def test_verify_pending_payments_skips_payments_without_txnid_before_tracking(self, mock_get_session):
+        self.env['ir.config_parameter'].sudo().set_param(
+            'payment_payu.txnid_tracking_date', fields.Datetime.to_string(fields.Datetime.now() - timedelta(hours=1))
+        )
+        self.env.cr.execute(
+            "UPDATE payment_transaction SET create_date = create_date - interval '3 hours' WHERE id = %s",
+            [self.tx.id],
+        )
+        self.tx.invalidate_recordset(['create_date'])
+
+        self.env['payment.transaction']._cron_verify_pending_payments()
+
+        # The payment may have been paid at PayU under a txnid that was not stored.
+        mock_get_session.return_value.request.assert_not_called()
+        self.assertEqual(self.tx.state, 'draft')
+
     def test_update_amount_if_present(self):
         self.tx.amount = 100.0
         self.tx._update_amount_if_present({"net_amount_debit": "120", "additionalCharges": "20"})
@@ -188,32 +354,38 @@ class TestPayUPaymentTransaction(TransactionCase):
             'Authorization': 'auth-header',
         })
 
-    @patch('requests.get')
-    def test_call_payu_api(self, mock_get):
+    @patch('odoo.addons.payment_payu.http_client.get_session')
+    def test_call_payu_api(self, mock_get_session):
         mock_response = MagicMock()
         mock_response.raise_for_status = MagicMock()
-        mock_response.text = '{"result": "ok"}'
-        mock_response.json.return_value = {"result": "ok"}
+        mock_response.text = '{"status": 0, "result": {"size": 0}}'
+        mock_response.json.return_value = {"status": 0, "result": {"size": 0}}
+        mock_get = mock_get_session.return_value.request
         mock_get.return_value = mock_response
 
         result = self.tx._call_payu_api('http://endpoint', {}, {})
-        mock_get.assert_called_once()
-        self.assertEqual(result, {"result": "ok"})
+        mock_get.assert_called_once_with(
+            'GET', 'http://endpoint', params={}, headers={}, timeout=ANY
+        )
+        self.assertEqual(result, {"status": 0, "result": {"size": 0}})
+
+        # An error reply is not mistaken for an empty page.
+        mock_response.json.return_value = {"status": 1, "msg": "Invalid credentials"}
+        with self.assertRaises(ValidationError):
+            self.tx._call_payu_api('http://endpoint', {}, {})
 
         # Test JSON error handling
         mock_response.json.side_effect = ValueError('bad json')
-        result = self.tx._call_payu_api('http://endpoint', {}, {})
-        self.assertEqual(result, {})
+        with self.assertRaises(ValidationError):
+            self.tx._call_payu_api('http://endpoint', {}, {})
 
     def test_process_settlement_data(self):
-        mock_tx = MagicMock()
-        mock_tx.id = 123
-        mock_tx.write = MagicMock()
-
         # Test no data case
         res = self.tx._process_settlement_data({'result': {'size': 0}}, self.credential)
         self.assertFalse(res)
 
+        self.tx.provider_reference = 'TX123'
+        other_tx = self.tx.copy({'reference': 'TXN_TEST_002', 'provider_reference': 'TX456'})
         result_data = {
             'result': {
                 'size': 1,
@@ -225,27 +397,130 @@ class TestPayUPaymentTransaction(TransactionCase):
                         'merchantServiceFee': '5.00',
                         'merchantServiceTax': '2.00',
                         'settlementCurrency': 'INR',
+                    }, {
+                        'payuId': 'TX456',
+                        'merchantNetAmount': '100.00',
+                        'merchantServiceFee': '5.00',
+                        'merchantServiceTax': '2.00',
+                        'settlementCurrency': 'INR',
+                    }, {
+                        'payuId': 'UNKNOWN',
+                        'merchantNetAmount': '10.00',
                     }]
                 }]
             }
         }
 
-        # Patch the search method on payment.transaction model class to return mock_tx
-        with patch('odoo.addons.payment.models.payment_transaction.PaymentTransaction.search', return_value=mock_tx):
+        with patch.object(
+            PaymentTransaction, 'write', autospec=True, side_effect=PaymentTransaction.write
+        ) as mock_write:
             res = self.tx._process_settlement_data(result_data, self.credential)
 
-            # Verify the write was called with expected values
-            mock_tx.write.assert_called_once_with({
-                'settled_amount': 100.0,
-                'total_service_fee': 7.0,
-                'settlement_currency': 'INR',
-                'utr_number': 'UTR123'
-            })
+        self.assertTrue(res)
+        # Both transactions share the same settlement values and are written at once.
+        mock_write.assert_called_once()
+        for tx in self.tx | other_tx:
+            self.assertEqual(tx.settled_amount, 100.0)
+            self.assertEqual(tx.total_service_fee, 7.0)
+            self.assertEqual(tx.settlement_currency, 'INR')
+            self.assertEqual(tx.utr_number, 'UTR123')
+
+    def test_run_settlement_jobs_reports_per_credential(self):
+        def iter_pages(tx, credential, date, first_page=1):
+            if credential.id == 2:
+                raise ValidationError("PayU is down")
+            yield 1
+            yield 2
+
+        with patch.object(PaymentTransaction, '_payu_iter_settlement_pages', iter_pages):
+            results = self.tx._payu_run_settlement_jobs([
+                (1, date(2025, 9, 17), date(2025, 9, 17), False),
+                (2, date(2025, 9, 17), date(2025, 9, 17), False),
+            ])
+
+        self.assertEqual(results[0], {
+            'credential_id': 1, 'date_from': '2025-09-17', 'date_to': '2025-09-17', 'pages': 2,
+            'error': None,
+        })
+        self.assertEqual(results[1]['pages'], 0)
+        self.assertEqual(results[1]['error'], "PayU is down")
+
+    def test_settlement_job_cursor_failure_is_reported(self):
+        with patch.object(self.env.registry, 'cursor', side_effect=Exception("Too many connections")):
+            result = self.tx._payu_run_settlement_job_in_new_cursor(
+                1, date(2025, 9, 17), date(2025, 9, 17), False
+            )
+
+        self.assertEqual(result, {
+            'credential_id': 1, 'date_from': '2025-09-17', 'date_to': '2025-09-17', 'pages': 0,
+            'error': "Too many connections",
+        })
+
+    def test_settlement_job_resumes_from_watermark(self):
+        credential = self.env['payu.credential'].create({
+            'provider_id': self.provider.id,
+            'currency_id': self.env.ref('base.INR').id,
+            'merchant_key': 'test_key',
+            'merchant_salt': 'test_salt',
+            'settlement_sync_date': date(2025, 9, 15),
+            'settlement_sync_page': 3,
+        })
+        calls = []
+
+        def iter_pages(tx, credential, day, first_page=1):
+            calls.append((day, first_page))
+            if day == date(2025, 9, 17):
+                yield first_page
+                raise ValidationError("PayU is down")
+            yield first_page
+
+        with patch.object(PaymentTransaction, '_payu_iter_settlement_pages', iter_pages):
+            result = self.tx._payu_run_settlement_job(
+                credential.id, date(2025, 9, 16), date(2025, 9, 18), True
+            )
+
+        self.assertEqual(calls, [(date(2025, 9, 16), 4), (date(2025, 9, 17), 1)])
+        self.assertEqual(result['pages'], 2)
+        self.assertEqual(result['error'], "PayU is down")
+        self.assertEqual(credential.settlement_sync_date, date(2025, 9, 16))
+        self.assertEqual(credential.settlement_sync_page, 1)
+
+    @patch('odoo.addons.payment_payu.http_client.get_session')
+    def test_settlement_job_keeps_watermark_on_non_json_page(self, mock_get_session):
+        credential = self.env['payu.credential'].create({
+            'provider_id': self.provider.id,
+            'currency_id': self.env.ref('base.INR').id,
+            'merchant_key': 'test_key',
+            'merchant_salt': 'test_salt',
+            'settlement_sync_date': date(2025, 9, 16),
+            'settlement_sync_page': 0,
+        })
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.text = '<html>Under maintenance</html>'
+        mock_response.json.side_effect = ValueError('bad json')
+        mock_get_session.return_value.request.return_value = mock_response
 
-            self.assertTrue(res)
+        result = self.tx._payu_run_settlement_job(credential.id, date(2025, 9, 17), date(2025, 9, 17), True)
 
-    def test_get_settlement_endpoint(self):
-        self.assertEqual(self.tx._get_settlement_endpoint('test'),
-                         'https://settlement-data.free.beeceptor.com/settlement')
-        self.assertEqual(self.tx._get_settlement_endpoint('enabled'),
-                         'https://info.payu.in/settlement/range')
\ No newline at end of file
+        self.assertTrue(result['error'])
+        self.assertEqual(result['pages'], 0)
+        self.assertEqual(credential.settlement_sync_date, date(2025, 9, 16))
+        self.assertEqual(credential.settlement_sync_page, 0)
+
+    def test_backfill_settlements_splits_range_by_day(self):
+        credential = self.env['payu.credential'].create({
+            'provider_id': self.provider.id,
+            'currency_id': self.env.ref('base.INR').id,
+            'merchant_key': 'test_key',
+            'merchant_salt': 'test_salt',
+        })
+        with patch.object(
+            PaymentTransaction, '_payu_run_settlement_jobs', return_value=[]
+        ) as mock_run_jobs:
+            self.tx.action_payu_backfill_settlements(
+                '2025-09-01', '2025-09-03', credential_ids=credential.ids
+            )
+        mock_run_jobs.assert_called_once_with([
+            (credential.id, date(2025, 9, day), date(2025, 9, day), False) for day in (1, 2, 3)
+        ])
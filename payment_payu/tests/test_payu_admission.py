@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from odoo import api
+from odoo.tests.common import TransactionCase
+
+
+class TestPayUAdmission(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.Bucket = self.env['payu.rate.bucket']
+
+    def _set_limits(self, route, **limits):
+        for limit, value in limits.items():
+            self.env['ir.config_parameter'].sudo().set_param(f'payment_payu.admission.{route}.{limit}', value)
+
+    def test_rate_limit_per_source(self):
+        self._set_limits('cancel', concurrency=0, rate=0.01, burst=3)
+
+        self.assertEqual([self.Bucket._admit('cancel', '10.0.0.1') for _i in range(3)], [(None, 0)] * 3)
+        reason, retry_after = self.Bucket._admit('cancel', '10.0.0.1')
+        self.assertEqual(reason, 'rate_limited')
+        self.assertGreater(retry_after, 100)
+
+        # The other sources have their own bucket.
+        self.assertEqual(self.Bucket._admit('cancel', '10.0.0.2'), (None, 0))
+
+    def test_concurrency_slots_are_shared_across_workers(self):
+        limits = {'concurrency': 1, 'rate': 0, 'burst': 0}
+        patcher = patch.object(type(self.Bucket), '_get_route_limits', return_value=limits)
+        self.startPatcher(patcher)
+        self.assertEqual(self.Bucket._admit('webhook', '10.0.0.1'), (None, 0))
+
+        # Another worker finds the only slot taken until the transaction holding it ends.
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, self.env.uid, {})
+            self.assertEqual(env['payu.rate.bucket']._admit('webhook', '10.0.0.1'), ('busy', 1))
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import json
+from unittest.mock import patch
+
+import requests
+
+from odoo.exceptions import UserError, ValidationError
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.payment_payu import journal
+
+
+class TestPayUCallJournal(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.startPatcher(patch.object(journal, '_buffer', []))
+        self.provider = self.env.ref('payment_payu.payment_provider_payu')
+        currency = self.env.ref('base.INR')
+        self.credential = self.provider._payu_get_credential(currency) or self.env['payu.credential'].create({
+            'provider_id': self.provider.id,
+            'currency_id': currency.id,
+            'merchant_key': 'journal_key',
+            'merchant_salt': 'journal_salt',
+        })
+        self.url = self.provider._payu_get_api_url('api', 'merchant/postservice.php')
+        self.data = {'key': self.credential.merchant_key, 'command': 'udf_update', 'var1': '4039', 'hash': 'abc'}
+
+    def _journaled_calls(self):
+        journal.flush(self.env.cr)
+        return self.env['payu.call.journal'].search([('url', '=', self.url)])
+
+    @patch('odoo.addons.payment_payu.http_client.get_session')
+    def test_call_is_journaled_redacted(self, mock_get_session):
+        response = mock_get_session.return_value.request.return_value
+        response.status_code = 200
+        response.text = json.dumps({'status': 1, 'msg': 'Updated', 'email': 'buyer@example.com'})
+
+        self.provider._payu_make_request(self.url, query_params={'form': '2'}, data=self.data, operation='udf_update')
+
+        call = self._journaled_calls()
+        self.assertEqual((call.operation, call.method, call.status_code), ('udf_update', 'POST', 200))
+        self.assertEqual(call.credential_id, self.credential)
+        request_body = json.loads(call.request_text)
+        self.assertEqual(request_body['params'], {'form': '2'})
+        self.assertEqual(request_body['data']['var1'], '4039')
+        self.assertEqual((request_body['data']['key'], request_body['data']['hash']), ('***', '***'))
+        self.assertEqual(json.loads(call.response_text), {'status': 1, 'msg': 'Updated', 'email': '***'})
+        with self.assertRaises(UserError):
+            call.error = "Edited"
+
+    def test_text_bodies_are_journaled_redacted(self):
+        response = requests.Response()
+        response.status_code = 502
+        response._content = b'<html>Bad gateway for buyer@example.com</html>'
+        journal.record(
+            self.env.cr.dbname, 'udf_update', 'POST', self.url,
+            data='key=journal_key&command=udf_update&hash=abc', response=response,
+        )
+
+        call = self._journaled_calls()
+        request_body = json.loads(call.request_text)
+        self.assertEqual(request_body['data'], {'key': '***', 'command': 'udf_update', 'hash': '***'})
+        self.assertEqual(call.response_text, '<46 characters, not redactable>')
+
+    @patch('odoo.addons.payment_payu.http_client.get_session')
+    def test_failed_call_is_journaled(self, mock_get_session):
+        mock_get_session.return_value.request.side_effect = requests.exceptions.ConnectionError("PayU is down")
+        with self.assertRaises(ValidationError):
+            self.provider._payu_make_request(self.url, data=self.data, operation='udf_update')
+
+        call = self._journaled_calls()
+        self.assertEqual(call.error, "ConnectionError: PayU is down")
+        self.assertFalse(call.status_code)
+        self.assertFalse(call.response_text)
+
+    def test_gc_journal_keeps_the_most_recent_calls(self):
+        for _i in range(3):
+            journal.record(self.env.cr.dbname, 'udf_update', 'POST', self.url, data=self.data)
+        self.assertEqual(len(self._journaled_calls()), 3)
+        self.env['ir.config_parameter'].sudo().set_param('payment_payu.journal_max_rows', 2)
+
+        self.env['payu.call.journal']._gc_journal()
+
+        self.assertEqual(len(self._journaled_calls()), 2)
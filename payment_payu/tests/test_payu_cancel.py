@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import HttpCase, tagged
+
+
+@tagged('-at_install', 'post_install')
+class TestPayUCancelRoute(HttpCase):
+
+    def setUp(self):
+        super().setUp()
+        provider = self.env.ref('payment_payu.payment_provider_payu')
+        partner = self.env['res.partner'].create({'name': 'Cancel Buyer', 'email': 'buyer@example.com'})
+        self.txs = self.env['payment.transaction'].create([{
+            'amount': 100.0,
+            'partner_id': partner.id,
+            'provider_id': provider.id,
+            'reference': f'TXN_CANCEL_00{i}',
+            'payu_txnid': f'cancel-txnid-{i}',
+            'currency_id': self.env.ref('base.INR').id,
+            'payment_method_id': provider.payment_method_ids[:1].id,
+        } for i in range(2)])
+
+    def test_cancel_selects_the_transaction_by_reference_only(self):
+        other_tx, tx = self.txs
+        self.url_open(f'/payment/payu/cancel?txn_ref={tx.reference}&txnid={other_tx.payu_txnid}')
+        self.env.invalidate_all()
+
+        self.assertEqual(tx.state, 'cancel')
+        self.assertEqual(other_tx.state, 'draft')
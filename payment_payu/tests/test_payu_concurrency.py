@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from unittest.mock import patch
+
+from odoo import SUPERUSER_ID, api, modules
+from odoo.modules.registry import Registry
+from odoo.tests.common import BaseCase, get_db_name, tagged
+
+from odoo.addons.payment_payu import signer
+from odoo.addons.payment_payu.models.payment_transaction import PaymentTransaction
+
+
+@tagged('-standard', '-at_install', 'post_install', 'payu_concurrency')
+class TestPayUConcurrentNotifications(BaseCase):
+    """ Deliver the redirect and the webhook of a payment at the same time on two workers.
+
+    The deliveries need their own committed transactions to run concurrently; the test data is
+    therefore committed and deleted at the end of each test. Run with `--test-tags payu_concurrency`.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.registry = Registry(get_db_name())
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            provider = env.ref('payment_payu.payment_provider_payu')
+            currency = env.ref('base.INR')
+            credential = provider._payu_get_credential(currency)
+            if not credential:
+                credential = env['payu.credential'].create({
+                    'provider_id': provider.id,
+                    'currency_id': currency.id,
+                    'merchant_key': 'concurrency_key',
+                    'merchant_salt': 'concurrency_salt',
+                })
+                self.addCleanup(self._unlink, 'payu.credential', credential.ids)
+            partner = env['res.partner'].create({'name': 'Concurrent Buyer', 'email': 'buyer@example.com'})
+            self.addCleanup(self._unlink, 'res.partner', partner.ids)
+            tx = env['payment.transaction'].create({
+                'amount': 100.0,
+                'partner_id': partner.id,
+                'provider_id': provider.id,
+                'reference': f'PAYU-CONCURRENCY-{time.time_ns()}',
+                'currency_id': currency.id,
+                'payment_method_id': provider.payment_method_ids[:1].id,
+            })
+            self.addCleanup(self._unlink, 'payment.transaction', tx.ids)
+            self.tx_id = tx.id
+            self.data = {
+                'mihpayid': '403993715521',
+                'status': 'success',
+                'txnid': 'concurrency-txnid',
+                'amount': '100.00',
+                'udf2': tx.reference,
+                'key': credential.merchant_key,
+            }
+            self.data['hash'] = signer.get_signer('PAYMENT_REVERSE_HASH_PARAMS').sign(
+                self.data, credential.merchant_salt
+            )
+
+    def _unlink(self, model_name, record_ids):
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            if model_name == 'payment.transaction':
+                cr.execute("DELETE FROM payment_transaction WHERE id IN %s", [tuple(record_ids)])
+            else:
+                env[model_name].browse(record_ids).unlink()
+
+    def _deliver_redirect(self, barrier):
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            tx_sudo = env['payment.transaction']._get_tx_from_notification_data('payu', self.data)
+            barrier.wait()
+            tx_sudo._handle_notification_data('payu', self.data)
+
+    def _deliver_webhook(self, barrier):
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            notification = env['payu.notification'].create({'payload': self.data})
+            self.addCleanup(self._unlink, 'payu.notification', notification.ids)
+            self.notification_id = notification.id
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            barrier.wait()
+            # Let the redirect take the lock first: the queue worker waits for it, then finds
+            # the transaction updated after its snapshot.
+            time.sleep(0.2)
+            env['payu.notification']._cron_process_notifications()
+
+    def _run_queue_worker(self):
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env['payu.notification']._cron_process_notifications()
+
+    def test_redirect_wins_and_webhook_is_retried_without_attempt(self):
+        handled = []
+        original_handle_success = PaymentTransaction._handle_success_status
+
+        def slow_handle_success(tx, data):
+            handled.append(tx.id)
+            time.sleep(0.5)  # Hold the row lock while the other delivery arrives.
+            return original_handle_success(tx, data)
+
+        barrier = threading.Barrier(2, timeout=10)
+        errors = []
+
+        def run(target):
+            try:
+                target(barrier)
+            except Exception as e:
+                errors.append(e)
+
+        with patch.object(PaymentTransaction, '_handle_success_status', slow_handle_success):
+            threads = [
+                threading.Thread(target=run, args=(self._deliver_redirect,)),
+                threading.Thread(target=run, args=(self._deliver_webhook,)),
+            ]
+            start = time.monotonic()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=30)
+            elapsed = time.monotonic() - start
+
+        self.assertFalse(errors)
+        self.assertEqual(handled, [self.tx_id])
+        # The queue worker gave up on the serialization failure instead of retrying in place.
+        self.assertLess(elapsed, 5)
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            self.assertEqual(env['payment.transaction'].browse(self.tx_id).state, 'done')
+            notification = env['payu.notification'].browse(self.notification_id)
+            # The serialization failure of the queue worker is not counted as an attempt.
+            self.assertEqual((notification.state, notification.attempts), ('pending', 0))
+
+        self._run_queue_worker()
+
+        self.assertEqual(handled, [self.tx_id])
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            notification = env['payu.notification'].browse(self.notification_id)
+            self.assertEqual((notification.state, notification.attempts), ('done', 1))
+
+
+@tagged('-standard', '-at_install', 'post_install', 'payu_concurrency')
+class TestPayUConcurrentRateBuckets(BaseCase):
+    """ Take tokens from the same rate bucket on several workers at the same time. """
+
+    def setUp(self):
+        super().setUp()
+        self.registry = Registry(get_db_name())
+        self.key = f'cancel:concurrency-{time.time_ns()}'
+        self.addCleanup(self._delete_bucket)
+        # Take the tokens in their own committed transactions, as outside of the tests.
+        self.startPatcher(patch.object(modules.module, 'current_test', None))
+
+    def _delete_bucket(self):
+        with self.registry.cursor() as cr:
+            cr.execute("DELETE FROM payu_rate_bucket WHERE key = %s", [self.key])
+
+    def test_concurrent_takes_on_the_same_bucket(self):
+        barrier = threading.Barrier(4, timeout=10)
+        results, errors = [], []
+
+        def take_tokens():
+            try:
+                barrier.wait()
+                for _i in range(10):
+                    with self.registry.cursor() as cr:
+                        env = api.Environment(cr, SUPERUSER_ID, {})
+                        results.append(env['payu.rate.bucket']._take_token(self.key, 0.001, 100))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=take_tokens) for _i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+
+        self.assertFalse(errors)
+        self.assertEqual(results, [0] * 40)
+        with self.registry.cursor() as cr:
+            cr.execute("SELECT tokens FROM payu_rate_bucket WHERE key = %s", [self.key])
+            self.assertAlmostEqual(cr.fetchone()[0], 60, delta=0.1)
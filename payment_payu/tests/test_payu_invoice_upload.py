@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import io
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.payment_payu import const, http_client
+from odoo.addons.payment_payu.models.payment_transaction import PaymentTransaction
+
+
+class TestPayUInvoiceUpload(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.partner = self.env['res.partner'].create({
+            'name': 'Test User',
+            'email': 'test@example.com',
+            'phone': '9999999999',
+        })
+        self.provider = self.env.ref('payment_payu.payment_provider_payu')
+        self.sale_order = self.env['sale.order'].create({'partner_id': self.partner.id})
+        self.tx = self.env['payment.transaction'].create({
+            'amount': 100.0,
+            'partner_id': self.partner.id,
+            'provider_id': self.provider.id,
+            'reference': 'TXN_UPLOAD_001',
+            'currency_id': self.env.ref('base.INR').id,
+            'payment_method_id': self.provider.payment_method_ids[:1].id,
+        })
+        self.data = {'mihpayid': '403993715521', 'txnid': 'txn-001', 'udf1': str(self.sale_order.id)}
+        self.job = self.env['payu.invoice.upload']._enqueue(self.tx, self.sale_order, self.data)
+
+    def test_enqueue_once_per_order(self):
+        job = self.env['payu.invoice.upload']._enqueue(self.tx, self.sale_order, self.data)
+        self.assertEqual(job, self.job)
+        self.assertEqual(self.sale_order.payu_invoice_upload_state, 'pending')
+
+    @patch.object(PaymentTransaction, 'upload_invoice', return_value=True)
+    @patch.object(PaymentTransaction, 'update_udf_invoice_id', return_value=True)
+    def test_process_upload(self, mock_update, mock_upload):
+        self.env['payu.invoice.upload']._cron_process_uploads()
+        mock_update.assert_called_once()
+        mock_upload.assert_called_once()
+        self.assertEqual(self.job.state, 'done')
+        self.assertEqual(self.sale_order.payu_invoice_upload_state, 'done')
+
+    @patch.object(PaymentTransaction, 'upload_invoice', return_value=False)
+    @patch.object(PaymentTransaction, 'update_udf_invoice_id', return_value=True)
+    def test_process_upload_retries_with_backoff(self, mock_update, mock_upload):
+        self.job._process()
+        self.assertEqual(self.job.state, 'pending')
+        self.assertEqual(self.job.attempts, 1)
+        self.assertTrue(self.job.invoice_id_updated)
+        self.assertGreater(self.job.next_attempt_date, fields.Datetime.now())
+
+        # The invoice ID update is not repeated on retries.
+        self.job.attempts = const.INVOICE_UPLOAD_MAX_ATTEMPTS - 1
+        self.job._process()
+        mock_update.assert_called_once()
+        self.assertEqual(self.job.state, 'failed')
+
+    @patch.object(PaymentTransaction, 'upload_invoice', return_value=True)
+    @patch.object(PaymentTransaction, 'update_udf_invoice_id', return_value=True)
+    def test_process_upload_waits_for_render_slot(self, mock_update, mock_upload):
+        self.env['ir.config_parameter'].sudo().set_param('payment_payu.invoice_render_concurrency', 1)
+        with patch('odoo.addons.payment_payu.utils.try_acquire_slot', return_value=False):
+            self.job._process()
+        mock_upload.assert_not_called()
+        self.assertEqual(self.job.state, 'pending')
+        self.assertEqual(self.job.attempts, 0)
+
+    def test_invoice_attachment_reused_until_order_changes(self):
+        Report = type(self.env['ir.actions.report'])
+        with patch.object(Report, '_render_qweb_pdf', return_value=(b'%PDF-1.4 v1', 'pdf')) as mock_render:
+            attachment = self.tx._payu_get_invoice_attachment(self.sale_order)
+            self.assertEqual(self.tx._payu_get_invoice_attachment(self.sale_order), attachment)
+            mock_render.assert_called_once()
+
+            # Writes share the timestamp of the test transaction: move the write date by hand.
+            self.env.cr.execute(
+                "UPDATE sale_order SET write_date = write_date + interval '1 second' WHERE id = %s",
+                [self.sale_order.id],
+            )
+            self.sale_order.invalidate_recordset(['write_date'])
+            mock_render.return_value = (b'%PDF-1.4 v2', 'pdf')
+            new_attachment = self.tx._payu_get_invoice_attachment(self.sale_order)
+
+        self.assertEqual(mock_render.call_count, 2)
+        self.assertFalse(attachment.exists())
+        with self.tx._payu_open_attachment(new_attachment) as pdf_file:
+            self.assertEqual(pdf_file.read(), b'%PDF-1.4 v2')
+
+    def test_multipart_file_stream(self):
+        pdf = b'%PDF-1.4 content'
+        body = http_client.MultipartFileStream(
+            {'key': 'k', 'var1': None}, 'file', 'S001.pdf', io.BytesIO(pdf), len(pdf), 'application/pdf'
+        )
+        content = b''.join(iter(lambda: body.read(7), b''))
+        self.assertEqual(len(content), body.len)
+        self.assertIn(b'name="key"\r\n\r\nk\r\n', content)
+        self.assertNotIn(b'var1', content)
+        self.assertIn(b'filename="S001.pdf"', content)
+        self.assertIn(pdf, content)
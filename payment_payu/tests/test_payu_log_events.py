@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import logging
+from unittest.mock import patch
+
+from odoo.tests.common import BaseCase
+
+from odoo.addons.payment_payu import log_events
+
+
+class TestPayULogEvents(BaseCase):
+
+    def test_redact_masks_sensitive_keys(self):
+        payload = {
+            'mihpayid': '403993715521',
+            'hash': 'abc',
+            'key': '',
+            'sku_details': [{'email': 'buyer@example.com', 'sku_id': 'SKU'}],
+        }
+        self.assertEqual(log_events.redact(payload), {
+            'mihpayid': '403993715521',
+            'hash': log_events.REDACTED,
+            'key': '',
+            'sku_details': [{'email': log_events.REDACTED, 'sku_id': 'SKU'}],
+        })
+
+    def test_payload_is_not_serialized_when_the_event_is_disabled(self):
+        logger = log_events.get_event_logger('settlement.response')
+        self.addCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.INFO)
+        with patch.object(log_events.LazyPayload, '__init__', return_value=None) as mock_init:
+            log_events.log_event('settlement.response', "PayU: settlement response: %s", {'size': 1})
+        mock_init.assert_not_called()
+
+    def test_payload_is_redacted_and_truncated_when_emitted(self):
+        payload = {'hash': 'secret', 'data': 'x' * 5000}
+        with self.assertLogs(log_events.get_event_logger('refund.response'), level='INFO') as logs:
+            log_events.log_event('refund.response', "PayU: refund %s response: %s", 'R1', payload)
+        [message] = logs.output
+        self.assertNotIn('secret', message)
+        self.assertIn('characters)', message)
+
+    def test_sampled_event_is_skipped(self):
+        logger = log_events.get_event_logger('settlement.page')
+        with patch.object(log_events.random, 'random', return_value=0.99):
+            with self.assertNoLogs(logger, level='INFO'):
+                log_events.log_event('settlement.page', "PayU: updated %d records.", 1)
+        with patch.object(log_events.random, 'random', return_value=0.0):
+            with self.assertLogs(logger, level='INFO'):
+                log_events.log_event('settlement.page', "PayU: updated %d records.", 1)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from odoo.tests import HttpCase, tagged
+from odoo.tests.common import BaseCase
+
+from odoo.addons.payment_payu import metrics
+
+
+class TestPayUMetrics(BaseCase):
+
+    def setUp(self):
+        super().setUp()
+        snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, snapshot_dir, ignore_errors=True)
+        patchers = [
+            patch.object(metrics, '_get_snapshot_dir', return_value=snapshot_dir),
+            patch.dict(metrics._counters, clear=True),
+            patch.dict(metrics._histograms, clear=True),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.snapshot_dir = snapshot_dir
+
+    def test_track_records_duration_and_error_type(self):
+        with self.assertRaises(ValueError):
+            with metrics.track('payu_route_duration_seconds', 'payu_route_errors_total', route='webhook'):
+                raise ValueError()
+        text = metrics.render()
+        self.assertIn('payu_route_errors_total{error="ValueError",route="webhook"} 1', text)
+        self.assertIn('payu_route_duration_seconds_count{outcome="error",route="webhook"} 1', text)
+        self.assertIn('payu_route_duration_seconds_bucket{outcome="error",route="webhook",le="+Inf"} 1', text)
+
+    def test_render_merges_the_snapshots_of_other_workers(self):
+        metrics.inc('payu_settlement_rows_total', 3, matched='true')
+        with open(os.path.join(self.snapshot_dir, '1.json'), 'w', encoding='utf-8') as snapshot_file:
+            json.dump(metrics._snapshot(), snapshot_file)
+        self.assertIn('payu_settlement_rows_total{matched="true"} 6', metrics.render())
+
+    def test_unknown_metric_is_rejected(self):
+        with self.assertRaises(KeyError):
+            metrics.inc('payu_unknown_total')
+
+
+@tagged('-at_install', 'post_install')
+class TestPayUMetricsRoute(HttpCase):
+
+    def test_metrics_route_requires_the_token(self):
+        self.assertEqual(self.url_open('/payment/payu/metrics').status_code, 403)
+        self.env['ir.config_parameter'].sudo().set_param('payment_payu.metrics_token', 'scrape-token')
+        response = self.url_open('/payment/payu/metrics', headers={'Authorization': 'Bearer wrong'})
+        self.assertEqual(response.status_code, 403)
+
+        response = self.url_open('/payment/payu/metrics', headers={'Authorization': 'Bearer scrape-token'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE payu_request_duration_seconds histogram', response.text)
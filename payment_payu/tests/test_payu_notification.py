@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from odoo import Command
+from odoo.tests.common import TransactionCase
+from odoo.exceptions import ValidationError
+
+from odoo.addons.payment_payu import const, signer
+from odoo.addons.payment_payu.models.payment_transaction import PaymentTransaction
+
+
+class TestPayUNotification(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.payload = {'mihpayid': '403993715521', 'status': 'success', 'udf2': 'TXN_TEST_001'}
+
+    def test_enqueue_triggers_queue_worker(self):
+        with patch.object(type(self.env['ir.cron']), '_trigger') as mock_trigger:
+            notification = self.env['payu.notification']._enqueue(self.payload)
+        mock_trigger.assert_called_once()
+        self.assertEqual(notification.state, 'pending')
+        self.assertEqual(notification.payload, self.payload)
+
+    @patch.object(PaymentTransaction, '_handle_notification_data')
+    @patch.object(PaymentTransaction, '_get_tx_from_notification_data')
+    def test_process_notifications(self, mock_get_tx, mock_handle):
+        mock_get_tx.return_value = self.env['payment.transaction']
+        notification = self.env['payu.notification'].create({'payload': self.payload})
+
+        self.env['payu.notification']._cron_process_notifications()
+
+        mock_get_tx.assert_called_once_with('payu', self.payload)
+        self.assertEqual(notification.state, 'done')
+        self.assertEqual(notification.attempts, 1)
+
+    @patch.object(PaymentTransaction, '_get_tx_from_notification_data')
+    def test_process_notifications_retries_then_fails(self, mock_get_tx):
+        mock_get_tx.side_effect = ValidationError("No transaction found")
+        notification = self.env['payu.notification'].create({'payload': self.payload})
+
+        self.env['payu.notification']._cron_process_notifications()
+        self.assertEqual(notification.state, 'pending')
+        self.assertEqual(notification.last_error, "No transaction found")
+
+        notification.attempts = const.NOTIFICATION_MAX_ATTEMPTS - 1
+        self.env['payu.notification']._cron_process_notifications()
+        self.assertEqual(notification.state, 'error')
+
+    @patch.object(PaymentTransaction, 'generate_sales_order_pdf_and_post_to_payu')
+    @patch.object(PaymentTransaction, '_payu_verify_return_sign')
+    def test_process_notification_with_discount_outside_request(self, _mock_verify, _mock_post):
+        provider = self.env.ref('payment_payu.payment_provider_payu')
+        partner = self.env['res.partner'].create({'name': 'Queue Buyer', 'email': 'buyer@example.com'})
+        product = self.env['product.product'].create({'name': 'Test Product', 'list_price': 500.0})
+        sale_order = self.env['sale.order'].create({
+            'partner_id': partner.id,
+            'order_line': [Command.create({'product_id': product.id, 'price_unit': 500.0, 'tax_id': False})],
+        })
+        tx = self.env['payment.transaction'].create({
+            'amount': 450.0,
+            'partner_id': partner.id,
+            'provider_id': provider.id,
+            'reference': 'TXN_QUEUE_DISCOUNT',
+            'currency_id': self.env.ref('base.INR').id,
+            'payment_method_id': provider.payment_method_ids[:1].id,
+        })
+        payload = {
+            **self.payload,
+            'udf1': str(sale_order.id),
+            'udf2': tx.reference,
+            'udf3': 'website',
+            'discount': '50.00',
+        }
+        notification = self.env['payu.notification'].create({'payload': payload})
+
+        # The queue worker runs in a cron, without any HTTP request bound.
+        self.env['payu.notification']._cron_process_notifications()
+
+        self.assertEqual((notification.state, notification.last_error), ('done', False))
+        self.assertEqual(tx.state, 'done')
+        discount_line = sale_order.order_line.filtered(
+            lambda line: line.product_id == tx._payu_get_discount_product()
+        )
+        self.assertEqual(discount_line.price_unit, -50.0)
+
+    def test_check_notification_hash(self):
+        provider = self.env.ref('payment_payu.payment_provider_payu')
+        self.env['payu.credential'].create({
+            'provider_id': provider.id,
+            'currency_id': self.env.ref('base.USD').id,
+            'merchant_key': 'notification_key',
+            'merchant_salt': 'notification_salt',
+        })
+        Credential = self.env['payu.credential']
+        data = {**self.payload, 'key': 'notification_key', 'txnid': 'txn-001', 'amount': '100.00'}
+        data['hash'] = signer.get_signer('PAYMENT_REVERSE_HASH_PARAMS').sign(data, 'notification_salt')
+
+        self.assertTrue(Credential._check_notification_hash(data))
+        self.assertTrue(Credential._check_notification_hash({**data, 'hash': data['hash'].upper()}))
+        self.assertFalse(Credential._check_notification_hash({**data, 'amount': '1.00'}))
+        self.assertFalse(Credential._check_notification_hash({**data, 'key': 'unknown_key'}))
+        self.assertFalse(Credential._check_notification_hash({**data, 'hash': ''}))
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+import json
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.exceptions import UserError
+from odoo.tests.common import BaseCase, TransactionCase
+
+from odoo.addons.payment_payu import const, utils
+
+
+class TestPayURefundBatch(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.provider = self.env.ref('payment_payu.payment_provider_payu')
+        self.provider.state = 'test'
+        currency = self.env.ref('base.INR')
+        if not self.provider._payu_get_credential(currency):
+            self.env['payu.credential'].create({
+                'provider_id': self.provider.id,
+                'currency_id': currency.id,
+                'merchant_key': 'refund_key',
+                'merchant_salt': 'refund_salt',
+            })
+        partner = self.env['res.partner'].create({'name': 'Refund Buyer', 'email': 'buyer@example.com'})
+        self.txs = self.env['payment.transaction'].create([{
+            'amount': 100.0,
+            'partner_id': partner.id,
+            'provider_id': self.provider.id,
+            'reference': f'TXN_BULK_REFUND_{i}',
+            'provider_reference': f'40399371552{i}',
+            'currency_id': currency.id,
+            'payment_method_id': self.provider.payment_method_ids[:1].id,
+            'state': 'done',
+        } for i in range(3)])
+
+    def _mock_refund_responses(self, mock_get_session, responses):
+        def request(method, url, **kwargs):
+            response = mock_get_session.return_value.request.return_value
+            response.text = json.dumps(responses[kwargs['data']['var1']])
+            return response
+        mock_get_session.return_value.request.side_effect = request
+
+    def test_create_rejects_amount_above_refundable(self):
+        with self.assertRaises(UserError):
+            self.env['payu.refund.batch']._create_from_transactions(self.txs, {self.txs[0].id: 150.0})
+
+    def test_pending_lines_are_reserved(self):
+        self.env['payu.refund.batch']._create_from_transactions(self.txs[:1])
+        self.assertEqual(self.txs[0]._payu_get_refundable_amount(), 0.0)
+        with self.assertRaises(UserError):
+            self.env['payu.refund.batch']._create_from_transactions(self.txs[:1])
+
+    @patch('odoo.addons.payment_payu.http_client.get_session')
+    def test_process_batch_rechecks_the_refundable_amount(self, mock_get_session):
+        batch = self.env['payu.refund.batch']._create_from_transactions(self.txs[:1])
+        # The payment is refunded by other means before the job runs.
+        self.txs[0]._payu_create_refund_transaction(30.0)
+
+        self.env['payu.refund.batch']._cron_process_batches()
+
+        mock_get_session.return_value.request.assert_not_called()
+        self.assertEqual(batch.line_ids.state, 'error')
+        self.assertFalse(batch.line_ids.refund_transaction_id)
+
+    @patch('odoo.addons.payment_payu.http_client.get_session')
+    def test_process_batch_records_each_outcome(self, mock_get_session):
+        accepted = {'status': 1, 'error_code': 102, 'msg': 'Refund Request Queued', 'mihpayid': 'R1'}
+        self._mock_refund_responses(mock_get_session, {
+            self.txs[0].provider_reference: accepted,
+            self.txs[1].provider_reference: dict(accepted, mihpayid='R2'),
+            self.txs[2].provider_reference: {'status': 0, 'msg': 'Invalid amount', 'mihpayid': 'R3'},
+        })
+        batch = self.env['payu.refund.batch']._create_from_transactions(self.txs, {self.txs[0].id: 40.0})
+        self.assertEqual(batch.state, 'pending')
+
+        self.env['payu.refund.batch']._cron_process_batches(chunk_size=2)
+
+        self.assertEqual(mock_get_session.return_value.request.call_count, 3)
+        self.assertEqual(batch.line_ids.mapped('state'), ['done', 'done', 'error'])
+        self.assertEqual(batch.state, 'done')
+        self.assertEqual((batch.done_count, batch.error_count, batch.progress), (2, 1, 100))
+        self.assertEqual(batch.line_ids[0].refund_transaction_id.amount, -40.0)
+        self.assertEqual(batch.line_ids[2].refund_transaction_id.state, 'error')
+        self.assertEqual(self.txs[0]._payu_get_refundable_amount(), 60.0)
+        self.assertEqual(self.txs[2]._payu_get_refundable_amount(), 100.0)
+
+    @patch('odoo.addons.payment_payu.http_client.get_session')
+    def test_process_batch_records_http_failure(self, mock_get_session):
+        mock_get_session.return_value.request.side_effect = ConnectionError("PayU is down")
+        batch = self.env['payu.refund.batch']._create_from_transactions(self.txs[:1])
+
+        self.env['payu.refund.batch']._cron_process_batches()
+
+        self.assertEqual(batch.line_ids.state, 'error')
+        self.assertIn("PayU is down", batch.line_ids.message)
+
+    @patch('odoo.addons.payment_payu.http_client.get_session')
+    def test_stale_sending_line_is_failed_not_resent(self, mock_get_session):
+        batch = self.env['payu.refund.batch']._create_from_transactions(self.txs[:2])
+        stale_line, recent_line = batch.line_ids
+        refund_tx = self.txs[0]._payu_create_refund_transaction(100.0)
+        stale_line.write({'state': 'sending', 'refund_transaction_id': refund_tx.id})
+        recent_line.write({'state': 'sending'})
+        self.env.flush_all()
+        self.env.cr.execute(
+            "UPDATE payu_refund_batch_line SET write_date = %s WHERE id = %s",
+            [fields.Datetime.now() - timedelta(minutes=const.REFUND_SENDING_TIMEOUT + 1), stale_line.id],
+        )
+        self.env.invalidate_all()
+
+        self.env['payu.refund.batch']._cron_process_batches()
+
+        mock_get_session.return_value.request.assert_not_called()
+        self.assertEqual(stale_line.state, 'error')
+        self.assertIn("PayU dashboard", stale_line.message)
+        # A line of a job that may still be running is left alone.
+        self.assertEqual(recent_line.state, 'sending')
+        # The refund may have reached PayU: its amount stays reserved.
+        self.assertEqual(self.txs[0]._payu_get_refundable_amount(), 0.0)
+
+    def test_incomplete_refund_response_fails_the_refund(self):
+        refund_tx = self.txs[0]._payu_create_refund_transaction(10.0)
+        refund_tx._payu_apply_refund_response({'status': 0})
+        self.assertEqual(refund_tx.state, 'error')
+        self.assertIn('Unknown error', refund_tx.state_message)
+
+        refund_tx = self.txs[1]._payu_create_refund_transaction(10.0)
+        refund_tx._payu_apply_refund_response(None)
+        self.assertEqual(refund_tx.state, 'error')
+
+    def test_unconfirmed_refund_is_left_pending(self):
+        refund_tx = self.txs[0]._payu_create_refund_transaction(10.0)
+        refund_tx._payu_apply_refund_response({
+            'status': 1, 'error_code': 103, 'msg': 'Refund in progress', 'request_id': 130001, 'mihpayid': 'R1',
+        })
+        self.assertEqual(refund_tx.state, 'pending')
+        self.assertEqual(refund_tx.payu_refund_request_id, '130001')
+
+    def test_accepted_refund_without_request_id_fails(self):
+        refund_tx = self.txs[0]._payu_create_refund_transaction(10.0)
+        refund_tx._payu_apply_refund_response({'status': 1, 'error_code': 103, 'msg': 'Refund in progress'})
+        # Without a request id, the refund status cron could never settle the refund.
+        self.assertEqual(refund_tx.state, 'error')
+
+    @patch('odoo.addons.payment_payu.http_client.get_session')
+    def test_queued_refund_line_follows_its_reconciliation(self, mock_get_session):
+        self._mock_refund_responses(mock_get_session, {self.txs[0].provider_reference: {
+            'status': 1, 'error_code': 103, 'msg': 'Refund in progress', 'request_id': 130009, 'mihpayid': 'R1',
+        }})
+        batch = self.env['payu.refund.batch']._create_from_transactions(self.txs[:1])
+        self.env['payu.refund.batch']._cron_process_batches()
+        self.assertEqual(batch.line_ids.state, 'queued')
+        self.assertEqual(batch.state, 'running')
+
+        mock_get_session.return_value.request.side_effect = None
+        mock_get_session.return_value.request.return_value.text = json.dumps({
+            'status': 1, 'transaction_details': {'130009': {'130009': {'status': 'success'}}},
+        })
+        self.env['payment.transaction']._cron_reconcile_refunds()
+
+        self.assertEqual(batch.line_ids.state, 'done')
+        self.assertEqual(batch.state, 'done')
+
+    @patch('odoo.addons.payment_payu.http_client.get_session')
+    def test_reconcile_refunds_in_batches(self, mock_get_session):
+        refund_txs = self.env['payment.transaction']
+        for i, tx in enumerate(self.txs):
+            refund_tx = tx._payu_create_refund_transaction(10.0)
+            refund_tx.payu_refund_request_id = f'13000{i}'
+            refund_tx._set_pending()
+            refund_txs |= refund_tx
+        responses = [{'status': 1, 'transaction_details': {
+            '130000': {'130000': {'status': 'success', 'bank_ref_num': 'BANK1'}},
+            '130001': {'130001': {'status': 'failure', 'msg': 'Refund rejected by bank'}},
+        }}, {'status': 1, 'transaction_details': {
+            '130002': {'130002': {'status': 'queued'}},
+        }}]
+
+        def request(method, url, **kwargs):
+            response = mock_get_session.return_value.request.return_value
+            response.text = json.dumps(responses.pop(0))
+            return response
+        mock_get_session.return_value.request.side_effect = request
+
+        self.env['payment.transaction']._cron_reconcile_refunds(batch_size=2)
+
+        calls = mock_get_session.return_value.request.call_args_list
+        self.assertEqual([call.kwargs['data']['var1'] for call in calls], ['130000|130001', '130002'])
+        self.assertEqual(refund_txs.mapped('state'), ['done', 'error', 'pending'])
+        self.assertEqual(refund_txs[0].refund_bank_reference, 'BANK1')
+        self.assertIn('Refund rejected by bank', refund_txs[1].state_message)
+
+
+class TestPayURateLimiter(BaseCase):
+
+    def test_rate_limiter_waits_once_the_burst_is_spent(self):
+        limiter = utils.RateLimiter(2)
+        with patch.object(utils.time, 'sleep') as mock_sleep:
+            limiter.acquire()
+            limiter.acquire()
+            mock_sleep.assert_not_called()
+            with patch.object(utils.time, 'monotonic', side_effect=[limiter._updated_at, limiter._updated_at + 1]):
+                limiter.acquire()
+        mock_sleep.assert_called_once()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import HttpCase, tagged
+
+
+@tagged('-at_install', 'post_install')
+class TestPayUStatusRoute(HttpCase):
+
+    def setUp(self):
+        super().setUp()
+        provider = self.env.ref('payment_payu.payment_provider_payu')
+        partner = self.env['res.partner'].create({'name': 'Status Buyer', 'email': 'buyer@example.com'})
+        self.tx = self.env['payment.transaction'].create({
+            'amount': 100.0,
+            'partner_id': partner.id,
+            'provider_id': provider.id,
+            'reference': 'TXN_STATUS_001',
+            'currency_id': self.env.ref('base.INR').id,
+            'payment_method_id': provider.payment_method_ids[:1].id,
+        })
+        self.url = f'/payment/payu/status/{self.tx.reference}'
+
+    def test_status_requires_the_access_token(self):
+        self.assertEqual(self.url_open(self.url).status_code, 404)
+        self.assertEqual(self.url_open(f'{self.url}?access_token=wrong').status_code, 404)
+
+    def test_status_is_revalidated_with_its_etag(self):
+        url = self.tx._get_specific_processing_values({})['payu_status_url']
+        self.assertEqual(url, f'{self.url}?access_token={self.tx._payu_get_status_access_token()}')
+        response = self.url_open(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'reference': 'TXN_STATUS_001', 'state': 'draft', 'amount': 100.0, 'currency': 'INR',
+        })
+        etag = response.headers['ETag']
+
+        response = self.url_open(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        self.tx._set_pending()
+        response = self.url_open(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['state'], 'pending')
+        self.assertNotEqual(response.headers['ETag'], etag)
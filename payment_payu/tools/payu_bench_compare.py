@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+""" Compare two result files of the PayU benchmarks, e.g. of two commits.
+
+The files are the JSON lines written by the `payu_bench` tests when `PAYU_BENCH_OUTPUT` is set:
+
+    python payment_payu/tools/payu_bench_compare.py before.jsonl after.jsonl
+"""
+import argparse
+import json
+
+# The record keys identifying a benchmark case rather than measuring it.
+CASE_KEYS = ('benchmark', 'spec', 'payload', 'lines', 'transactions')
+
+
+def load(path):
+    """ Return the last record of each benchmark case of a result file, by case. """
+    records = {}
+    with open(path, encoding='utf-8') as result_file:
+        for line in result_file:
+            if line.strip():
+                record = json.loads(line)
+                case = tuple((key, record[key]) for key in CASE_KEYS if key in record)
+                records[case] = record
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    args = parser.parse_args(argv)
+
+    before, after = load(args.before), load(args.after)
+    for case in sorted(before.keys() & after.keys(), key=str):
+        print(' '.join(f'{key}={value}' for key, value in case))
+        for metric, old in before[case].items():
+            new = after[case].get(metric)
+            if metric in CASE_KEYS or not isinstance(old, (int, float)) or not isinstance(new, (int, float)):
+                continue
+            change = f'{(new - old) / old:+.1%}' if old else 'n/a'
+            print(f'    {metric:<16} {old:>12.3f} -> {new:>12.3f}  ({change})')
+
+
+if __name__ == '__main__':
+    main()
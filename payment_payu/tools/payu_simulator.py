@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+""" Local simulator of the PayU endpoints used by the `payment_payu` module.
+
+The simulator only depends on the standard library so that it can run on a laptop or a CI box
+without Odoo or network access. Point a provider to it by setting its PayU Base URL Override to
+the simulator URL, e.g.:
+
+    python payment_payu/tools/payu_simulator.py --port 8070 --merchant KEY:SALT \
+        --webhook-url http://localhost:8069/payment/payu/webhook --latency 0.2 --error-rate 0.05
+
+Implemented endpoints:
+
+- `POST /_payment`: hosted checkout; answers with a form auto-submitted to `surl`/`furl` and
+  signed with a valid reverse hash, and optionally delivers the same data to the webhook.
+- `POST /merchant/postservice.php`: the `cancel_refund_transaction`, `check_action_status`,
+  `udf_update`, `opgsp_upload_invoice_awb` and `verify_payment` commands.
+- `GET /settlement/range`: paginated settlements of the payments made on the simulator, padded
+  with generated ones up to `--settlement-pages` pages.
+"""
+import argparse
+import email.parser
+import hashlib
+import html
+import importlib.util
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+from urllib.request import Request, urlopen
+
+_logger = logging.getLogger('payu_simulator')
+
+
+def _load_const():
+    """ Load the module constants by path, since `odoo.addons` is not importable here. """
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'const.py')
+    spec = importlib.util.spec_from_file_location('payu_simulator_const', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+const = _load_const()
+
+
+def sign(hash_params, values, salt):
+    """ Sign the values the way PayU does, see `odoo.addons.payment_payu.signer`. """
+    hash_string = '|'.join(
+        salt if param == '_SALT_' else str(values.get(param) or '').strip() for param in hash_params
+    )
+    hash_string = hash_string.strip(''.join(chr(c) for c in range(0x3001) if chr(c).isspace()) + '|')
+    return hashlib.sha512(hash_string.encode('utf-8')).hexdigest()
+
+
+class PayUSimulator:
+    """ In-memory state and behavior of the simulated gateway. """
+
+    def __init__(self, merchants, latency=0.0, error_rate=0.0, settlement_pages=1,
+                 webhook_url=None, seed=None):
+        """
+        :param dict merchants: The salts of the accepted merchant keys; any key is accepted,
+                               without hash verification, if empty.
+        :param float latency: The delay, in seconds, added to every response.
+        :param float error_rate: The probability, between 0 and 1, of a failure of a request.
+        :param int settlement_pages: The minimum number of settlement pages served per range.
+        :param str webhook_url: The URL to which the payment outcomes are also posted, if any.
+        :param int seed: The seed of the random generator, to replay a run.
+        """
+        self.merchants = merchants
+        self.latency = latency
+        self.error_rate = error_rate
+        self.settlement_pages = settlement_pages
+        self.webhook_url = webhook_url
+        self.random = random.Random(seed)
+        self.payments = {}  # The processed payments, by txnid.
+        self.refunds = {}  # The refund actions, by request id.
+        self._lock = threading.Lock()
+        self._mihpayids = itertools.count(403993715000)
+
+    # === HELPERS === #
+
+    def _next_mihpayid(self):
+        with self._lock:
+            return str(next(self._mihpayids))
+
+    def _fails(self):
+        return self.error_rate and self.random.random() < self.error_rate
+
+    def _check_hash(self, hash_params, values):
+        """ Return whether the hash of the values is valid for the merchant key of the values. """
+        if not self.merchants:
+            return True
+        salt = self.merchants.get(values.get('key'))
+        return salt is not None and sign(hash_params, values, salt) == values.get('hash')
+
+    def _salt(self, key):
+        return self.merchants.get(key, '')
+
+    # === ENDPOINTS === #
+
+    def payment(self, values):
+        """ Process a hosted checkout payment and return the fields posted back to the merchant.
+
+        :return: The return URL and the signed response fields.
+        :rtype: tuple(str, dict)
+        """
+        if not self._check_hash(const.PAYMENT_HASH_PARAMS, values):
+            status, error = 'failure', 'Invalid hash'
+        elif self._fails():
+            status, error = 'failure', 'Simulated bank failure'
+        else:
+            status, error = 'success', 'No Error'
+        response = {
+            param: values.get(param, '')
+            for param in const.PAYMENT_REVERSE_HASH_PARAMS if param != '_SALT_'
+        }
+        response.update({
+            'mihpayid': self._next_mihpayid(),
+            'status': status,
+            'error_Message': error,
+            'mode': 'UPI',
+            'bank_ref_num': uuid.uuid4().hex[:12],
+            'addedon': time.strftime('%Y-%m-%d %H:%M:%S'),
+        })
+        response['hash'] = sign(const.PAYMENT_REVERSE_HASH_PARAMS, response, self._salt(values.get('key')))
+        with self._lock:
+            self.payments[response['txnid']] = response
+        if self.webhook_url:
+            threading.Thread(target=self._post_webhook, args=(response,), daemon=True).start()
+        return values.get('surl' if status == 'success' else 'furl'), response
+
+    def _post_webhook(self, response):
+        time.sleep(self.latency)
+        request = Request(self.webhook_url, data=urlencode(response).encode(), method='POST')
+        try:
+            urlopen(request, timeout=10).read()
+        except OSError as e:
+            _logger.warning("Webhook delivery to %s failed: %s", self.webhook_url, e)
+
+    def postservice(self, values):
+        """ Run a merchant API command and return its JSON response, or raw text response. """
+        command = values.get('command')
+        hash_params = {
+            'cancel_refund_transaction': const.REFUND_HASH_PARAMS,
+            'udf_update': const.UPDATE_INVOICE_ID_HASH_PARAMS,
+            'opgsp_upload_invoice_awb': const.UPLOAD_INVOICE_HASH_PARAMS,
+            'check_action_status': const.CHECK_ACTION_STATUS_HASH_PARAMS,
+        }.get(command, const.REFUND_HASH_PARAMS)
+        if not self._check_hash(hash_params, values):
+            return {'status': 0, 'msg': 'Invalid Hash.'}
+        if command == 'cancel_refund_transaction':
+            if self._fails():
+                return {'status': 0, 'msg': 'Refund failed', 'mihpayid': values.get('var1'), 'error_code': 105}
+            request_id = str(uuid.uuid4().int)[:9]
+            with self._lock:
+                self.refunds[request_id] = {
+                    'request_id': request_id,
+                    'mihpayid': values.get('var1'),
+                    'token': values.get('var2'),
+                    'amount': values.get('var3'),
+                    'action': 'refund',
+                    'status': 'success',
+                    'bank_ref_num': uuid.uuid4().hex[:12],
+                }
+            return {
+                'status': 1,
+                'msg': 'Refund Request Queued',
+                'request_id': request_id,
+                'bank_ref_num': None,
+                'mihpayid': values.get('var1'),
+                'error_code': 102,
+            }
+        if command == 'check_action_status':
+            request_ids = (values.get('var1') or '').split('|')
+            details = {
+                request_id: {request_id: self.refunds[request_id]}
+                for request_id in request_ids if request_id in self.refunds
+            }
+            return {
+                'status': 1,
+                'msg': f'{len(details)} out of {len(request_ids)} Transactions Fetched Successfully',
+                'transaction_details': details,
+            }
+        if command == 'udf_update':
+            return {'status': 'UDF values updated', 'txnid': values.get('var1')}
+        if command == 'opgsp_upload_invoice_awb':
+            return 'status: 00, msg: Invoice uploaded successfully'
+        if command == 'verify_payment':
+            txnids = (values.get('var1') or '').split('|')
+            details = {
+                txnid: self.payments.get(txnid) or {'status': 'Not Found', 'txnid': txnid}
+                for txnid in txnids
+            }
+            found = sum(1 for txnid in txnids if txnid in self.payments)
+            return {
+                'status': 1,
+                'msg': f'{found} out of {len(txnids)} Transactions Fetched Successfully',
+                'transaction_details': details,
+            }
+        return {'status': 0, 'msg': f'Invalid command {command}'}
+
+    def settlement(self, params):
+        """ Return a page of settlements: the simulated payments first, then generated ones. """
+        page_size = int(params.get('pageSize') or const.SETTLEMENT_PAGE_SIZE)
+        page = int(params.get('page') or 1)
+        with self._lock:
+            payments = [p for p in self.payments.values() if p['status'] == 'success']
+        total = max(len(payments), self.settlement_pages * page_size)
+        start = (page - 1) * page_size
+        transactions = []
+        for index in range(start, min(start + page_size, total)):
+            payment = payments[index] if index < len(payments) else {
+                'mihpayid': str(900000000000 + index), 'amount': '100.00',
+            }
+            amount = float(payment['amount'] or 0)
+            transactions.append({
+                'payuId': payment['mihpayid'],
+                'merchantNetAmount': f'{amount * 0.98:.2f}',
+                'merchantServiceFee': f'{amount * 0.017:.2f}',
+                'merchantServiceTax': f'{amount * 0.003:.2f}',
+                'settlementCurrency': 'INR',
+            })
+        data = [{
+            'utrNumber': f'SIMUTR{page:06d}',
+            'settlementCompletedDate': params.get('dateTo'),
+            'transaction': transactions,
+        }] if transactions else []
+        return {'status': 0, 'result': {'page': page, 'size': len(transactions), 'data': data}}
+
+
+class PayUSimulatorHandler(BaseHTTPRequestHandler):
+
+    simulator = None  # Set on the server-specific subclass.
+
+    def log_message(self, format, *args):
+        _logger.info(format, *args)
+
+    def _read_values(self):
+        """ Return the form fields of the request body, urlencoded or multipart. """
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('multipart/form-data'):
+            message = email.parser.BytesParser().parsebytes(
+                f'Content-Type: {content_type}\r\n\r\n'.encode() + body
+            )
+            return {
+                part.get_param('name', header='content-disposition'): part.get_payload(decode=True).decode()
+                for part in message.get_payload()
+                if not part.get_filename()
+            }
+        return {key: values[0] for key, values in parse_qs(body.decode()).items()}
+
+    def _send(self, status, body, content_type='application/json'):
+        if not isinstance(body, (str, bytes)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate_load(self):
+        """ Apply the latency and return whether the request fails with a server error. """
+        time.sleep(self.simulator.latency)
+        if self.simulator._fails():
+            self._send(503, {'status': 0, 'msg': 'Service temporarily unavailable'})
+            return True
+        return False
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        values = self._read_values()
+        if path == '/_payment':
+            time.sleep(self.simulator.latency)
+            return_url, response = self.simulator.payment(values)
+            inputs = ''.join(
+                f'<input type="hidden" name="{html.escape(k)}" value="{html.escape(str(v))}"/>'
+                for k, v in response.items()
+            )
+            self._send(200, (
+                f'<html><body onload="document.forms[0].submit()">'
+                f'<form method="post" action="{html.escape(return_url or "")}">{inputs}</form>'
+                f'</body></html>'
+            ), content_type='text/html')
+        elif path == '/merchant/postservice.php':
+            if self._simulate_load():
+                return
+            result = self.simulator.postservice(values)
+            self._send(200, result, 'text/plain' if isinstance(result, str) else 'application/json')
+        else:
+            self._send(404, {'status': 0, 'msg': 'Not Found'})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/settlement/range':
+            if self._simulate_load():
+                return
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            self._send(200, self.simulator.settlement(params))
+        else:
+            self._send(404, {'status': 0, 'msg': 'Not Found'})
+
+
+def make_server(simulator, host='127.0.0.1', port=8070):
+    """ Return a threaded HTTP server serving the given simulator. """
+    handler = type('Handler', (PayUSimulatorHandler,), {'simulator': simulator})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8070)
+    parser.add_argument(
+        '--merchant', action='append', default=[], metavar='KEY:SALT',
+        help="A merchant key and salt whose hashes are verified; repeatable. Hashes are not "
+             "verified if no merchant is given.",
+    )
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to each response.")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Probability of a failure.")
+    parser.add_argument('--settlement-pages', type=int, default=1)
+    parser.add_argument('--webhook-url', help="The Odoo webhook URL to notify of the payments.")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    simulator = PayUSimulator(
+        dict(merchant.split(':', 1) for merchant in args.merchant),
+        latency=args.latency,
+        error_rate=args.error_rate,
+        settlement_pages=args.settlement_pages,
+        webhook_url=args.webhook_url,
+        seed=args.seed,
+    )
+    server = make_server(simulator, args.host, args.port)
+    _logger.info("PayU simulator listening on http://%s:%s", args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
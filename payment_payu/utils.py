@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import threading
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from odoo.addons.payment_payu import const
+
+_logger = logging.getLogger(__name__)
+
+
+def try_acquire_slot(cr, lock_id, capacity):
+    """ Try to acquire one of the `capacity` slots of a semaphore shared by all the workers.
+
+    The slots are PostgreSQL transaction-level advisory locks: the acquired slot is released
+    when the transaction of the cursor ends.
+
+    :param cr: The database cursor holding the slot.
+    :param int lock_id: The identifier of the semaphore.
+    :param int capacity: The number of slots of the semaphore.
+    :return: Whether a slot was acquired.
+    :rtype: bool
+    """
+    for slot in range(max(capacity, 1)):
+        cr.execute("SELECT pg_try_advisory_xact_lock(%s, %s)", [lock_id, slot])
+        if cr.fetchone()[0]:
+            return True
+    return False
+
+
+def json_dumps(value):
+    """ Serialize a value to compact JSON, with `orjson` when it is installed.
+
+    :param value: The JSON-serializable value.
+    :return: The JSON document.
+    :rtype: str
+    """
+    if orjson is not None:
+        return orjson.dumps(value).decode('utf-8')
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+def dump_cart_details(cart_details, max_length=const.CART_DETAILS_MAX_LENGTH):
+    """ Serialize the cart details sent to PayU, compacting the SKU details to fit the size limit.
+
+    When the document is too long, the SKU details are compacted: the default offer values are
+    dropped and the names shortened. No SKU is dropped, as the cart totals would then no longer
+    match the SKUs.
+
+    :param dict cart_details: The cart details, whose `sku_details` may be modified.
+    :param int max_length: The maximum size of the document, in UTF-8 bytes.
+    :return: The JSON document.
+    :rtype: str
+    :raise ValueError: If the compacted document is still too long.
+    """
+    document = json_dumps(cart_details)
+    if len(document.encode()) <= max_length:
+        return document
+
+    for sku in cart_details['sku_details']:
+        if sku.get('offer_key') == []:
+            del sku['offer_key']
+        if sku.get('offer_auto_apply') is True:
+            del sku['offer_auto_apply']
+        if isinstance(sku.get('sku_name'), str):
+            sku['sku_name'] = sku['sku_name'][:const.CART_SKU_NAME_MAX_LENGTH]
+    document = json_dumps(cart_details)
+    size = len(document.encode())
+    if size > max_length:
+        raise ValueError(
+            f"The cart details of {len(cart_details['sku_details'])} SKUs take {size} bytes, "
+            f"more than the {max_length} bytes accepted by PayU."
+        )
+    return document
+
+
+class RateLimiter:
+    """ Thread-safe token bucket allowing `rate` acquisitions per second, in bursts of `rate`. """
+
+    def __init__(self, rate):
+        """
+        :param float rate: The number of acquisitions allowed per second.
+        """
+        self.rate = max(float(rate), 0.001)
+        self._tokens = max(self.rate, 1)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """ Wait until an acquisition is allowed, then consume it. """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    max(self.rate, 1), self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)